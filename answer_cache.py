@@ -0,0 +1,106 @@
+import hashlib
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, Hashable, Optional
+
+class SemanticAnswerCache:
+    """Caches RAG answers by query embedding; near-duplicate questions reuse a stored answer"""
+    
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.index_version = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> entry, least recently used first
+        self._lock = threading.Lock()
+    
+    def lookup(self, query: str, query_vector: np.ndarray, index_version: int, model_key: Hashable) -> Optional[Dict[str, Any]]:
+        """Return a stored answer for the same or a sufficiently similar query, if any"""
+        with self._lock:
+            if not self._check_version(index_version):
+                # Asked against an index that has since changed; newer answers may not match its context
+                self.misses += 1
+                return None
+            self._expire()
+            
+            entry = self._entries.get(self._key(query, model_key))
+            if entry is None:
+                entry = self._nearest(query_vector, model_key)
+                if entry is not None:
+                    self.semantic_hits += 1
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self.hits += 1
+            self._entries.move_to_end(entry['key'])
+            return entry['response']
+    
+    def store(self, query: str, query_vector: np.ndarray, index_version: int, model_key: Hashable,
+              response: Dict[str, Any]) -> None:
+        with self._lock:
+            if not self._check_version(index_version):
+                # Generated from an older index than the cached answers; storing it would serve stale context
+                return
+            key = self._key(query, model_key)
+            self._entries[key] = {
+                'key': key,
+                'model_key': model_key,
+                'vector': np.asarray(query_vector, dtype='float32'),
+                'response': response,
+                'expires_at': time.time() + self.ttl_seconds
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self) -> None:
+        """Drop every stored answer"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else None,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'index_version': self.index_version
+        }
+    
+    def _check_version(self, index_version: int) -> bool:
+        """Whether index_version is current; a newer one drops every answer stored for older versions"""
+        # Any change to the index can change the retrieved context, so old answers are stale
+        if self.index_version is not None and index_version < self.index_version:
+            return False
+        if index_version != self.index_version:
+            self._entries.clear()
+            self.index_version = index_version
+        return True
+    
+    def _expire(self) -> None:
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if entry['expires_at'] <= now]:
+            del self._entries[key]
+    
+    def _nearest(self, query_vector: np.ndarray, model_key: Hashable) -> Optional[Dict[str, Any]]:
+        candidates = [entry for entry in self._entries.values() if entry['model_key'] == model_key]
+        if not candidates:
+            return None
+        # Vectors are L2-normalized, so the dot product is the cosine similarity
+        similarities = np.stack([entry['vector'] for entry in candidates]) @ np.asarray(query_vector, dtype='float32')
+        best = int(np.argmax(similarities))
+        return candidates[best] if similarities[best] >= self.similarity_threshold else None
+    
+    @staticmethod
+    def _key(query: str, model_key: Hashable) -> str:
+        return hashlib.sha256(f"{model_key}\0{query.strip().lower()}".encode('utf-8')).hexdigest()
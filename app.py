@@ -1,251 +1,646 @@
-from flask import Flask, render_template, request, jsonify, session
-import os
-import uuid
-from werkzeug.utils import secure_filename
-import config
-from utils.document_processor import DocumentProcessor
-from utils.vector_store import VectorStore
-from utils.rag_chain import RAGChain
-import traceback
-import json
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'edugpt-secret-key-2024'
-app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = config.MAX_FILE_SIZE
-
-# Global components (simpler approach)
-document_processor = DocumentProcessor()
-global_vector_store = VectorStore()
-rag_chain = RAGChain(global_vector_store, config)
-
-# Simple session state
-processed_files = []
-
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/process-documents', methods=['POST'])
-def process_documents():
-    global processed_files
-    
-    try:
-        if 'files' not in request.files:
-            return jsonify({'success': False, 'error': 'No files uploaded'})
-        
-        files = request.files.getlist('files')
-        processed_documents = []
-        
-        for file in files:
-            if file.filename == '':
-                continue
-            
-            # Check file extension
-            filename = secure_filename(file.filename)
-            file_ext = os.path.splitext(filename)[1].lower()
-            
-            if file_ext in config.SUPPORTED_EXTENSIONS:
-                # Save file temporarily
-                file_path = os.path.join(config.UPLOAD_FOLDER, filename)
-                file.save(file_path)
-                
-                # Process document
-                print(f"Processing file: {filename}")
-                result = document_processor.process_file(file_path)
-                
-                if 'error' not in result and result.get('content', '').strip():
-                    processed_documents.append({
-                        'id': str(uuid.uuid4()),
-                        'filename': filename,
-                        'content': result['content'],
-                        'type': result['type']
-                    })
-                    print(f"Successfully processed: {filename}, Content length: {len(result['content'])}")
-                else:
-                    error_msg = result.get('error', 'No content extracted')
-                    print(f"Error processing {filename}: {error_msg}")
-                
-                # Clean up temporary file
-                os.remove(file_path)
-        
-        if processed_documents:
-            # Create vector store
-            print("Creating vector store...")
-            global_vector_store.create_index(processed_documents)
-            processed_files = [doc['filename'] for doc in processed_documents]
-            
-            # Save vector store
-            global_vector_store.save(config.VECTOR_STORE_PATH)
-            
-            return jsonify({
-                'success': True,
-                'processed_files': len(processed_documents),
-                'files': processed_files
-            })
-        else:
-            return jsonify({'success': False, 'error': 'No valid files processed or no content extracted'})
-    
-    except Exception as e:
-        print(f"Error in process_documents: {str(e)}")
-        print(traceback.format_exc())
-        return jsonify({'success': False, 'error': str(e)})
-
-@app.route('/chat', methods=['POST'])
-def chat():
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No JSON data received'})
-            
-        message = data.get('message', '')
-        use_perplexity = data.get('use_perplexity', False)
-        
-        if not message:
-            return jsonify({'error': 'No message provided'})
-        
-        print(f"Received message: {message}")
-        print(f"Processed files: {processed_files}")
-        
-        # Check if vector store exists
-        vector_store_path = config.VECTOR_STORE_PATH
-        index_path = os.path.join(vector_store_path, "index.faiss")
-        documents_path = os.path.join(vector_store_path, "documents.pkl")
-        
-        if not os.path.exists(index_path) or not os.path.exists(documents_path):
-            return jsonify({'error': 'No documents processed yet. Please upload and process documents first.'})
-        
-        # Load vector store if not already loaded
-        if global_vector_store.index is None:
-            if not global_vector_store.load(vector_store_path):
-                return jsonify({'error': 'Failed to load knowledge base. Please process your documents again.'})
-        
-        # Generate response
-        print("Generating response...")
-        response_data = rag_chain.generate_response(message, use_perplexity)
-        
-        print("Response generated successfully")
-        return jsonify(response_data)
-    
-    except Exception as e:
-        print(f"Error in chat: {str(e)}")
-        print(traceback.format_exc())
-        return jsonify({'error': f'Error processing your request: {str(e)}'})
-
-@app.route('/summarize-document', methods=['POST'])
-def summarize_document():
-    """Handle document summarization requests"""
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No JSON data received'})
-            
-        use_perplexity = data.get('use_perplexity', False)
-        
-        # Check if we have processed files
-        if not processed_files:
-            return jsonify({'error': 'No documents processed yet. Please upload and process documents first.'})
-        
-        # Load vector store to access document content
-        if not global_vector_store.load(config.VECTOR_STORE_PATH):
-            return jsonify({'error': 'Failed to load knowledge base. Please process your documents again.'})
-        
-        # Get all document content for summarization
-        all_content = ""
-        for doc in global_vector_store.documents:
-            all_content += doc['chunk'] + "\n\n"
-        
-        if not all_content.strip():
-            return jsonify({'error': 'No content found in processed documents.'})
-        
-        # Generate summary
-        summary = rag_chain.summarize_document(all_content, use_perplexity)
-        
-        return jsonify({
-            'summary': summary,
-            'document_count': len(processed_files),
-            'documents': processed_files
-        })
-        
-    except Exception as e:
-        print(f"Error in summarize-document: {str(e)}")
-        print(traceback.format_exc())
-        return jsonify({'error': f'Error generating summary: {str(e)}'})
-    
-    except Exception as e:
-        print(f"Error in summarize: {str(e)}")
-        return jsonify({'error': str(e)})
-
-@app.route('/compare', methods=['POST'])
-def compare_concepts():
-    try:
-        data = request.get_json()
-        concept1 = data.get('concept1', '')
-        concept2 = data.get('concept2', '')
-        use_perplexity = data.get('use_perplexity', False)
-        
-        if not concept1 or not concept2:
-            return jsonify({'error': 'Please provide two concepts to compare'})
-        
-        response = rag_chain.compare_concepts(concept1, concept2, use_perplexity)
-        
-        return jsonify({'comparison': response})
-    
-    except Exception as e:
-        print(f"Error in compare: {str(e)}")
-        return jsonify({'error': str(e)})
-
-@app.route('/change-model', methods=['POST'])
-def change_model():
-    try:
-        data = request.get_json()
-        model = data.get('model', 'llama2')
-        
-        config.LOCAL_MODEL = model
-        
-        return jsonify({'success': True, 'model': model})
-    
-    except Exception as e:
-        print(f"Error changing model: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)})
-
-@app.route('/get-uploaded-files', methods=['GET'])
-def get_uploaded_files():
-    return jsonify({'files': processed_files})
-
-@app.route('/debug/status', methods=['GET'])
-def debug_status():
-    """Debug endpoint to check system status"""
-    vector_store_path = config.VECTOR_STORE_PATH
-    index_exists = os.path.exists(os.path.join(vector_store_path, "index.faiss"))
-    documents_exists = os.path.exists(os.path.join(vector_store_path, "documents.pkl"))
-    
-    return jsonify({
-        'processed_files': processed_files,
-        'vector_store_loaded': global_vector_store.index is not None,
-        'index_exists': index_exists,
-        'documents_exists': documents_exists,
-        'ollama_available': check_ollama()
-    })
-
-def check_ollama():
-    """Check if Ollama is running"""
-    try:
-        import ollama
-        models = ollama.list()
-        return True
-    except:
-        return False
-
-def ensure_directories():
-    """Ensure required directories exist"""
-    os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
-    os.makedirs(config.VECTOR_STORE_PATH, exist_ok=True)
-
-if __name__ == '__main__':
-    ensure_directories()
-    print("EduGPT Server Starting...")
-    print("Make sure Ollama is running: ollama serve")
-    print("Access the application at: http://localhost:5000")
-    print("Debug status at: http://localhost:5000/debug/status")
+import time
+startup_started = time.perf_counter()  # Cold-start timing includes the imports below
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context, g
+import os
+import uuid
+from werkzeug.utils import secure_filename
+import config
+from utils.document_processor import DocumentProcessor
+from utils.chunker import StructuredChunker
+from utils.vector_store import VectorStore
+from utils.embedding_cache import EmbeddingCache
+from utils.embeddings import cache_model_name, cosine_agreement, create_backend
+from utils.store_manager import StoreManager
+from utils.rag_chain import RAGChain
+from utils.ingestion import IngestionPipeline
+from utils.jobs import JobManager, SummaryJob
+from utils.answer_cache import SemanticAnswerCache
+from utils.query_batcher import QueryBatcher
+from utils.summarizer import MapReduceSummarizer
+from utils.reranker import CrossEncoderScorer, Reranker
+from utils.llm_scheduler import LLMScheduler
+from utils.warmup import LazyEmbeddings, Warmup
+from utils import metrics
+import traceback
+import json
+import itertools
+import threading
+from contextlib import ExitStack
+
+app = Flask(__name__)
+app.config['SECRET_KEY'] = 'edugpt-secret-key-2024'
+app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_FILE_SIZE
+
+# Global components (simpler approach)
+document_processor = DocumentProcessor()
+chunker = StructuredChunker(config.EMBEDDING_MODEL, config.CHUNK_MAX_TOKENS, config.CHUNK_OVERLAP_TOKENS,
+                            config.EMBEDDING_MAX_TOKENS) if config.CHUNKER == 'structured' else None
+embedding_agreement = {}  # How closely the configured backend matches the HuggingFace model
+
+def load_embedding_model():
+    """The configured embedding backend, or the HuggingFace one if it fails to load or disagrees with it"""
+    if config.EMBEDDING_BACKEND != 'huggingface':
+        try:
+            backend = create_backend(config.EMBEDDING_BACKEND, config.EMBEDDING_MODEL, config.EMBEDDING_THREADS,
+                                     config.EMBEDDING_ONNX_DIR, config.EMBEDDING_MAX_BATCH_TOKENS,
+                                     config.EMBEDDING_BATCH_SIZE, config.EMBEDDING_MAX_TOKENS)
+        except Exception as e:
+            # A missing package, a failed ONNX export or a corrupt model file all fall back the same way
+            print(f"Embedding backend {config.EMBEDDING_BACKEND} unavailable ({str(e)}); using huggingface")
+            print(traceback.format_exc())
+        else:
+            if not config.EMBEDDING_VERIFY_AGREEMENT:
+                return backend
+            reference = create_backend('huggingface', config.EMBEDDING_MODEL, config.EMBEDDING_THREADS)
+            embedding_agreement.update(cosine_agreement(reference, backend), backend=config.EMBEDDING_BACKEND)
+            print(f"Embedding agreement with huggingface: {embedding_agreement}")
+            if embedding_agreement['min'] >= config.EMBEDDING_MIN_AGREEMENT:
+                return backend
+            print(f"Embedding backend {config.EMBEDDING_BACKEND} disagrees with huggingface; using huggingface")
+            return reference
+    return create_backend('huggingface', config.EMBEDDING_MODEL, config.EMBEDDING_THREADS)
+
+# Every collection's store shares one embedding model and one embedding cache; the model loads in
+# the warm-up thread (or on first use) rather than while the app is imported
+embedding_model = LazyEmbeddings(load_embedding_model)
+# Entries are namespaced by the backend that actually loaded, so the name is resolved with the model
+embedding_cache = EmbeddingCache(config.EMBEDDING_CACHE_PATH,
+                                 lambda: cache_model_name(config.EMBEDDING_MODEL, embedding_model.model().name),
+                                 config.EMBEDDING_CACHE_MAX_ENTRIES)
+
+def create_vector_store():
+    return VectorStore(
+        config.EMBEDDING_MODEL,
+        index_type=config.INDEX_TYPE,
+        index_params=config.INDEX_PARAMS,
+        retrieval_mode=config.RETRIEVAL_MODE,
+        hybrid_candidates=config.HYBRID_CANDIDATES,
+        rrf_k=config.RRF_K,
+        embeddings=embedding_model,
+        embedding_cache=embedding_cache
+    )
+
+# Collection chains bind the shared RAG chain to one store and that store's own answer cache
+collection_chains = {}  # collection -> (vector store, RAG chain)
+collection_chains_lock = threading.Lock()
+
+def forget_collection_chain(collection, vector_store):
+    with collection_chains_lock:
+        if collection_chains.get(collection, (None,))[0] is vector_store:
+            del collection_chains[collection]
+
+store_manager = StoreManager(
+    config.VECTOR_STORE_PATH,
+    create_vector_store,
+    max_open=config.MAX_OPEN_COLLECTIONS,
+    max_memory_bytes=config.MAX_OPEN_COLLECTIONS_MB * 1024 * 1024,
+    on_close=forget_collection_chain
+)
+query_batcher = QueryBatcher(
+    None,
+    max_wait_ms=config.QUERY_BATCH_WAIT_MS,
+    max_batch=config.QUERY_BATCH_MAX_SIZE
+)
+reranker = Reranker(
+    CrossEncoderScorer(config.RERANK_MODEL),
+    top_n=config.RERANK_CANDIDATES,
+    budget_ms=config.RERANK_BUDGET_MS,
+    cache_max_entries=config.RERANK_CACHE_MAX_ENTRIES
+) if config.RERANK_ENABLED else None
+# One scheduler for every collection's chain, so the concurrency limits hold across the whole app
+llm_scheduler = LLMScheduler(config.LLM_CONCURRENCY)
+rag_chain = RAGChain(None, config, query_batcher=query_batcher, reranker=reranker, scheduler=llm_scheduler)
+summarizer = MapReduceSummarizer(rag_chain, max_workers=config.SUMMARY_WORKERS,
+                                 cache_max_entries=config.SUMMARY_CACHE_MAX_ENTRIES)
+
+def chain_for(collection, vector_store):
+    """The RAG chain for an open collection, created with an empty answer cache on first use"""
+    with collection_chains_lock:
+        entry = collection_chains.get(collection)
+        if entry is None or entry[0] is not vector_store:
+            answer_cache = SemanticAnswerCache(
+                max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS,
+                similarity_threshold=config.ANSWER_CACHE_SIMILARITY
+            )
+            entry = (vector_store, rag_chain.for_store(vector_store, answer_cache))
+            collection_chains[collection] = entry
+        return entry[1]
+
+def answer_cache_stats():
+    """Answer cache counters summed over the open collections"""
+    with collection_chains_lock:
+        caches = [chain.answer_cache for _, chain in collection_chains.values()]
+    totals = {'hits': 0, 'semantic_hits': 0, 'misses': 0, 'entries': 0}
+    for cache in caches:
+        stats = cache.stats()
+        for stat in totals:
+            totals[stat] += stats[stat]
+    return totals
+
+# Scraped by /metrics alongside the request and stage histograms
+metrics.registry.gauge('edugpt_index_vectors', 'Vectors in the open FAISS indexes',
+                       lambda: store_manager.stats()['vectors'])
+metrics.registry.gauge('edugpt_collections', 'Open collection stores, loads and evictions',
+                       store_manager.stats, ('stat',))
+metrics.registry.gauge('edugpt_answer_cache', 'Semantic answer cache statistics', answer_cache_stats, ('stat',))
+metrics.registry.gauge('edugpt_query_batcher', 'Query micro-batching statistics', query_batcher.stats, ('stat',))
+if reranker is not None:
+    metrics.registry.gauge('edugpt_reranker', 'Reranked, skipped and abandoned requests and score cache',
+                           reranker.stats, ('stat',))
+metrics.registry.gauge('edugpt_llm_scheduler', 'LLM generations running, queued, coalesced and timed out',
+                       lambda: {(backend, stat): value for backend, stats in llm_scheduler.stats().items()
+                                for stat, value in stats.items()}, ('backend', 'stat'))
+metrics.registry.gauge('edugpt_summarizer', 'Map-reduce summary cache statistics', summarizer.stats, ('stat',))
+metrics.registry.gauge('edugpt_perplexity_client', 'Perplexity HTTP client retries and circuit breaker',
+                       rag_chain.perplexity_client.stats, ('stat',))
+metrics.registry.gauge('edugpt_embedding_cache', 'Embedding cache statistics', embedding_cache.stats, ('stat',))
+
+def current_collection():
+    """Collection named by the request, else the session's own (or the shared default) knowledge base"""
+    data = request.get_json(silent=True) if request.is_json else None
+    collection = ((data or {}).get('collection') or request.form.get('collection')
+                  or request.args.get('collection'))
+    if not collection:
+        if not config.PER_SESSION_COLLECTIONS:
+            return config.DEFAULT_COLLECTION
+        if 'collection' not in session:
+            session['collection'] = f"session-{uuid.uuid4().hex}"
+        collection = session['collection']
+    if not store_manager.valid_name(collection):
+        raise ValueError('Collection names may only contain letters, digits, "-" and "_"')
+    return collection
+
+def run_ingestion_job(job):
+    """Ingest a job's saved uploads into its collection's vector store (runs on a background thread)"""
+    try:
+        # The collection stays open (and unevicted) until the store is saved
+        with store_manager.open(job.collection) as vector_store:
+            # Extract in parallel and embed in batches
+            print(f"Processing {len(job.files)} files into collection {job.collection}...")
+            pipeline = IngestionPipeline(
+                vector_store,
+                workers=config.INGEST_WORKERS,
+                batch_size=config.EMBEDDING_BATCH_SIZE,
+                embedding_threads=config.EMBEDDING_THREADS,
+                chunker=chunker,
+                embedding_backend=config.EMBEDDING_BACKEND
+            )
+            result = pipeline.ingest(job.files, progress=job.update_progress, cancel_event=job.cancel_event)
+            
+            for failed in result['errors']:
+                print(f"Error processing {failed['filename']}: {failed['error']}")
+                job.set_file_error(failed['id'], failed['error'])
+            processed_documents = [{'id': doc['id'], 'filename': doc['filename']} for doc in result['documents']]
+            metrics.INGESTED.inc(len(result['documents']), kind='documents')
+            metrics.INGESTED.inc(sum(doc['chunks'] for doc in result['documents']), kind='chunks')
+            metrics.INGESTED.inc(len(result['errors']), kind='errors')
+            
+            if not processed_documents:
+                raise ValueError('No valid files processed or no content extracted')
+            
+            processed_files = [doc['filename'] for doc in vector_store.list_documents()]
+            
+            # Save vector store
+            save_started = time.perf_counter()
+            store_manager.save(job.collection)
+            result['timings']['save'] = round(time.perf_counter() - save_started, 3)
+            metrics.record_stages('ingest', result['timings'])
+    finally:
+        # Clean up temporary files
+        for saved in job.files:
+            os.remove(saved['path'])
+    
+    return {
+        'processed_files': len(processed_documents),
+        'files': processed_files,
+        'documents': processed_documents,
+        'embedding_cache': result['embedding_cache'],
+        'timings': result['timings']
+    }
+
+job_manager = JobManager(run_ingestion_job, history=config.JOB_HISTORY)
+
+def run_summary_job(job):
+    """Map-reduce summary of a job's documents (runs on a background thread)"""
+    def summarized(document):
+        job.update_progress(document['id'], 'summarized', 1)
+        if job.cancel_event.is_set():
+            raise RuntimeError('Summary cancelled')
+    
+    summary = summarizer.summarize_corpus(job.files, job.options.get('use_perplexity', False), on_document=summarized)
+    return {
+        'summary': summary,
+        'document_count': len(job.files),
+        'documents': [document['filename'] for document in job.files]
+    }
+
+summary_job_manager = JobManager(run_summary_job, history=config.JOB_HISTORY, job_class=SummaryJob)
+job_managers = (job_manager, summary_job_manager)
+
+def sse_response(events):
+    """Stream events to the client as Server-Sent Events"""
+    def generate():
+        try:
+            for event in events:
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            print(f"Error while streaming: {str(e)}")
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def pinned_response(response, pin):
+    """Keep the collection held by pin open until the server has finished sending response"""
+    # pop_all() takes the open store out of the caller's with block; it is released on close instead
+    response.call_on_close(pin.pop_all().close)
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Streaming responses are measured until their headers are sent
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = {'endpoint': endpoint, 'method': request.method, 'status': response.status_code}
+    elapsed = time.perf_counter() - g.request_started
+    metrics.REQUESTS.inc(**labels)
+    metrics.REQUEST_SECONDS.observe(elapsed, **labels)
+    if endpoint == '/chat' and 'first_query' not in startup_timings:
+        startup_timings['first_query'] = elapsed
+    return response
+
+def with_timings(events, trace):
+    """Attach the trace's stage timings to the final event of a stream"""
+    for event in events:
+        if event.get('type') == 'done':
+            event = dict(event, timings_ms=trace.to_dict())
+        yield event
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/process-documents', methods=['POST'])
+def process_documents():
+    try:
+        if 'files' not in request.files:
+            return jsonify({'success': False, 'error': 'No files uploaded'})
+        
+        collection = current_collection()
+        files = request.files.getlist('files')
+        saved_files = []
+        
+        for file in files:
+            if file.filename == '':
+                continue
+            
+            # Check file extension
+            filename = secure_filename(file.filename)
+            file_ext = os.path.splitext(filename)[1].lower()
+            
+            if file_ext in config.SUPPORTED_EXTENSIONS:
+                # Save file until the job has processed it (unique name so parallel workers never collide)
+                document_id = str(uuid.uuid4())
+                file_path = os.path.join(config.UPLOAD_FOLDER, f"{document_id}_{filename}")
+                file.save(file_path)
+                saved_files.append({'id': document_id, 'filename': filename, 'path': file_path})
+        
+        if not saved_files:
+            return jsonify({'success': False, 'error': 'No supported files uploaded'})
+        
+        # Ingest in the background; the client polls /jobs/<job_id> for progress
+        job = job_manager.submit(saved_files, collection=collection)
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'collection': collection,
+            'files': [saved['filename'] for saved in saved_files]
+        }), 202
+    
+    except Exception as e:
+        print(f"Error in process_documents: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    collection = current_collection()
+    return jsonify({'jobs': [job.to_dict() for manager in job_managers for job in manager.list()
+                             if job.collection == collection]})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = next(filter(None, (manager.get(job_id) for manager in job_managers)), None)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not any(manager.cancel(job_id) for manager in job_managers):
+        return jsonify({'success': False, 'error': 'Job not found or already finished'})
+    return jsonify({'success': True, 'job_id': job_id})
+
+@app.route('/remove-document', methods=['POST'])
+def remove_document():
+    try:
+        data = request.get_json()
+        document_id = data.get('document_id', '') if data else ''
+        
+        if not document_id:
+            return jsonify({'success': False, 'error': 'No document_id provided'})
+        
+        collection = current_collection()
+        with store_manager.open(collection) as vector_store:
+            removed = vector_store.remove_document(document_id)
+            if not removed:
+                return jsonify({'success': False, 'error': 'Document not found'})
+            
+            store_manager.save(collection)
+            processed_files = [doc['filename'] for doc in vector_store.list_documents()]
+        
+        return jsonify({'success': True, 'removed_chunks': removed, 'files': processed_files})
+    
+    except Exception as e:
+        print(f"Error in remove_document: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/get-documents', methods=['GET'])
+def get_documents():
+    collection = current_collection()
+    if not store_manager.exists(collection):
+        return jsonify({'documents': [], 'collection': collection})
+    with store_manager.open(collection) as vector_store:
+        return jsonify({'documents': vector_store.list_documents(), 'collection': collection})
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data received'})
+        
+        message = data.get('message', '')
+        use_perplexity = data.get('use_perplexity', False)
+        
+        if not message:
+            return jsonify({'error': 'No message provided'})
+        
+        collection = current_collection()
+        print(f"Received message: {message}")
+        print(f"Collection: {collection}")
+        
+        # Check if vector store exists
+        if not store_manager.exists(collection):
+            return jsonify({'error': 'No documents processed yet. Please upload and process documents first.'})
+        
+        # Load vector store if not already loaded; it stays pinned until the answer is complete
+        pin = ExitStack()
+        try:
+            vector_store = pin.enter_context(store_manager.open(collection))
+        except RuntimeError:
+            return jsonify({'error': 'Failed to load knowledge base. Please process your documents again.'})
+        
+        with pin:
+            collection_chain = chain_for(collection, vector_store)
+            
+            # Stream tokens as they are generated when the client asks for it
+            if data.get('stream'):
+                print("Streaming response...")
+                trace = metrics.Trace('chat_stream')
+                events = collection_chain.stream_response(message, use_perplexity, trace=trace)
+                return pinned_response(sse_response(with_timings(events, trace) if data.get('timings') else events), pin)
+            
+            # Generate response
+            print("Generating response...")
+            trace = metrics.Trace('chat')
+            response_data = collection_chain.generate_response(message, use_perplexity, trace=trace)
+        
+        # Optional per-stage breakdown (embed, search, context, llm...) for this request
+        if data.get('timings'):
+            response_data = dict(response_data, timings_ms=trace.to_dict())
+        
+        print("Response generated successfully")
+        return jsonify(response_data)
+    
+    except Exception as e:
+        print(f"Error in chat: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({'error': f'Error processing your request: {str(e)}'})
+
+@app.route('/summarize-document', methods=['POST'])
+def summarize_document():
+    """Handle document summarization requests"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data received'})
+        
+        use_perplexity = data.get('use_perplexity', False)
+        collection = current_collection()
+        
+        if not store_manager.exists(collection):
+            return jsonify({'error': 'No documents processed yet. Please upload and process documents first.'})
+        
+        # Load vector store if not already loaded
+        try:
+            with store_manager.open(collection) as vector_store:
+                documents = vector_store.document_chunks()
+        except RuntimeError:
+            return jsonify({'error': 'Failed to load knowledge base. Please process your documents again.'})
+        documents = [doc for doc in documents if doc['chunks']]
+        if not documents:
+            return jsonify({'error': 'No content found in processed documents.'})
+        filenames = [doc['filename'] for doc in documents]
+        
+        # Large corpora take many LLM calls; they are summarized in the background and polled at /jobs/<job_id>
+        if sum(len(doc['chunks']) for doc in documents) >= config.SUMMARY_JOB_MIN_CHUNKS:
+            job = summary_job_manager.submit(documents, collection=collection, options={'use_perplexity': use_perplexity})
+            return jsonify({
+                'success': True,
+                'job_id': job.id,
+                'collection': collection,
+                'documents': filenames
+            }), 202
+        
+        if data.get('stream'):
+            events = summarizer.stream_corpus(documents, use_perplexity)
+            return sse_response(itertools.chain([{"type": "sources", "sources": [], "context_length": 0}], events))
+        
+        # Map-reduce over every chunk; cached chunk and document summaries are reused
+        summary = summarizer.summarize_corpus(documents, use_perplexity)
+        
+        return jsonify({
+            'summary': summary,
+            'document_count': len(documents),
+            'documents': filenames
+        })
+    
+    except Exception as e:
+        print(f"Error in summarize-document: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({'error': f'Error generating summary: {str(e)}'})
+    
+    except Exception as e:
+        print(f"Error in summarize: {str(e)}")
+        return jsonify({'error': str(e)})
+
+@app.route('/compare', methods=['POST'])
+def compare_concepts():
+    try:
+        data = request.get_json()
+        concept1 = data.get('concept1', '')
+        concept2 = data.get('concept2', '')
+        use_perplexity = data.get('use_perplexity', False)
+        
+        if not concept1 or not concept2:
+            return jsonify({'error': 'Please provide two concepts to compare'})
+        
+        collection = current_collection()
+        if not store_manager.exists(collection):
+            return jsonify({'error': 'No documents processed yet. Please upload and process documents first.'})
+        
+        # Pinned until the comparison is complete, as in /chat
+        pin = ExitStack()
+        try:
+            vector_store = pin.enter_context(store_manager.open(collection))
+        except RuntimeError:
+            return jsonify({'error': 'Failed to load knowledge base. Please process your documents again.'})
+        
+        with pin:
+            collection_chain = chain_for(collection, vector_store)
+            
+            if data.get('stream'):
+                return pinned_response(sse_response(collection_chain.stream_comparison(concept1, concept2, use_perplexity)), pin)
+            
+            response = collection_chain.compare_concepts(concept1, concept2, use_perplexity)
+        
+        return jsonify({'comparison': response})
+    
+    except Exception as e:
+        print(f"Error in compare: {str(e)}")
+        return jsonify({'error': str(e)})
+
+@app.route('/change-model', methods=['POST'])
+def change_model():
+    try:
+        data = request.get_json()
+        model = data.get('model', 'llama2')
+        
+        config.LOCAL_MODEL = model
+        
+        return jsonify({'success': True, 'model': model})
+    
+    except Exception as e:
+        print(f"Error changing model: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/get-uploaded-files', methods=['GET'])
+def get_uploaded_files():
+    collection = current_collection()
+    if not store_manager.exists(collection):
+        return jsonify({'files': []})
+    with store_manager.open(collection) as vector_store:
+        return jsonify({'files': [doc['filename'] for doc in vector_store.list_documents()]})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once the embedding model and recently used collections are loaded"""
+    status = dict(warmup.to_dict(), startup_seconds=startup_seconds())
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text-format metrics"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/status', methods=['GET'])
+def debug_status():
+    """Debug endpoint to check system status"""
+    collection = current_collection()
+    vector_store_path = store_manager.path(collection)
+    index_exists = os.path.exists(os.path.join(vector_store_path, "index.faiss"))
+    documents_exists = VectorStore.exists(vector_store_path)
+    with collection_chains_lock:
+        vector_store, collection_chain = collection_chains.get(collection, (None, None))
+    
+    return jsonify({
+        'collection': collection,
+        'processed_files': [doc['filename'] for doc in vector_store.list_documents()] if vector_store else [],
+        'vector_store_loaded': vector_store is not None and vector_store.index is not None,
+        'index_exists': index_exists,
+        'documents_exists': documents_exists,
+        'embedding_cache': embedding_cache.stats(),
+        'embedding_backend': dict(embedding_agreement, configured=config.EMBEDDING_BACKEND,
+                                  loaded=embedding_model.loaded),
+        'index': vector_store.index_stats() if vector_store else None,
+        'collections': store_manager.stats(),
+        'answer_cache': collection_chain.answer_cache.stats() if collection_chain else None,
+        'query_batcher': query_batcher.stats(),
+        'reranker': reranker.stats() if reranker else None,
+        'perplexity_client': rag_chain.perplexity_client.stats(),
+        'llm_scheduler': llm_scheduler.stats(),
+        'summarizer': summarizer.stats(),
+        'startup': dict(warmup.to_dict(), startup_seconds=startup_seconds()),
+        'ollama_available': check_ollama()
+    })
+
+def check_ollama():
+    """Check if Ollama is running"""
+    try:
+        rag_chain.ollama_client.list()
+        return True
+    except:
+        return False
+
+def ensure_directories():
+    """Ensure required directories exist"""
+    os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(config.VECTOR_STORE_PATH, exist_ok=True)
+    # Stores saved before collections existed become the shared default collection
+    store_manager.migrate_legacy(config.DEFAULT_COLLECTION)
+
+def warm_embedding_model():
+    # The first inference is much slower than later ones, so run one here rather than on a user's query
+    embedding_model.embed_query("warm up")
+
+def preload_collections():
+    """Open the most recently updated collections so their first queries skip the disk load"""
+    for collection in store_manager.recent(min(config.PRELOAD_COLLECTIONS, config.MAX_OPEN_COLLECTIONS)):
+        with store_manager.open(collection) as vector_store:
+            vector_store.search("warm up", 1)
+
+def startup_seconds():
+    """Import time, time until warm-up made the app ready, and latency of the first /chat request"""
+    timings = dict(startup_timings)
+    if warmup.ready_at is not None:
+        timings['ready'] = warmup.ready_at - startup_started
+    return timings
+
+ensure_directories()
+warmup = Warmup()
+if config.WARMUP_ENABLED:
+    warmup.add('embedding_model', warm_embedding_model)
+    warmup.add('collections', preload_collections)
+    if reranker is not None:
+        warmup.add('reranker', reranker.scorer.load)
+    warmup.add('local_llm', rag_chain.warm_up_local_model, required=False)
+# Extraction workers started by forkserver/spawn re-run this module as __mp_main__ and must not load models
+if __name__ != '__mp_main__':
+    warmup.start()
+startup_timings = {'import': time.perf_counter() - startup_started}
+metrics.registry.gauge('edugpt_startup_seconds', 'Cold-start import, warm-up and first query latency',
+                       startup_seconds, ('phase',))
+
+if __name__ == '__main__':
+    print("EduGPT Server Starting...")
+    print("Make sure Ollama is running: ollama serve")
+    print("Access the application at: http://localhost:5000")
+    print("Debug status at: http://localhost:5000/debug/status")
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,860 @@
+"""Offline benchmarks for chunking, ingestion, search, concurrent serving and end-to-end answers
+
+Runs against synthetic corpora with a hashing stub embedder and a local fake Ollama/Perplexity
+server, so no model downloads or network access are needed. Results are written as JSON so runs
+can be compared for regressions:
+
+    python -m utils.benchmark --sizes 1000 10000 100000 --output results.json
+    python -m utils.benchmark --sizes 10000 --index-types flat --stress-seconds 10
+    python -m utils.benchmark --sizes 1000 --startup
+    python -m utils.benchmark --sizes 1000 --embedding-backends huggingface onnx onnx-int8
+    python -m utils.benchmark --sizes 10000 --index-types flat --rerank
+    python -m utils.benchmark --sizes 100000 --index-types flat --vector-storage float32 float16 int8 --pca-dims 0 128
+    python -m utils.benchmark --sizes 1000 --index-types flat --llm-clients 16 --llm-token-delay-ms 5
+
+The embedding backend comparison and the reranking run load real models; they download them on first use.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import List, Dict, Any, Iterator, Optional
+
+import faiss
+import numpy as np
+import config
+from utils import index_factory
+from utils import embeddings
+from utils.chunker import StructuredChunker, estimate_embedding_tokens, token_counter
+from utils.document_processor import DocumentProcessor
+from utils.context_builder import estimate_tokens
+from utils.reranker import CrossEncoderScorer, Reranker
+from utils.llm_scheduler import LLMScheduler, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from utils.vector_store import VectorStore
+from utils.rag_chain import RAGChain
+
+class HashingEmbeddings:
+    """Deterministic bag-of-words stand-in for the embedding model: each word hashes to a fixed random vector"""
+    
+    def __init__(self, dimension: int = 384, buckets: int = 1 << 14, seed: int = 0):
+        self.table = np.random.default_rng(seed).standard_normal((buckets, dimension)).astype('float32')
+        self.buckets = buckets
+        self._rows = {}  # word -> table row
+    
+    def _row(self, word: str) -> int:
+        row = self._rows.get(word)
+        if row is None:
+            row = self._rows[word] = zlib.crc32(word.encode('utf-8')) % self.buckets
+        return row
+    
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        rows = []
+        starts = []
+        for text in texts:
+            starts.append(len(rows))
+            rows.extend(self._row(word) for word in (text.lower().split() or ['']))
+        vectors = np.add.reduceat(self.table[rows], starts, axis=0)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+    
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+def synthetic_documents(num_chunks: int, chunk_words: int, chunk_overlap: int, seed: int = 0,
+                        chunks_per_document: int = 50, vocabulary: int = 20000,
+                        topics: int = 200) -> Iterator[Dict[str, Any]]:
+    """Documents of Zipf-distributed pseudo-words mixed with a per-topic vocabulary, sized to chunk into num_chunks chunks"""
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    weights = 1.0 / np.arange(1, vocabulary + 1) ** 1.1
+    weights /= weights.sum()
+    step = chunk_words - chunk_overlap
+    
+    for number in range(math.ceil(num_chunks / chunks_per_document)):
+        chunks = min(chunks_per_document, num_chunks - number * chunks_per_document)
+        length = chunk_words + step * (chunks - 1)
+        topic = int(rng.integers(topics))
+        background = rng.choice(vocabulary, size=length, p=weights)
+        topical = (topic * 97 + rng.integers(0, 100, size=length)) % vocabulary
+        ids = np.where(rng.random(length) < 0.5, background, topical)
+        yield {
+            'id': f"doc{number}",
+            'filename': f"doc{number}.txt",
+            'content': ' '.join(words[ids])
+        }
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 of latencies in seconds, reported in milliseconds"""
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'mean_ms': float(np.mean(samples) * 1000)}
+
+def rss_mb() -> float:
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the per-batch progress prints of the code under test"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+class FakeLLMServer:
+    """Local stand-in for the Ollama and Perplexity HTTP APIs with a fixed per-token delay
+    
+    With shared_compute, generations share one model the way a local Ollama does: each token takes
+    token_delay times the number of generations running at that moment.
+    """
+    
+    def __init__(self, tokens: int = 64, token_delay_ms: float = 0.0, shared_compute: bool = False):
+        self.tokens = [f"token{i} " for i in range(tokens)]
+        self.token_delay = token_delay_ms / 1000.0
+        self.shared_compute = shared_compute
+        self.requests = 0
+        self.active = 0
+        self.peak_active = 0
+        self._lock = threading.Lock()
+        self._server = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> str:
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='fake-llm', daemon=True).start()
+        return self.url
+    
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+    
+    def _handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+            
+            def _send_json(self, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def _stream(self, content_type: str, lines: Iterator[str]) -> None:
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                try:
+                    for line in lines:
+                        self.wfile.write(line.encode('utf-8'))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Clients that only wait for the first token hang up early
+            
+            def _tokens(self) -> Iterator[str]:
+                with server._lock:
+                    server.active += 1
+                    server.peak_active = max(server.peak_active, server.active)
+                try:
+                    for token in server.tokens:
+                        if server.token_delay:
+                            time.sleep(server.token_delay * (server.active if server.shared_compute else 1))
+                        yield token
+                finally:
+                    with server._lock:
+                        server.active -= 1
+            
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._send_json({'models': []})
+                else:
+                    self.send_error(404)
+            
+            def do_POST(self):
+                server.requests += 1
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                stream = request.get('stream', False)
+                
+                if self.path == '/api/generate':
+                    if stream:
+                        messages = itertools.chain(
+                            ({'model': request.get('model'), 'response': token, 'done': False} for token in self._tokens()),
+                            [{'model': request.get('model'), 'response': '', 'done': True}]
+                        )
+                        self._stream('application/x-ndjson', (json.dumps(message) + "\n" for message in messages))
+                    else:
+                        self._send_json({'model': request.get('model'), 'response': ''.join(self._tokens()), 'done': True})
+                elif self.path == '/chat/completions':
+                    if stream:
+                        messages = itertools.chain(
+                            (json.dumps({'choices': [{'delta': {'content': token}}]}) for token in self._tokens()),
+                            ["[DONE]"]
+                        )
+                        self._stream('text/event-stream', (f"data: {message}\n\n" for message in messages))
+                    else:
+                        self._send_json({'choices': [{'message': {'content': ''.join(self._tokens())}}]})
+                else:
+                    self.send_error(404)
+        
+        return Handler
+
+def benchmark_chunking(documents: List[Dict[str, Any]], chunk_words: int, chunk_overlap: int):
+    """Time DocumentProcessor.chunk_text over the corpus; returns (stats, chunks per document)"""
+    processor = DocumentProcessor()
+    start = time.perf_counter()
+    chunked = []
+    for document in documents:
+        chunked.append(processor.chunk_text(document['content'], chunk_words, chunk_overlap))
+    elapsed = time.perf_counter() - start
+    words = sum(len(document['content'].split()) for document in documents)
+    chunks = sum(len(chunks) for chunks in chunked)
+    return {
+        'seconds': elapsed,
+        'words_per_second': words / elapsed,
+        'chunks_per_second': chunks / elapsed
+    }, chunked
+
+def structured_text(content: str, rng: np.random.Generator, sentence_words: int = 18,
+                    section_words: int = 400) -> str:
+    """Give a synthetic document sentence punctuation and numbered section headings to chunk on"""
+    lines = []
+    sentence = []
+    section = 0
+    for position, word in enumerate(content.split()):
+        if position % section_words == 0:
+            section += 1
+            lines.append(f"\nSection {section} Topic {word}\n")
+        sentence.append(word)
+        if rng.random() < 1 / sentence_words:
+            lines.append(' '.join(sentence) + '.')
+            sentence = []
+    if sentence:
+        lines.append(' '.join(sentence) + '.')
+    return ' '.join(lines)
+
+def benchmark_chunkers(documents: List[Dict[str, Any]], max_tokens: int, overlap_tokens: int,
+                       seed: int = 0) -> Dict[str, Any]:
+    """Legacy 1000/200-word windows against the structured chunker: chunk counts and embedding work in tokens"""
+    rng = np.random.default_rng(seed)
+    texts = [structured_text(document['content'], rng) for document in documents]
+    processor = DocumentProcessor()
+    chunker = StructuredChunker(config.EMBEDDING_MODEL, max_tokens, overlap_tokens, config.EMBEDDING_MAX_TOKENS)
+    with quiet():
+        counter = 'estimate' if token_counter(chunker.model_name) is estimate_embedding_tokens else 'tokenizer'
+    limit = chunker.model_max_tokens - 2
+    document_tokens = sum(sum(chunker.count_tokens(text.split('\n'))) for text in texts)
+    
+    def stats(chunks: List[str], seconds: float) -> Dict[str, Any]:
+        tokens = chunker.count_tokens(chunks)
+        return {
+            'chunks': len(chunks),
+            'seconds': round(seconds, 3),
+            'tokens': sum(tokens),  # Embedding work if nothing were cut off
+            'embedded_tokens': sum(min(count, limit) for count in tokens),
+            'truncated_chunks': sum(count > limit for count in tokens),
+            'lost_tokens': sum(max(count - limit, 0) for count in tokens),
+            'duplication': round(sum(tokens) / max(document_tokens, 1), 3)  # Overlap makes this exceed 1
+        }
+    
+    started = time.perf_counter()
+    windows = [chunk for text in texts for chunk in processor.chunk_text(text, 1000, 200)]
+    words = stats(windows, time.perf_counter() - started)
+    started = time.perf_counter()
+    structured = [chunk['text'] for text in texts
+                  for chunk in chunker.chunks(processor._line_blocks([(text, None)]))]
+    structured = stats(structured, time.perf_counter() - started)
+    return {
+        'documents': len(texts),
+        'document_tokens': document_tokens,
+        'token_counter': counter,
+        'words_1000_200': words,
+        f'structured_{max_tokens}_{overlap_tokens}': structured,
+        'token_reduction': round(1 - structured['tokens'] / max(words['tokens'], 1), 3)
+    }
+
+def benchmark_ingestion(store: VectorStore, documents: List[Dict[str, Any]], chunked: List[List[str]],
+                        batch_size: int) -> Dict[str, Any]:
+    """Time embedding plus indexing (FAISS, chunk store and BM25) of pre-chunked documents"""
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    # One snapshot for the whole corpus, as an ingestion job would publish it
+    with quiet(), store.update():
+        for document, chunks in zip(documents, chunked):
+            store.add_document_stream(document['id'], document['filename'],
+                                      ({'text': chunk} for chunk in chunks), batch_size)
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'chunks_per_second': len(store.documents) / elapsed,
+        'rss_growth_mb': rss_mb() - rss_before
+    }
+
+def benchmark_index(store: VectorStore, embedder: HashingEmbeddings, index_type: str,
+                    vectors: np.ndarray, ids: np.ndarray, queries: List[str], query_vectors: np.ndarray,
+                    truth: np.ndarray, k: int, work_dir: str) -> Dict[str, Any]:
+    """Build one index type over the shared vectors and measure build, search, recall, size and load"""
+    params = index_factory.resolve_params(dict(config.INDEX_PARAMS, min_vectors=0))
+    if index_type == 'ivf_pq' and vectors.shape[1] % params['pq_m']:
+        return {'index_type': index_type, 'skipped': f"pq_m={params['pq_m']} does not divide dimension {vectors.shape[1]}"}
+    
+    start = time.perf_counter()
+    with quiet():
+        index = index_factory.build_index(index_type, vectors, ids, params)
+    build_seconds = time.perf_counter() - start
+    store.index = index
+    
+    latencies = {}
+    for mode in ('dense', 'hybrid'):
+        store.retrieval_mode = mode
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search(query, k)
+            samples.append(time.perf_counter() - start)
+        latencies[mode] = percentiles(samples)
+    store.retrieval_mode = 'dense'
+    
+    _, found = index.search(query_vectors, k)
+    recall = float(np.mean([len(set(row) & set(expected)) / k for row, expected in zip(found, truth)]))
+    
+    path = os.path.join(work_dir, index_type)
+    with quiet():
+        store.save(path)
+        loaded = VectorStore(config.EMBEDDING_MODEL, index_type=index_type, index_params=params,
+                             retrieval_mode='dense', embeddings=embedder)
+        start = time.perf_counter()
+        loaded.load(path)
+        load_seconds = time.perf_counter() - start
+    
+    return {
+        'index_type': index_type,
+        'build_seconds': build_seconds,
+        'search_latency': latencies['dense'],
+        'hybrid_search_latency': latencies['hybrid'],
+        f'recall_at_{k}': recall,
+        'index_bytes': int(faiss.serialize_index(index).nbytes),
+        'disk_bytes': directory_bytes(path),
+        'load_seconds': load_seconds
+    }
+
+def benchmark_vector_storage(store: VectorStore, embedder: HashingEmbeddings, vectors: np.ndarray, ids: np.ndarray,
+                             query_vectors: np.ndarray, truth: np.ndarray, k: int, storage_modes: List[str],
+                             pca_dims: List[int]) -> List[Dict[str, Any]]:
+    """Memory, recall and latency of exact search over compressed vectors, with and without rescoring"""
+    results = []
+    for storage, pca_dim in itertools.product(storage_modes, pca_dims):
+        if pca_dim >= vectors.shape[1]:
+            continue
+        params = index_factory.resolve_params(dict(config.INDEX_PARAMS, min_vectors=0, storage=storage,
+                                                   pca_dim=pca_dim))
+        compressed = VectorStore(config.EMBEDDING_MODEL, index_type='flat', index_params=params,
+                                 retrieval_mode='dense', embeddings=embedder)
+        documents = store.documents.copy()
+        documents.keep_vectors(vectors)
+        start = time.perf_counter()
+        with quiet():
+            compressed.documents = documents
+            compressed.index = index_factory.build_index('flat', vectors, ids, params)
+        build_seconds = time.perf_counter() - start
+        
+        snapshot = compressed._current()
+        candidates = min(k * params['rescore_factor'], len(ids))
+        scores, found = compressed.index.search(query_vectors, candidates)
+        _, rescored = compressed._rescore(snapshot, query_vectors, scores, found, k)
+        recall = {
+            'plain': float(np.mean([len(set(row[:k]) & set(expected)) / k for row, expected in zip(found, truth)])),
+            'rescored': float(np.mean([len(set(row) & set(expected)) / k for row, expected in zip(rescored, truth)]))
+        }
+        
+        samples = []
+        for query_vector in query_vectors:
+            start = time.perf_counter()
+            compressed.search_by_vector(query_vector, k)
+            samples.append(time.perf_counter() - start)
+        results.append({
+            'storage': storage,
+            'pca_dim': pca_dim,
+            'build_seconds': build_seconds,
+            'bytes_per_vector': index_factory.code_size(compressed.index),
+            'index_memory_bytes': compressed.memory_bytes(),
+            'full_vectors_disk_bytes': int(vectors.nbytes) if compressed._rescores(snapshot) else 0,
+            f'recall_at_{k}': recall['plain'],
+            f'rescored_recall_at_{k}': recall['rescored'] if compressed._rescores(snapshot) else None,
+            'search_latency': percentiles(samples)
+        })
+    return results
+
+def benchmark_end_to_end(store: VectorStore, queries: List[str], tokens: int, token_delay_ms: float) -> Dict[str, Any]:
+    """Answer latency through RAGChain against the fake Ollama and Perplexity endpoints"""
+    server = FakeLLMServer(tokens, token_delay_ms)
+    settings = SimpleNamespace(**{name: getattr(config, name) for name in dir(config) if name.isupper()})
+    settings.OLLAMA_BASE_URL = settings.PERPLEXITY_BASE_URL = server.start()
+    settings.PERPLEXITY_API_KEY = "benchmark"
+    chain = RAGChain(store, settings)
+    
+    results = {}
+    try:
+        for backend, use_perplexity in (('ollama', False), ('perplexity', True)):
+            totals = []
+            first_tokens = []
+            errors = 0
+            with quiet():
+                for query in queries:
+                    start = time.perf_counter()
+                    response = chain.generate_response(query, use_perplexity)
+                    totals.append(time.perf_counter() - start)
+                    errors += chain._is_error_response(response['response'])
+                    
+                    start = time.perf_counter()
+                    for event in chain.stream_response(query, use_perplexity):
+                        if event['type'] == 'token':
+                            first_tokens.append(time.perf_counter() - start)
+                            break
+            results[backend] = {
+                'latency': percentiles(totals),
+                'first_token_latency': percentiles(first_tokens) if first_tokens else None,
+                'errors': errors
+            }
+    finally:
+        server.stop()
+    return results
+
+def benchmark_llm_scheduler(clients: int, distinct_prompts: int, tokens: int, token_delay_ms: float,
+                            limit: int) -> Dict[str, Any]:
+    """Concurrent answers against one fake local model, called directly and through the LLM scheduler
+    
+    Half the clients are summary-style background calls with their own prompts; the other half ask
+    interactive questions drawn from distinct_prompts, so some of them are identical and in flight together.
+    """
+    rng = np.random.default_rng(0)
+    questions = [f"question {int(i)}" for i in rng.integers(0, distinct_prompts, size=clients - clients // 2)]
+    calls = ([(f"summary part {i}", PRIORITY_BACKGROUND) for i in range(clients // 2)]
+                + [(question, PRIORITY_INTERACTIVE) for question in questions])
+    
+    results = {}
+    for mode in ('direct', 'scheduled'):
+        server = FakeLLMServer(tokens, token_delay_ms, shared_compute=True)
+        settings = SimpleNamespace(**{name: getattr(config, name) for name in dir(config) if name.isupper()})
+        settings.OLLAMA_BASE_URL = server.start()
+        scheduler = LLMScheduler({'ollama': limit}) if mode == 'scheduled' else None
+        chain = RAGChain(None, settings, scheduler=scheduler)
+        latencies = {PRIORITY_INTERACTIVE: [], PRIORITY_BACKGROUND: []}
+        errors = []
+        
+        def ask(prompt: str, priority: int) -> None:
+            start = time.perf_counter()
+            response = chain.get_local_response(prompt, "", priority)
+            latencies[priority].append(time.perf_counter() - start)
+            if chain._is_error_response(response):
+                errors.append(response)
+        
+        threads = [threading.Thread(target=ask, args=call) for call in calls]
+        start = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            server.stop()
+        results[mode] = {
+            'seconds': time.perf_counter() - start,
+            'generations': server.requests,
+            'peak_concurrent_generations': server.peak_active,
+            'interactive_latency': percentiles(latencies[PRIORITY_INTERACTIVE]),
+            'background_latency': percentiles(latencies[PRIORITY_BACKGROUND]) if latencies[PRIORITY_BACKGROUND] else None,
+            'errors': len(errors)
+        }
+        if scheduler is not None:
+            results[mode]['scheduler'] = scheduler.stats()['ollama']
+    return dict(results, clients=clients, distinct_prompts=distinct_prompts, limit=limit)
+
+def benchmark_concurrency(store: VectorStore, queries: List[str], seconds: float, readers: int,
+                          chunks_per_write: int, work_dir: str) -> Dict[str, Any]:
+    """Stress test: reader threads search while a writer keeps adding, removing and saving documents
+    
+    Each write is one snapshot, so a reader must only ever see a stress document with all of its
+    chunks; anything else, and any exception, is counted as a failure.
+    """
+    path = os.path.join(work_dir, 'concurrency')
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+    failures = []
+    writes = {'added': 0, 'removed': 0, 'saved': 0}
+    
+    def read(samples: List[float], seed: int) -> None:
+        rng = np.random.default_rng(seed)
+        while not stop.is_set():
+            query = queries[int(rng.integers(len(queries)))]
+            try:
+                start = time.perf_counter()
+                results = store.search(query, 5)
+                samples.append(time.perf_counter() - start)
+                if any(result['document'] is None for result in results):
+                    failures.append('result without metadata')
+                for document in store.list_documents():
+                    if document['id'].startswith('stress') and document['chunks'] != chunks_per_write:
+                        failures.append(f"partial document {document['id']}: {document['chunks']} chunks")
+            except Exception as e:
+                failures.append(repr(e))
+    
+    def write() -> None:
+        for number in itertools.count():
+            if stop.is_set():
+                break
+            try:
+                document_id = f"stress{number}"
+                chunks = [{'text': f"{queries[(number + i) % len(queries)]} stress {number} {i}"}
+                          for i in range(chunks_per_write)]
+                store.add_document_stream(document_id, f"{document_id}.txt", iter(chunks), batch_size=8)
+                writes['added'] += 1
+                if number % 2:
+                    store.remove_document(f"stress{number - 1}")
+                    writes['removed'] += 1
+                if number % 10 == 0:
+                    store.save(path)
+                    writes['saved'] += 1
+            except Exception as e:
+                failures.append(repr(e))
+    
+    threads = [threading.Thread(target=read, args=(latencies[i], i)) for i in range(readers)]
+    threads.append(threading.Thread(target=write))
+    with quiet():
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        
+        store.save(path)
+        start = time.perf_counter()
+        for _ in range(10):
+            store.load(path)
+        repeat_load_seconds = (time.perf_counter() - start) / 10
+    
+    samples = [sample for reader in latencies for sample in reader]
+    return {
+        'seconds': seconds,
+        'readers': readers,
+        'searches_per_second': len(samples) / seconds,
+        'search_latency': percentiles(samples) if samples else None,
+        'writes': writes,
+        'failures': len(failures),
+        'failure_examples': failures[:5],
+        'repeat_load_seconds': repeat_load_seconds
+    }
+
+# Runs in a fresh interpreter so imports, model loading and index loading are all cold
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+result = {'import_seconds': time.perf_counter() - started}
+result['ready'] = app.warmup.wait(600)
+result['ready_seconds'] = time.perf_counter() - started
+client = app.app.test_client()
+if sys.argv[1] == 'ingest':
+    job = client.post('/process-documents', data={'collection': 'benchmark', 'files': (open(sys.argv[2], 'rb'), 'corpus.txt')},
+                      content_type='multipart/form-data').get_json()
+    while client.get('/jobs/' + job['job_id'] + '?collection=benchmark').get_json()['status'] in ('queued', 'running'):
+        time.sleep(0.1)
+else:
+    for name in ('first_query_seconds', 'second_query_seconds'):
+        start = time.perf_counter()
+        client.post('/chat', json={'message': sys.argv[2], 'collection': 'benchmark'})
+        result[name] = time.perf_counter() - start
+sys.stderr.flush()
+print('STARTUP_RESULT ' + json.dumps(result))
+'''
+
+def benchmark_startup(documents: List[Dict[str, Any]], query: str, work_dir: str) -> Dict[str, Any]:
+    """Cold start of the Flask app, with and without background warm-up, using its real embedding model
+    
+    A first process ingests the corpus into a collection; then fresh processes import the app and time
+    readiness and the first two /chat requests (answered by the fake LLM server).
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    app_dir = os.path.join(work_dir, 'startup')
+    os.makedirs(app_dir, exist_ok=True)
+    corpus_path = os.path.join(app_dir, 'corpus.txt')
+    with open(corpus_path, 'w') as f:
+        f.write('\n'.join(document['content'] for document in documents))
+    
+    server = FakeLLMServer()
+    env = dict(os.environ, OLLAMA_BASE_URL=server.start(),
+               PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    
+    def run(mode: str, argument: str, warmup: bool) -> Dict[str, Any]:
+        completed = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, mode, argument], cwd=app_dir,
+                                   env=dict(env, WARMUP_ENABLED='1' if warmup else '0'),
+                                   capture_output=True, text=True)
+        for line in completed.stdout.splitlines():
+            if line.startswith('STARTUP_RESULT '):
+                return json.loads(line[len('STARTUP_RESULT '):])
+        raise RuntimeError(f"Startup run failed: {completed.stderr[-2000:]}")
+    
+    try:
+        run('ingest', corpus_path, warmup=False)
+        return {
+            'warmup': run('query', query, warmup=True),
+            'no_warmup': run('query', query, warmup=False)
+        }
+    finally:
+        server.stop()
+
+def benchmark_embedding_backends(texts: List[str], backends: List[str], threads: int,
+                                 batch_size: int) -> List[Dict[str, Any]]:
+    """Embedding throughput of each backend on the same chunks, and its cosine agreement with the first"""
+    results = []
+    reference = None
+    for name in backends:
+        backend = embeddings.create_backend(name, config.EMBEDDING_MODEL, threads, config.EMBEDDING_ONNX_DIR,
+                                            config.EMBEDDING_MAX_BATCH_TOKENS, batch_size, config.EMBEDDING_MAX_TOKENS)
+        backend.embed_documents(texts[:batch_size])  # Warm-up
+        started = time.perf_counter()
+        for start in range(0, len(texts), batch_size):
+            backend.embed_documents(texts[start:start + batch_size])
+        seconds = time.perf_counter() - started
+        query_started = time.perf_counter()
+        for text in texts[:50]:
+            backend.embed_query(text)
+        result = {
+            'backend': name,
+            'chunks_per_second': round(len(texts) / seconds, 1),
+            'query_ms': round((time.perf_counter() - query_started) * 1000 / min(50, len(texts)), 2)
+        }
+        if reference is None:
+            reference = backend
+        else:
+            result['agreement'] = embeddings.cosine_agreement(reference, backend)
+            result['chunk_agreement'] = embeddings.cosine_agreement(reference, backend, texts[:256])
+        results.append(result)
+    return results
+
+def benchmark_rerank(store: VectorStore, queries: List[str], sources: List[str], scorer, top_n: int,
+                     k: int, fallback_k: int, budget_ms: float) -> Dict[str, Any]:
+    """How often a query's source chunk is among the chunks sent to the LLM, with and without reranking
+    
+    Also reports reranking latency (cold and with cached scores), how often the budget cut it short,
+    and the context tokens sent either way.
+    """
+    reranker = Reranker(scorer, top_n=top_n, budget_ms=budget_ms)
+    with quiet():
+        candidates = store.search_batch(queries, k=top_n)
+    
+    def hit_rate(result_lists: List[List[Dict[str, Any]]], depth: int) -> float:
+        hits = sum(source in [result['document']['chunk'] for result in results[:depth]]
+                   for source, results in zip(sources, result_lists))
+        return round(hits / max(len(sources), 1), 4)
+    
+    def context_tokens(result_lists: List[List[Dict[str, Any]]]) -> float:
+        return round(sum(estimate_tokens(result['document']['chunk']) for results in result_lists
+                         for result in results) / max(len(result_lists), 1), 1)
+    
+    reranker.scorer.score(queries[0], [sources[0]])  # Load the model outside the timings
+    passes = {}
+    for name in ('cold', 'cached'):
+        latencies = []
+        reranked = []
+        for query, results in zip(queries, candidates):
+            started = time.perf_counter()
+            reranked.append(reranker.rerank(query, results, k, fallback_k, started=started))
+            latencies.append(time.perf_counter() - started)
+        passes[name] = percentiles(latencies)
+    return {
+        'candidates': top_n,
+        'budget_ms': budget_ms,
+        f'retrieval_hit_rate@{fallback_k}': hit_rate(candidates, fallback_k),
+        f'retrieval_hit_rate@{k}': hit_rate(candidates, k),
+        f'reranked_hit_rate@{k}': hit_rate(reranked, k),
+        'latency_ms': passes,
+        'outcomes': dict(reranker.counts),
+        'context_tokens': {
+            f'retrieval_top{fallback_k}': context_tokens([results[:fallback_k] for results in candidates]),
+            'reranked': context_tokens(reranked)
+        }
+    }
+
+def run_size(size: int, args: argparse.Namespace, embedder: HashingEmbeddings, work_dir: str) -> Dict[str, Any]:
+    log(f"[{size} chunks] generating corpus")
+    documents = list(synthetic_documents(size, args.chunk_words, args.chunk_overlap, args.seed))
+    chunking, chunked = benchmark_chunking(documents, args.chunk_words, args.chunk_overlap)
+    chunking['chunkers'] = benchmark_chunkers(documents[:args.chunker_documents], config.CHUNK_MAX_TOKENS,
+                                              config.CHUNK_OVERLAP_TOKENS, args.seed)
+    backends = None
+    if args.embedding_backends and size == args.sizes[0]:
+        log(f"[{size} chunks] comparing embedding backends")
+        texts = [chunk for chunks in chunked for chunk in chunks][:args.embedding_texts]
+        backends = benchmark_embedding_backends(texts, args.embedding_backends, config.EMBEDDING_THREADS,
+                                                args.batch_size)
+    
+    # Queries are short word runs taken from random chunks
+    rng = np.random.default_rng(args.seed + 1)
+    all_chunks = [chunk for chunks in chunked for chunk in chunks]
+    queries = []
+    sources = []  # The chunk each query was taken from
+    for position in rng.choice(len(all_chunks), size=min(args.queries, len(all_chunks)), replace=False):
+        words = all_chunks[position].split()
+        offset = int(rng.integers(0, max(1, len(words) - args.query_words)))
+        queries.append(' '.join(words[offset:offset + args.query_words]))
+        sources.append(all_chunks[position])
+    del all_chunks
+    
+    log(f"[{size} chunks] ingesting")
+    store = VectorStore(config.EMBEDDING_MODEL, index_type='flat', retrieval_mode='dense',
+                        hybrid_candidates=config.HYBRID_CANDIDATES, rrf_k=config.RRF_K, embeddings=embedder)
+    ingestion = benchmark_ingestion(store, documents, chunked, args.batch_size)
+    del documents, chunked
+    
+    ids = store.documents.ids()
+    vectors = store.index.reconstruct_batch(ids)
+    query_vectors = store.embed_queries(queries)
+    _, truth = store.index.search(query_vectors, args.k)
+    
+    indexes = []
+    for index_type in args.index_types:
+        log(f"[{size} chunks] benchmarking {index_type} index")
+        indexes.append(benchmark_index(store, embedder, index_type, vectors, ids, queries,
+                                       query_vectors, truth, args.k, work_dir))
+    
+    result = {
+        'chunks': len(store.documents),
+        'chunking': chunking,
+        'ingestion': ingestion,
+        'rss_mb': rss_mb(),
+        'indexes': indexes
+    }
+    if args.vector_storage:
+        log(f"[{size} chunks] compressed vector storage")
+        result['vector_storage'] = benchmark_vector_storage(store, embedder, vectors, ids, query_vectors, truth,
+                                                            args.k, args.vector_storage, args.pca_dims)
+    if backends:
+        result['embedding_backends'] = backends
+    if args.end_to_end or args.stress_seconds or args.rerank:
+        store.index = index_factory.build_index('flat', vectors, ids, store.index_params)
+    if args.rerank:
+        log(f"[{size} chunks] cross-encoder reranking")
+        result['rerank'] = benchmark_rerank(store, queries, sources, CrossEncoderScorer(config.RERANK_MODEL),
+                                            config.RERANK_CANDIDATES, config.RERANK_TOP_K,
+                                            config.RETRIEVAL_TOP_K, config.RERANK_BUDGET_MS)
+    if args.stress_seconds:
+        log(f"[{size} chunks] concurrent search and write stress test")
+        result['concurrency'] = benchmark_concurrency(store, queries, args.stress_seconds, args.stress_readers,
+                                                      args.stress_chunks, work_dir)
+    if args.startup and size == args.sizes[0]:
+        log(f"[{size} chunks] app cold start")
+        corpus = list(synthetic_documents(size, args.chunk_words, args.chunk_overlap, args.seed))
+        result['startup'] = benchmark_startup(corpus, queries[0], work_dir)
+    if args.llm_clients and size == args.sizes[0]:
+        log(f"[{size} chunks] concurrent LLM requests with and without the scheduler")
+        result['llm_scheduler'] = benchmark_llm_scheduler(args.llm_clients, args.llm_distinct_prompts, args.llm_tokens,
+                                                          args.llm_token_delay_ms, config.LLM_CONCURRENCY['ollama'])
+    if args.end_to_end:
+        log(f"[{size} chunks] end-to-end answers")
+        result['end_to_end'] = benchmark_end_to_end(store, queries[:args.e2e_queries],
+                                                    args.llm_tokens, args.llm_token_delay_ms)
+    return result
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Offline retrieval and RAG benchmarks on synthetic corpora")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Corpus sizes in chunks (up to 1000000)")
+    parser.add_argument('--index-types', nargs='+', default=list(index_factory.INDEX_TYPES),
+                        choices=index_factory.INDEX_TYPES)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--query-words', type=int, default=12)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--chunk-words', type=int, default=100)
+    parser.add_argument('--chunk-overlap', type=int, default=20)
+    parser.add_argument('--chunker-documents', type=int, default=100,
+                        help="Documents used to compare word-window and structured chunking")
+    parser.add_argument('--batch-size', type=int, default=config.EMBEDDING_BATCH_SIZE)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--end-to-end', action='store_true', help="Also time RAGChain answers against a fake LLM server")
+    parser.add_argument('--e2e-queries', type=int, default=50)
+    parser.add_argument('--llm-tokens', type=int, default=64)
+    parser.add_argument('--llm-token-delay-ms', type=float, default=0.0)
+    parser.add_argument('--llm-clients', type=int, default=0,
+                        help="Also send this many concurrent LLM requests to a fake model, with and without the scheduler")
+    parser.add_argument('--llm-distinct-prompts', type=int, default=3,
+                        help="Distinct questions the interactive LLM clients pick from")
+    parser.add_argument('--stress-seconds', type=float, default=0,
+                        help="Also run concurrent searches against a writer for this long")
+    parser.add_argument('--stress-readers', type=int, default=8)
+    parser.add_argument('--stress-chunks', type=int, default=20, help="Chunks per document the stress writer adds")
+    parser.add_argument('--startup', action='store_true',
+                        help="Also time app cold start and first query, with and without warm-up, on the first size")
+    parser.add_argument('--embedding-backends', nargs='*', default=[], choices=embeddings.BACKENDS,
+                        help="Also compare real embedding backends (the first is the reference) on the first size")
+    parser.add_argument('--embedding-texts', type=int, default=1000, help="Chunks embedded per backend")
+    parser.add_argument('--rerank', action='store_true',
+                        help="Also measure cross-encoder reranking: source-chunk hit rate, latency and context size")
+    parser.add_argument('--vector-storage', nargs='*', default=[], choices=index_factory.VECTOR_STORAGE,
+                        help="Also compare memory and recall of these vector storage modes on a Flat index")
+    parser.add_argument('--pca-dims', type=int, nargs='+', default=[0],
+                        help="PCA dimensions to combine with each storage mode (0 keeps every dimension)")
+    parser.add_argument('--output', help="Write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+    
+    embedder = HashingEmbeddings(args.dimension, seed=args.seed)
+    work_dir = tempfile.mkdtemp(prefix="edugpt-benchmark-")
+    try:
+        runs = [dict(size=size, **run_size(size, args, embedder, work_dir)) for size in args.sizes]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'faiss': faiss.__version__,
+            'numpy': np.__version__
+        },
+        'parameters': {name: value for name, value in vars(args).items() if name != 'output'},
+        'runs': runs
+    }
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        log(f"Results written to {args.output}")
+    else:
+        print(output)
+    return report
+
+if __name__ == '__main__':
+    main()
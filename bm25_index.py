@@ -0,0 +1,122 @@
+import heapq
+import math
+import os
+import pickle
+import re
+from collections import Counter, defaultdict
+from typing import List, Dict, Iterable, Tuple
+
+# Keeps codes and numbers such as "cs-101", "theorem 4.2" or "x_1" as single terms
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-]\w+)*")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring, keyed by the same chunk IDs as the FAISS index"""
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {chunk_id: term frequency}
+        self.lengths = {}  # chunk_id -> number of terms
+        self.total_length = 0
+        self._owned = set()  # Terms whose posting dict is not shared with another copy
+    
+    def __len__(self) -> int:
+        return len(self.lengths)
+    
+    def copy(self) -> 'BM25Index':
+        """Copy sharing posting dicts with this index; either side duplicates a posting before first changing it"""
+        self._owned = set()
+        index = BM25Index(self.k1, self.b)
+        index.postings = defaultdict(dict, self.postings)
+        index.lengths = dict(self.lengths)
+        index.total_length = self.total_length
+        return index
+    
+    def _posting(self, term: str) -> Dict[int, int]:
+        """Posting dict of a term that is safe to modify"""
+        if term not in self._owned:
+            self.postings[term] = dict(self.postings.get(term, {}))
+            self._owned.add(term)
+        return self.postings[term]
+    
+    def add(self, chunk_ids: Iterable[int], texts: Iterable[str]) -> None:
+        for chunk_id, text in zip(chunk_ids, texts):
+            chunk_id = int(chunk_id)
+            terms = tokenize(text)
+            for term, frequency in Counter(terms).items():
+                self._posting(term)[chunk_id] = frequency
+            self.lengths[chunk_id] = len(terms)
+            self.total_length += len(terms)
+    
+    def remove(self, chunk_ids: Iterable[int]) -> None:
+        removed = {int(chunk_id) for chunk_id in chunk_ids if int(chunk_id) in self.lengths}
+        if not removed:
+            return
+        for chunk_id in removed:
+            self.total_length -= self.lengths.pop(chunk_id)
+        for term in list(self.postings):
+            matches = removed.intersection(self.postings[term])
+            if not matches:
+                continue
+            posting = self._posting(term)
+            for chunk_id in matches:
+                del posting[chunk_id]
+            if not posting:
+                del self.postings[term]
+                self._owned.discard(term)
+    
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Top-k (chunk_id, BM25 score) pairs for the query terms"""
+        if not self.lengths:
+            return []
+        
+        count = len(self.lengths)
+        average_length = self.total_length / count
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, frequency in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average_length)
+                scores[chunk_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    
+    def save(self, path: str) -> None:
+        file_path = os.path.join(path, "bm25.pkl")
+        with open(file_path + ".tmp", 'wb') as f:
+            pickle.dump({
+                'k1': self.k1,
+                'b': self.b,
+                'postings': dict(self.postings),
+                'lengths': self.lengths,
+                'total_length': self.total_length
+            }, f)
+        os.replace(file_path + ".tmp", file_path)
+    
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        with open(os.path.join(path, "bm25.pkl"), 'rb') as f:
+            data = pickle.load(f)
+        index = cls(data['k1'], data['b'])
+        index.postings = defaultdict(dict, data['postings'])
+        index.lengths = data['lengths']
+        index.total_length = data['total_length']
+        return index
+    
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "bm25.pkl"))
+
+def reciprocal_rank_fusion(rankings: List[List[int]], rrf_k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse several ranked ID lists; each list contributes 1 / (rrf_k + rank)"""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] += 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,224 @@
+"""Offline ingestion of a whole directory tree of course materials into a collection
+
+    python -m utils.bulk_ingest /srv/library --collection physics-101
+    python -m utils.bulk_ingest /srv/library --store ./vector_store/default --checkpoint-files 500
+
+PDF, DOCX and TXT files are extracted in parallel across cores and embedded in batches by the same
+pipeline the app uses. The store is saved every --checkpoint-files files together with a manifest of
+file content hashes, so a run that crashes or is interrupted resumes from its last checkpoint, and
+files whose content is already indexed are skipped. Stop the app (or use another collection) while
+this runs: both would write the same files.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import List, Dict, Any, Optional
+
+import config
+from utils import index_factory
+from utils.chunker import StructuredChunker
+from utils.embedding_cache import EmbeddingCache
+from utils.embeddings import cache_model_name, create_backend
+from utils.ingestion import IngestionPipeline
+from utils.store_manager import StoreManager
+from utils.vector_store import VectorStore
+
+EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt')
+MANIFEST_FILE = "ingest_manifest.json"
+
+def find_files(root: str) -> List[str]:
+    """Supported files under root, in a stable order"""
+    paths = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        paths.extend(os.path.join(directory, filename) for filename in sorted(filenames)
+                     if os.path.splitext(filename)[1].lower() in EXTENSIONS)
+    return paths
+
+def content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(store_path: str) -> Dict[str, Any]:
+    """Files indexed so far: relative path -> {'document_id', 'size', 'mtime_ns', 'chunks'}"""
+    manifest_path = os.path.join(store_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {'files': {}}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(store_path: str, manifest: Dict[str, Any]) -> None:
+    manifest_path = os.path.join(store_path, MANIFEST_FILE)
+    with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+def plan_files(root: str, manifest: Dict[str, Any], indexed: set) -> Dict[str, Any]:
+    """Split the tree into files to ingest and files that are already indexed
+    
+    Unchanged files (same size and mtime as in the manifest) are not even hashed. Files are
+    identified by content, so renamed, copied or touched files are not embedded again.
+    """
+    files = manifest['files']
+    pending = []
+    pending_ids = set()
+    skipped = 0
+    for path in find_files(root):
+        relative = os.path.relpath(path, root)
+        stat = os.stat(path)
+        entry = files.get(relative)
+        if (entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+                and (entry['document_id'] in indexed or entry['chunks'] == 0)):
+            skipped += 1
+            continue
+        
+        document_id = f"sha256-{content_hash(path)[:32]}"
+        record = {'document_id': document_id, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if document_id in indexed:
+            files[relative] = dict(record, chunks=next(
+                (other['chunks'] for other in files.values() if other['document_id'] == document_id), 0))
+            skipped += 1
+        elif document_id in pending_ids:
+            # A copy of a file earlier in this run; recorded once that file's checkpoint is saved
+            pending.append({'relative': relative, 'record': record, 'duplicate': True})
+        else:
+            pending_ids.add(document_id)
+            pending.append({'relative': relative, 'record': record, 'duplicate': False,
+                            'file': {'id': document_id, 'filename': relative, 'path': path},
+                            'replaces': entry['document_id'] if entry is not None else None})
+    return {'pending': pending, 'skipped': skipped}
+
+def ingest_tree(root: str, store: VectorStore, store_path: str, pipeline: IngestionPipeline,
+                checkpoint_files: int = 100) -> Dict[str, Any]:
+    """Ingest every new or changed file under root, saving the store every checkpoint_files files"""
+    started = time.perf_counter()
+    manifest = load_manifest(store_path)
+    indexed = {document['id'] for document in store.list_documents()}
+    plan = plan_files(root, manifest, indexed)
+    pending = plan['pending']
+    work = [item for item in pending if not item['duplicate']]
+    print(f"{len(work)} files to ingest, {plan['skipped']} already indexed")
+    
+    totals = {'files': 0, 'chunks': 0, 'errors': [], 'checkpoints': 0,
+              'timings': {'extract': 0.0, 'embed': 0.0, 'index': 0.0}}
+    chunk_counts = {}  # document id -> chunks, for files ingested in this run
+    for start in range(0, len(work), checkpoint_files):
+        group = work[start:start + checkpoint_files]
+        result = pipeline.ingest([item['file'] for item in group])
+        for document in result['documents']:
+            chunk_counts[document['id']] = document['chunks']
+        failed = {error['id'] for error in result['errors']}
+        totals['errors'].extend(result['errors'])
+        
+        # A changed file replaces the document its old content was indexed as, unless another file still has it
+        for item in group:
+            old_id = item['replaces']
+            if item['file']['id'] in failed or old_id is None or old_id == item['file']['id']:
+                continue
+            manifest['files'].pop(item['relative'], None)
+            if all(entry['document_id'] != old_id for entry in manifest['files'].values()):
+                store.remove_document(old_id)
+        
+        store.save(store_path)
+        # The manifest only records files once the store holding them is on disk
+        done = {item['file']['id'] for item in group} - failed
+        for item in pending:
+            if item['record']['document_id'] in done:
+                manifest['files'][item['relative']] = dict(item['record'],
+                                                           chunks=chunk_counts.get(item['record']['document_id'], 0))
+        save_manifest(store_path, manifest)
+        
+        totals['files'] += len(group) - len(failed)
+        totals['chunks'] += sum(document['chunks'] for document in result['documents'])
+        totals['checkpoints'] += 1
+        for stage in totals['timings']:
+            totals['timings'][stage] += result['timings'].get(stage, 0.0)
+        elapsed = time.perf_counter() - started
+        print(f"Checkpoint {totals['checkpoints']}: {start + len(group)}/{len(work)} files, "
+              f"{totals['chunks']} chunks, {totals['files'] / elapsed:.2f} files/s, "
+              f"{totals['chunks'] / elapsed:.1f} chunks/s")
+    
+    seconds = time.perf_counter() - started
+    return {
+        'files_found': len(pending) + plan['skipped'],
+        'files_skipped': plan['skipped'],
+        'files_duplicate': len(pending) - len(work),
+        'files_ingested': totals['files'],
+        'chunks': totals['chunks'],
+        'errors': totals['errors'],
+        'checkpoints': totals['checkpoints'],
+        'seconds': round(seconds, 3),
+        'files_per_second': round(totals['files'] / seconds, 3) if seconds else None,
+        'chunks_per_second': round(totals['chunks'] / seconds, 1) if seconds else None,
+        'timings': {stage: round(value, 3) for stage, value in totals['timings'].items()},
+        'store_chunks': len(store.documents)
+    }
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Ingest a directory tree of PDF/DOCX/TXT files into a vector store")
+    parser.add_argument('root', help="Directory to ingest recursively")
+    parser.add_argument('--collection', default=config.DEFAULT_COLLECTION,
+                        help="Collection under the app's vector store directory")
+    parser.add_argument('--store', help="Vector store directory to write instead of a collection")
+    parser.add_argument('--workers', type=int, default=config.INGEST_WORKERS, help="Extraction processes")
+    parser.add_argument('--batch-size', type=int, default=config.EMBEDDING_BATCH_SIZE)
+    parser.add_argument('--embedding-backend', default=config.EMBEDDING_BACKEND)
+    parser.add_argument('--vector-storage', default=index_factory.resolve_params(config.INDEX_PARAMS)['storage'],
+                        choices=index_factory.VECTOR_STORAGE, help="How the index stores vectors")
+    parser.add_argument('--pca-dim', type=int, default=index_factory.resolve_params(config.INDEX_PARAMS)['pca_dim'],
+                        help="Reduce vectors to this many dimensions, 0 keeps them all")
+    parser.add_argument('--checkpoint-files', type=int, default=100, help="Files ingested between saves")
+    parser.add_argument('--output', help="Also write the summary as JSON here")
+    args = parser.parse_args(argv)
+    
+    if not os.path.isdir(args.root):
+        parser.error(f"Not a directory: {args.root}")
+    if args.store:
+        store_path = args.store
+    elif StoreManager.valid_name(args.collection):
+        store_path = os.path.join(config.VECTOR_STORE_PATH, args.collection)
+    else:
+        parser.error('Collection names may only contain letters, digits, "-" and "_"')
+    os.makedirs(store_path, exist_ok=True)
+    
+    store = VectorStore(
+        config.EMBEDDING_MODEL,
+        index_type=config.INDEX_TYPE,
+        index_params=dict(config.INDEX_PARAMS, storage=args.vector_storage, pca_dim=args.pca_dim),
+        retrieval_mode=config.RETRIEVAL_MODE,
+        hybrid_candidates=config.HYBRID_CANDIDATES,
+        rrf_k=config.RRF_K,
+        embeddings=create_backend(args.embedding_backend, config.EMBEDDING_MODEL, config.EMBEDDING_THREADS,
+                                  config.EMBEDDING_ONNX_DIR, config.EMBEDDING_MAX_BATCH_TOKENS, args.batch_size,
+                                  config.EMBEDDING_MAX_TOKENS),
+        embedding_cache=EmbeddingCache(config.EMBEDDING_CACHE_PATH,
+                                       cache_model_name(config.EMBEDDING_MODEL, args.embedding_backend),
+                                       config.EMBEDDING_CACHE_MAX_ENTRIES)
+    )
+    if VectorStore.exists(store_path) and not store.load(store_path):
+        raise SystemExit(f"Could not load the vector store at {store_path}")
+    
+    chunker = StructuredChunker(config.EMBEDDING_MODEL, config.CHUNK_MAX_TOKENS, config.CHUNK_OVERLAP_TOKENS,
+                                config.EMBEDDING_MAX_TOKENS) if config.CHUNKER == 'structured' else None
+    pipeline = IngestionPipeline(store, workers=args.workers, batch_size=args.batch_size,
+                                 embedding_threads=config.EMBEDDING_THREADS, chunker=chunker,
+                                 embedding_backend=args.embedding_backend)
+    summary = ingest_tree(args.root, store, store_path, pipeline, max(1, args.checkpoint_files))
+    
+    for error in summary['errors']:
+        print(f"Error processing {error['filename']}: {error['error']}")
+    print(f"Ingested {summary['files_ingested']} files ({summary['chunks']} chunks) in {summary['seconds']:.1f}s: "
+          f"{summary['files_per_second']} files/s, {summary['chunks_per_second']} chunks/s; "
+          f"{summary['files_skipped']} already indexed, {len(summary['errors'])} failed")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+if __name__ == '__main__':
+    main()
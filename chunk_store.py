@@ -0,0 +1,381 @@
+import json
+import os
+import pickle
+import numpy as np
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+TEXT_FILE = "chunks_text.bin"
+VECTORS_FILE = "chunks_vectors.bin"
+META_FILE = "chunks_meta.json"
+COLUMNS = {
+    'ids': 'int64',  # FAISS chunk ID, ascending
+    'offsets': 'int64',  # Start of each chunk in the text blob (plus a final end offset)
+    'document': 'int32',  # Row in the document table
+    'chunk': 'int32',  # Chunk number within its document
+    'filename': 'int32',  # Row in the filename table
+    'page': 'int32',  # Source page of the chunk's first word, -1 when unknown
+    'section': 'int32',  # Row in the section table (heading the chunk falls under), -1 when unknown
+}
+
+class ChunkStore:
+    """Columnar chunk metadata: one UTF-8 text blob plus fixed-width arrays, memory-mapped on load"""
+    
+    def __init__(self):
+        self.document_ids = []  # Document table: row -> document_id
+        self.filenames = []  # Filename table: row -> filename
+        self.sections = []  # Section table: row -> heading text
+        self.next_id = 0
+        self.vector_dimension = None  # Set when full-precision vectors are kept next to a compressed index
+        self._document_rows = {}
+        self._filename_rows = {}
+        self._section_rows = {}
+        
+        # Rows loaded from disk (memory-mapped, read-only) and which of them are still live
+        self._base = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self._base['offsets'] = np.zeros(1, dtype='int64')
+        self._text = np.zeros(0, dtype=np.uint8)
+        self._vectors = np.zeros((0, 0), dtype='float32')
+        self._alive = np.zeros(0, dtype=bool)
+        self._removed = 0
+        
+        # Rows added since the last save, keyed by FAISS chunk ID
+        self._pending = {}
+        self._pending_vectors = {}
+    
+    def __len__(self) -> int:
+        return len(self._alive) - self._removed + len(self._pending)
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in np.flatnonzero(self._alive):
+            yield self._base_row(row)
+        yield from (dict(metadata) for metadata in self._pending.values())
+    
+    def items(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Live chunks as (FAISS ID, metadata) pairs"""
+        for row in np.flatnonzero(self._alive):
+            yield int(self._base['ids'][row]), self._base_row(row)
+        yield from ((chunk_id, dict(metadata)) for chunk_id, metadata in self._pending.items())
+    
+    def copy(self) -> 'ChunkStore':
+        """Independent copy that shares the read-only memory-mapped columns and text blob"""
+        store = ChunkStore()
+        store.document_ids = list(self.document_ids)
+        store.filenames = list(self.filenames)
+        store.sections = list(self.sections)
+        store.next_id = self.next_id
+        store.vector_dimension = self.vector_dimension
+        store._document_rows = dict(self._document_rows)
+        store._filename_rows = dict(self._filename_rows)
+        store._section_rows = dict(self._section_rows)
+        store._base = dict(self._base)
+        store._text = self._text
+        store._vectors = self._vectors
+        store._alive = self._alive.copy()
+        store._removed = self._removed
+        store._pending = dict(self._pending)
+        store._pending_vectors = dict(self._pending_vectors)
+        return store
+    
+    def add_chunks(self, document_id: str, filename: str, chunks: List[str],
+                   pages: Optional[List[Optional[int]]] = None, first_chunk: int = 0,
+                   sections: Optional[List[Optional[str]]] = None,
+                   vectors: Optional[np.ndarray] = None) -> np.ndarray:
+        """Append a document's chunks and return their newly allocated FAISS IDs
+        
+        vectors are only kept if the store keeps full-precision vectors (see keep_vectors).
+        """
+        ids = np.arange(self.next_id, self.next_id + len(chunks), dtype='int64')
+        pages = pages or [None] * len(chunks)
+        sections = sections or [None] * len(chunks)
+        for chunk_id, (i, chunk), page, section in zip(ids, enumerate(chunks, start=first_chunk), pages, sections):
+            self._add_row(int(chunk_id), {
+                'document_id': document_id,
+                'filename': filename,
+                'chunk': chunk,
+                'chunk_id': i,
+                'page': page,
+                'section': section
+            })
+        if vectors is not None and self.vector_dimension is not None:
+            for chunk_id, vector in zip(ids, vectors):
+                self._pending_vectors[int(chunk_id)] = np.asarray(vector, dtype='float32')
+        self.next_id += len(chunks)
+        return ids
+    
+    def keep_vectors(self, vectors: np.ndarray) -> None:
+        """Start keeping full-precision vectors, given those of every live chunk in ids() order"""
+        vectors = np.asarray(vectors, dtype='float32')
+        live = np.flatnonzero(self._alive)
+        self.vector_dimension = vectors.shape[1]
+        self._vectors = np.zeros((len(self._alive), self.vector_dimension), dtype='float32')
+        self._vectors[live] = vectors[:len(live)]
+        self._pending_vectors = {chunk_id: vector for chunk_id, vector in
+                                 zip(sorted(self._pending), vectors[len(live):])}
+    
+    def vectors(self, chunk_ids: np.ndarray) -> Optional[np.ndarray]:
+        """Full-precision vectors of the given chunks, or None if the store does not keep them"""
+        if self.vector_dimension is None:
+            return None
+        vectors = np.zeros((len(chunk_ids), self.vector_dimension), dtype='float32')
+        # Pending chunks have larger IDs than every saved one, so they sort past the end of the saved rows
+        rows = np.searchsorted(self._base['ids'], chunk_ids)
+        saved = rows < len(self._vectors)
+        vectors[saved] = self._vectors[rows[saved]]
+        for i in np.flatnonzero(~saved):
+            vectors[i] = self._pending_vectors[int(chunk_ids[i])]
+        return vectors
+    
+    def get(self, chunk_id: int) -> Optional[Dict[str, Any]]:
+        """Materialize the metadata for a single chunk, or None if it does not exist"""
+        if chunk_id in self._pending:
+            return dict(self._pending[chunk_id])
+        ids = self._base['ids']
+        row = int(np.searchsorted(ids, chunk_id))
+        if row < len(ids) and ids[row] == chunk_id and self._alive[row]:
+            return self._base_row(row)
+        return None
+    
+    def remove_document(self, document_id: str) -> List[int]:
+        """Drop every chunk of a document and return the removed FAISS IDs"""
+        removed = [chunk_id for chunk_id, metadata in self._pending.items()
+                   if metadata['document_id'] == document_id]
+        for chunk_id in removed:
+            del self._pending[chunk_id]
+            self._pending_vectors.pop(chunk_id, None)
+        
+        document_row = self._document_rows.get(document_id)
+        if document_row is not None:
+            rows = np.flatnonzero(self._alive & (self._base['document'] == document_row))
+            self._alive[rows] = False
+            self._removed += len(rows)
+            removed = self._base['ids'][rows].tolist() + removed
+        return removed
+    
+    def ids(self) -> np.ndarray:
+        """FAISS IDs of all live chunks in ascending order"""
+        pending = np.fromiter(self._pending.keys(), dtype='int64', count=len(self._pending))
+        return np.concatenate([self._base['ids'][self._alive], np.sort(pending)])
+    
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """Per-document chunk counts without materializing any chunk text"""
+        counts = np.bincount(self._base['document'][self._alive], minlength=len(self.document_ids))
+        counts = counts.tolist()
+        filenames = {}
+        for row in np.flatnonzero(counts):
+            filenames[row] = self._first_filename(row)
+        for metadata in self._pending.values():
+            row = self._document_rows[metadata['document_id']]
+            counts[row] += 1
+            filenames.setdefault(row, metadata['filename'])
+        
+        return [
+            {'id': self.document_ids[row], 'filename': filename, 'chunks': counts[row]}
+            for row, filename in sorted(filenames.items())
+        ]
+    
+    def save(self, path: str) -> None:
+        """Write the live rows to disk and re-open them memory-mapped"""
+        if not os.path.exists(path):
+            os.makedirs(path)
+        
+        text_path = os.path.join(path, TEXT_FILE)
+        rows = np.flatnonzero(self._alive)
+        pending = [self._pending[chunk_id] for chunk_id in sorted(self._pending)]
+        columns = {name: [self._base[name][rows]] for name in COLUMNS if name != 'offsets'}
+        
+        # Appending is enough when nothing was removed and the blob on disk is the one we mapped
+        if self._removed == 0 and os.path.exists(text_path) and os.path.getsize(text_path) == len(self._text):
+            mode = 'ab'
+            offsets = [self._base['offsets']]
+            position = int(self._base['offsets'][-1])
+        else:
+            mode = 'wb'
+            offsets = [np.zeros(1, dtype='int64')]
+            position = 0
+        
+        tmp_text_path = text_path + ".tmp"
+        with open(text_path if mode == 'ab' else tmp_text_path, mode) as f:
+            if mode == 'wb' and len(rows):
+                starts = self._base['offsets'][rows]
+                ends = self._base['offsets'][rows + 1]
+                for start, end in zip(starts, ends):
+                    f.write(self._text[start:end].tobytes())
+                offsets.append(np.cumsum(ends - starts))
+                position = int(offsets[-1][-1])
+            new_offsets = []
+            for metadata in pending:
+                data = metadata['chunk'].encode('utf-8')
+                f.write(data)
+                position += len(data)
+                new_offsets.append(position)
+            offsets.append(np.array(new_offsets, dtype='int64'))
+        
+        self._save_vectors(path, rows, sorted(self._pending))
+        
+        # Release the old mapping before replacing the file underneath it
+        self._text = np.zeros(0, dtype=np.uint8)
+        self._base = {}
+        if mode == 'wb':
+            os.replace(tmp_text_path, text_path)
+        
+        columns['ids'].append(np.array(sorted(self._pending), dtype='int64'))
+        columns['document'].append(np.array([self._document_rows[m['document_id']] for m in pending], dtype='int32'))
+        columns['chunk'].append(np.array([m['chunk_id'] for m in pending], dtype='int32'))
+        columns['filename'].append(np.array([self._filename_rows[m['filename']] for m in pending], dtype='int32'))
+        columns['page'].append(np.array([_page_value(m.get('page')) for m in pending], dtype='int32'))
+        columns['section'].append(np.array([self._section_rows.get(m.get('section'), -1) for m in pending], dtype='int32'))
+        columns['offsets'] = offsets
+        
+        for name, dtype in COLUMNS.items():
+            # Replace rather than overwrite: copies of this store may still have the old column mapped
+            column_path = os.path.join(path, f"chunks_{name}.npy")
+            with open(column_path + ".tmp", 'wb') as f:
+                np.save(f, np.concatenate(columns[name]).astype(dtype))
+            os.replace(column_path + ".tmp", column_path)
+        
+        with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'document_ids': self.document_ids,
+                'filenames': self.filenames,
+                'sections': self.sections,
+                'next_id': self.next_id,
+                'vector_dimension': self.vector_dimension
+            }, f)
+        
+        self._open(path)
+    
+    def _save_vectors(self, path: str, rows: np.ndarray, pending_ids: List[int]) -> None:
+        """Write the full-precision vectors in row order, appending like the text blob when possible"""
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        if self.vector_dimension is None:
+            if os.path.exists(vectors_path):
+                os.remove(vectors_path)
+            return
+        
+        append = (self._removed == 0 and os.path.exists(vectors_path)
+                  and os.path.getsize(vectors_path) == self._vectors.nbytes and isinstance(self._vectors, np.memmap))
+        with open(vectors_path if append else vectors_path + ".tmp", 'ab' if append else 'wb') as f:
+            if not append:
+                for start in range(0, len(rows), 65536):
+                    f.write(np.ascontiguousarray(self._vectors[rows[start:start + 65536]]).tobytes())
+            for chunk_id in pending_ids:
+                f.write(self._pending_vectors[chunk_id].tobytes())
+        self._vectors = np.zeros((0, 0), dtype='float32')
+        if not append:
+            os.replace(vectors_path + ".tmp", vectors_path)
+    
+    @classmethod
+    def load(cls, path: str) -> 'ChunkStore':
+        """Open a saved chunk store with its arrays and text blob memory-mapped"""
+        store = cls()
+        store._open(path)
+        return store
+    
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, META_FILE))
+    
+    def _open(self, path: str) -> None:
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.document_ids = meta['document_ids']
+        self.filenames = meta['filenames']
+        self.sections = meta.get('sections', [])
+        self.next_id = meta['next_id']
+        self.vector_dimension = meta.get('vector_dimension')
+        self._document_rows = {value: row for row, value in enumerate(self.document_ids)}
+        self._filename_rows = {value: row for row, value in enumerate(self.filenames)}
+        self._section_rows = {value: row for row, value in enumerate(self.sections)}
+        
+        self._base = {}
+        for name, dtype in COLUMNS.items():
+            column_path = os.path.join(path, f"chunks_{name}.npy")
+            if os.path.exists(column_path):
+                self._base[name] = np.load(column_path, mmap_mode='r')
+            else:
+                # Columns added after a store was written default to "unknown"
+                self._base[name] = np.full(len(self._base['ids']), -1, dtype=dtype)
+        text_path = os.path.join(path, TEXT_FILE)
+        if os.path.getsize(text_path) > 0:
+            self._text = np.memmap(text_path, dtype=np.uint8, mode='r')
+        else:
+            self._text = np.zeros(0, dtype=np.uint8)
+        self._vectors = np.zeros((0, 0), dtype='float32')
+        if self.vector_dimension is not None:
+            vectors_path = os.path.join(path, VECTORS_FILE)
+            shape = (len(self._base['ids']), self.vector_dimension)
+            if shape[0] == 0:
+                self._vectors = np.zeros(shape, dtype='float32')
+            elif os.path.exists(vectors_path) and os.path.getsize(vectors_path) >= shape[0] * shape[1] * 4:
+                # Only the rows the metadata knows about; an interrupted append may have left more
+                self._vectors = np.memmap(vectors_path, dtype='float32', mode='r', shape=shape)
+            else:
+                print("Full-precision vectors missing or incomplete; compressed search will not be rescored")
+                self.vector_dimension = None
+        self._alive = np.ones(len(self._base['ids']), dtype=bool)
+        self._removed = 0
+        self._pending = {}
+        self._pending_vectors = {}
+    
+    def _add_row(self, chunk_id: int, metadata: Dict[str, Any]) -> None:
+        self._intern(metadata['document_id'], self.document_ids, self._document_rows)
+        self._intern(metadata['filename'], self.filenames, self._filename_rows)
+        if metadata.get('section') is not None:
+            self._intern(metadata['section'], self.sections, self._section_rows)
+        self._pending[chunk_id] = metadata
+    
+    def _base_row(self, row: int) -> Dict[str, Any]:
+        start, end = self._base['offsets'][row], self._base['offsets'][row + 1]
+        return {
+            'document_id': self.document_ids[self._base['document'][row]],
+            'filename': self.filenames[self._base['filename'][row]],
+            'chunk': self._text[start:end].tobytes().decode('utf-8'),
+            'chunk_id': int(self._base['chunk'][row]),
+            'page': int(self._base['page'][row]) if self._base['page'][row] >= 0 else None,
+            'section': self.sections[self._base['section'][row]] if self._base['section'][row] >= 0 else None
+        }
+    
+    def _first_filename(self, document_row: int) -> str:
+        row = int(np.argmax(self._alive & (self._base['document'] == document_row)))
+        return self.filenames[self._base['filename'][row]]
+    
+    @staticmethod
+    def _intern(value: str, table: List[str], rows: Dict[str, int]) -> int:
+        if value not in rows:
+            rows[value] = len(table)
+            table.append(value)
+        return rows[value]
+
+def _page_value(page: Optional[int]) -> int:
+    return -1 if page is None else page
+
+def migrate_pickle_store(path: str) -> Optional[ChunkStore]:
+    """One-shot conversion of a legacy documents.pkl into the columnar chunk store"""
+    pickle_path = os.path.join(path, "documents.pkl")
+    if not os.path.exists(pickle_path):
+        return None
+    
+    with open(pickle_path, 'rb') as f:
+        data = pickle.load(f)
+    
+    # Positional lists predate chunk IDs: the list position is the FAISS ID
+    if isinstance(data, list):
+        documents = dict(enumerate(data))
+        next_id = len(data)
+    else:
+        documents = data['documents']
+        next_id = data['next_id']
+    
+    store = ChunkStore()
+    for chunk_id in sorted(documents):
+        store._add_row(int(chunk_id), dict(documents[chunk_id]))
+    store.next_id = next_id
+    store.save(path)
+    
+    os.replace(pickle_path, pickle_path + ".migrated")
+    print(f"Migrated {len(store)} chunks from documents.pkl to the columnar chunk store")
+    return store
+
+if __name__ == '__main__':
+    import sys
+    migrate_pickle_store(sys.argv[1] if len(sys.argv) > 1 else "./vector_store")
@@ -0,0 +1,130 @@
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+from utils.context_builder import SENTENCE_BOUNDARY
+
+DEFAULT_MODEL_MAX_TOKENS = 384  # max_seq_length of the sentence-transformers models; longer text is cut off
+HEADING_MAX_WORDS = 12
+NUMBERED_HEADING = re.compile(r'^(\d+(\.\d+)*\.?|[IVXLC]+\.|(chapter|section|part|unit|lesson)\s+\w+)\s+\S', re.IGNORECASE)
+
+def looks_like_heading(line: str) -> bool:
+    """Heuristic for heading lines in plain text and PDF pages: short, unpunctuated, numbered or capitalized"""
+    line = line.strip()
+    if line.startswith('#'):
+        return len(line.lstrip('#').strip()) > 0
+    words = line.split()
+    if not words or len(words) > HEADING_MAX_WORDS or line[-1] in '.,;:!?' or not any(c.isalpha() for c in line):
+        return False
+    if NUMBERED_HEADING.match(line):
+        return True
+    return line.isupper() or all(word[0].isupper() for word in words if len(word) > 3 and word[0].isalpha())
+
+def estimate_embedding_tokens(texts: List[str]) -> List[int]:
+    """Conservative WordPiece token counts for when the model's tokenizer is not available
+    
+    Rounded up and counting a joining space, so the counts of sentences add up to at least the count
+    of the chunk they are joined into.
+    """
+    return [max((len(text) + 3) // 3, -(-len(text.split()) * 4 // 3)) for text in texts]
+
+@lru_cache(maxsize=4)
+def token_counter(model_name: Optional[str]) -> Callable[[List[str]], List[int]]:
+    """Batch token counter using the embedding model's tokenizer (loaded once per process)"""
+    if model_name is None:
+        return estimate_embedding_tokens
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+    except Exception as e:
+        print(f"Tokenizer for {model_name} unavailable ({str(e)}); estimating chunk token counts")
+        return estimate_embedding_tokens
+    return lambda texts: [len(ids) for ids in tokenizer(texts, add_special_tokens=False)['input_ids']] if texts else []
+
+class StructuredChunker:
+    """Packs whole sentences into chunks of at most max_tokens embedding-model tokens
+    
+    A heading always starts a new chunk and becomes the section of the chunks that follow it.
+    Consecutive chunks within a section share up to overlap_tokens of trailing sentences, and a
+    sentence longer than max_tokens is cut on word boundaries, so no chunk exceeds the model's limit.
+    The chunker is picklable and loads the tokenizer lazily, so it can be sent to worker processes.
+    """
+    
+    def __init__(self, model_name: Optional[str] = None, max_tokens: int = 256, overlap_tokens: int = 32,
+                 model_max_tokens: int = DEFAULT_MODEL_MAX_TOKENS):
+        if not 0 < max_tokens <= model_max_tokens - 2:  # Room for the [CLS] and [SEP] tokens
+            raise ValueError(f"max_tokens must be between 1 and {model_max_tokens - 2}")
+        self.model_name = model_name
+        self.model_max_tokens = model_max_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        return token_counter(self.model_name)(texts)
+    
+    def chunk_text(self, text: str) -> List[Dict[str, Any]]:
+        return list(self.chunks([{'text': text, 'page': None, 'heading': False}]))
+    
+    def chunks(self, blocks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Chunks as {'text', 'page', 'section', 'tokens'} dicts from {'text', 'page', 'heading'} blocks"""
+        current = []  # (sentence, tokens, page) pairs of the chunk being built
+        fresh = 0  # Sentences in current that no yielded chunk contains yet
+        section = None
+        
+        for block in blocks:
+            text = ' '.join(block['text'].split())
+            if not text:
+                continue
+            if block.get('heading'):
+                if fresh:
+                    yield self._chunk(current, section)
+                current, fresh = [], 0
+                section = text.lstrip('#').strip()[:200]
+            
+            sentences = [text] if block.get('heading') else SENTENCE_BOUNDARY.split(text)
+            for sentence, tokens in self._fit(sentences):
+                if current and sum(count for _, count, _ in current) + tokens > self.max_tokens:
+                    if fresh:
+                        yield self._chunk(current, section)
+                    current, fresh = self._overlap(current, tokens), 0
+                current.append((sentence, tokens, block.get('page')))
+                fresh += 1
+        
+        if fresh:
+            yield self._chunk(current, section)
+    
+    def _fit(self, sentences: List[str]) -> Iterator[Tuple[str, int]]:
+        """Sentences with their token counts, cutting any that would not fit in a chunk on its own"""
+        for sentence, tokens in zip(sentences, self.count_tokens(sentences)):
+            if tokens <= self.max_tokens:
+                yield sentence, tokens
+                continue
+            words = sentence.split()
+            while words:
+                take = max(1, len(words) * self.max_tokens // max(tokens, 1))
+                piece_tokens = self.count_tokens([' '.join(words[:take])])[0]
+                while take > 1 and piece_tokens > self.max_tokens:
+                    take = max(1, take * 9 // 10)
+                    piece_tokens = self.count_tokens([' '.join(words[:take])])[0]
+                yield ' '.join(words[:take]), piece_tokens
+                words = words[take:]
+                tokens = max(tokens - piece_tokens, 1)
+    
+    def _overlap(self, current: List[Tuple[str, int, Optional[int]]], next_tokens: int) -> List[Tuple[str, int, Optional[int]]]:
+        """Trailing sentences of the last chunk to repeat at the start of the next one"""
+        tail = []
+        total = 0
+        for sentence in reversed(current):
+            total += sentence[1]
+            if total > self.overlap_tokens or total + next_tokens > self.max_tokens:
+                break
+            tail.insert(0, sentence)
+        return tail
+    
+    @staticmethod
+    def _chunk(current: List[Tuple[str, int, Optional[int]]], section: Optional[str]) -> Dict[str, Any]:
+        return {
+            'text': ' '.join(sentence for sentence, _, _ in current),
+            'page': current[0][2],
+            'section': section,
+            'tokens': sum(tokens for _, tokens, _ in current)
+        }
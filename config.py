@@ -1,28 +1,121 @@
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# API Configuration
-PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY", "your-perplexity-api-key")
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-
-# Model Configuration
-LOCAL_MODEL = "llama3.1:8b"
-
-# Perplexity Models Available to You
-PERPLEXITY_SEARCH_MODEL = "sonar"  # Lightweight for simple queries
-PERPLEXITY_REASONING_MODEL = "sonar-reasoning"  # For complex analysis
-PERPLEXITY_RESEARCH_MODEL = "sonar-deep-research"  # For comprehensive reports
-
-# Default Perplexity model
-PERPLEXITY_MODEL = PERPLEXITY_SEARCH_MODEL  # Start with lightweight model
-
-# Vector Store Configuration
-VECTOR_STORE_PATH = "./vector_store"
-UPLOAD_FOLDER = "./data/uploads"
-EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
-
-# App Configuration
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# API Configuration
+PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY", "your-perplexity-api-key")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+PERPLEXITY_BASE_URL = os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
+
+# Model Configuration
+LOCAL_MODEL = "llama3.1:8b"
+
+# Perplexity Models Available to You
+PERPLEXITY_SEARCH_MODEL = "sonar"  # Lightweight for simple queries
+PERPLEXITY_REASONING_MODEL = "sonar-reasoning"  # For complex analysis
+PERPLEXITY_RESEARCH_MODEL = "sonar-deep-research"  # For comprehensive reports
+
+# Default Perplexity model
+PERPLEXITY_MODEL = PERPLEXITY_SEARCH_MODEL  # Start with lightweight model
+
+# Perplexity HTTP Client Configuration
+PERPLEXITY_MAX_CONCURRENCY = 4  # Pooled keep-alive connections / requests in flight
+PERPLEXITY_MAX_RETRIES = 3  # Retries on 429/5xx and connection errors
+PERPLEXITY_BACKOFF_SECONDS = 0.5  # Backoff base, doubled per retry with full jitter
+PERPLEXITY_BACKOFF_MAX_SECONDS = 8
+PERPLEXITY_CONNECT_TIMEOUT = 5
+PERPLEXITY_READ_TIMEOUT = 60
+PERPLEXITY_BREAKER_FAILURES = 5  # Consecutive failed calls before failing over to Ollama
+PERPLEXITY_BREAKER_RESET_SECONDS = 30  # Time before a trial call is let through again
+
+# Vector Store Configuration
+VECTOR_STORE_PATH = "./vector_store"
+UPLOAD_FOLDER = "./data/uploads"
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+# Embedding Cache Configuration
+EMBEDDING_CACHE_PATH = "./embedding_cache/embeddings.sqlite"  # Sits next to VECTOR_STORE_PATH
+EMBEDDING_CACHE_MAX_ENTRIES = 200000  # Least recently used entries are evicted beyond this
+
+# Embedding Backend Configuration
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")  # huggingface, onnx or onnx-int8
+EMBEDDING_ONNX_DIR = "./embedding_cache/onnx"  # Exported (and quantized) ONNX models
+EMBEDDING_MAX_BATCH_TOKENS = 16384  # Padded tokens per ONNX batch; texts are batched by length
+EMBEDDING_MAX_TOKENS = 384  # Input limit of the embedding model (sentence-transformers max_seq_length); longer text is cut off
+EMBEDDING_VERIFY_AGREEMENT = False  # Also load the HuggingFace model at startup to check an ONNX backend against it (the benchmark always does)
+EMBEDDING_MIN_AGREEMENT = 0.97  # Lowest cosine similarity accepted, otherwise fall back to HuggingFace
+
+# Index Configuration
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")  # flat, ivf_flat, hnsw or ivf_pq
+INDEX_PARAMS = {}  # Overrides of index_factory.DEFAULT_INDEX_PARAMS, which lists every parameter, e.g. {'nprobe': 32}
+if os.getenv("VECTOR_STORAGE"):
+    INDEX_PARAMS['storage'] = os.getenv("VECTOR_STORAGE")  # float32, float16 or int8 codes (int8 is 4x smaller)
+if os.getenv("VECTOR_PCA_DIM"):
+    INDEX_PARAMS['pca_dim'] = int(os.getenv("VECTOR_PCA_DIM"))  # Reduce dimensions before storing, 0 keeps them all
+
+# Ingestion Configuration
+INGEST_WORKERS = os.cpu_count() or 1  # Processes extracting text from uploaded files
+EMBEDDING_BATCH_SIZE = 64  # Chunks per embedding call
+EMBEDDING_THREADS = os.cpu_count() or 1  # CPU threads used by the embedding model
+CHUNKER = "words"  # words (1000/200 windows) or structured (sentences and headings, sized in tokens; re-index existing collections when switching)
+CHUNK_MAX_TOKENS = 256  # Embedding-model tokens per chunk, at most EMBEDDING_MAX_TOKENS - 2
+CHUNK_OVERLAP_TOKENS = 32  # Trailing sentences repeated in the next chunk, up to this many tokens
+JOB_HISTORY = 100  # Finished ingestion jobs kept for progress polling
+
+# Answer Cache Configuration
+ANSWER_CACHE_MAX_ENTRIES = 1000
+ANSWER_CACHE_TTL_SECONDS = 3600
+ANSWER_CACHE_SIMILARITY = 0.95  # Minimum query cosine similarity to reuse a cached answer
+
+# Query Batching Configuration
+QUERY_BATCH_WAIT_MS = 5  # How long the first query in a batch waits for others to join
+QUERY_BATCH_MAX_SIZE = 32
+
+# Retrieval Configuration
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")  # dense or hybrid (dense + BM25 fused with RRF; builds a keyword index on first load)
+RETRIEVAL_TOP_K = 5  # Chunks passed to the LLM as context (without reranking)
+HYBRID_CANDIDATES = 50  # Candidates taken from each ranking before fusion
+RRF_K = 60  # Reciprocal rank fusion constant; larger values flatten the rank weights
+
+# Context Assembly Configuration
+CONTEXT_TOKEN_BUDGETS = {  # Estimated prompt-context tokens per answering model
+    LOCAL_MODEL: 2048,
+    PERPLEXITY_SEARCH_MODEL: 4096,
+}
+DEFAULT_CONTEXT_TOKEN_BUDGET = 2048
+CONTEXT_REDUNDANCY_THRESHOLD = 0.6  # Word-set Jaccard similarity at which a sentence counts as repeated
+
+# Summarization Configuration
+SUMMARY_WORKERS = 4  # Concurrent LLM calls while summarizing chunks
+SUMMARY_CACHE_MAX_ENTRIES = 5000  # Chunk-group, intermediate and document summaries kept in memory
+SUMMARY_JOB_MIN_CHUNKS = 200  # Corpora with at least this many chunks are summarized as a background job
+
+# Collection Configuration
+PER_SESSION_COLLECTIONS = False  # True gives each browser session its own knowledge base (existing data stays in the default one)
+DEFAULT_COLLECTION = "default"  # Shared collection (and where a pre-collection vector store is moved to)
+MAX_OPEN_COLLECTIONS = 8  # Vector stores kept in memory; least recently used ones are saved and closed
+MAX_OPEN_COLLECTIONS_MB = 1024  # Memory bound on the open indexes' vectors
+
+# Startup Configuration
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") != "0"  # Load the embedding model and indexes in the background at boot
+PRELOAD_COLLECTIONS = 4  # Most recently updated collections opened during warm-up
+
+# Reranking Configuration
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"  # Rescore retrieved chunks with a cross-encoder
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_CANDIDATES = 20  # Retrieved chunks the cross-encoder rescores
+RERANK_TOP_K = 3  # Chunks passed to the LLM after reranking
+RERANK_BUDGET_MS = 250  # Counted from the start of the request; over budget, the retrieval order is used
+RERANK_CACHE_MAX_ENTRIES = 20000  # Cached (query, chunk) scores
+
+# LLM Scheduling Configuration
+LLM_CONCURRENCY = {  # Generations in flight per backend; further requests queue by priority
+    'ollama': int(os.getenv("OLLAMA_CONCURRENCY", "1")),  # One local model on the CPU answers fastest one at a time
+    'perplexity': PERPLEXITY_MAX_CONCURRENCY,
+}
+LLM_QUEUE_TIMEOUT_SECONDS = 120  # Interactive requests give up after waiting this long; summary calls wait it out
+
+# App Configuration
+MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.txt', '.pptx'}
\ No newline at end of file
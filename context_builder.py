@@ -0,0 +1,172 @@
+import re
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+WORD_PATTERN = re.compile(r"\w+")
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (about four characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+def split_sentences(text: str, max_words: int = 60) -> List[str]:
+    """Split on sentence punctuation, cutting run-on text (tables, slide bullets) into max_words pieces"""
+    pieces = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        words = sentence.split()
+        pieces.extend(' '.join(words[start:start + max_words]) for start in range(0, len(words), max_words))
+    return pieces
+
+def _terms(text: str) -> Set[str]:
+    return set(WORD_PATTERN.findall(text.lower()))
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def merge_overlapping(first: str, second: str, max_overlap: int = 400) -> Optional[str]:
+    """Join two word windows when the end of the first repeats at the start of the second"""
+    a = first.split()
+    b = second.split()
+    if not a or not b:
+        return None
+    # Try the longest candidate overlap first; candidates start where b's first word occurs in a's tail
+    for start in range(max(0, len(a) - max_overlap), len(a)):
+        if a[start] == b[0] and a[start:] == b[:len(a) - start]:
+            return ' '.join(a + b[len(a) - start:])
+    return None
+
+class ContextBuilder:
+    """Assembles retrieved chunks into a prompt context that fits a token budget
+    
+    Adjacent or overlapping chunks of the same document are merged into one passage, then
+    sentences are picked by maximal marginal relevance (relevance to the query minus similarity
+    to what is already selected) until the budget is used, so repeated text is dropped first.
+    """
+    
+    def __init__(self, budgets: Dict[str, int], default_budget: int = 2048,
+                 redundancy_threshold: float = 0.6, diversity: float = 0.3):
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.redundancy_threshold = redundancy_threshold
+        self.diversity = diversity  # Weight of the redundancy penalty in the MMR score
+    
+    def budget_for(self, model: str) -> int:
+        return self.budgets.get(model, self.default_budget)
+    
+    @staticmethod
+    def format_passage(filename: str, score: float, text: str) -> str:
+        return f"From {filename} (relevance: {score:.3f}):\n{text}"
+    
+    def build(self, query: str, search_results: List[Dict[str, Any]], budget: int) -> Tuple[str, Dict[str, int]]:
+        """Return the context and token counts before and after compression"""
+        if not search_results:
+            return "", {'tokens_before': 0, 'tokens_after': 0, 'tokens_saved': 0, 'passages': 0, 'sentences_dropped': 0}
+        
+        naive = "\n\n".join(
+            self.format_passage(result['document']['filename'], result['score'], result['document']['chunk'])
+            for result in search_results
+        )
+        passages = self._merge_passages(search_results)
+        header_tokens = sum(estimate_tokens(self.format_passage(p['filename'], p['score'], '')) for p in passages)
+        selected, total_sentences = self._select_sentences(query, passages, budget - header_tokens)
+        
+        parts = []
+        for number, passage in enumerate(passages):
+            sentences = [sentence for index, sentence in enumerate(passage['sentences']) if (number, index) in selected]
+            if sentences:
+                parts.append(self.format_passage(passage['filename'], passage['score'], ' '.join(sentences)))
+        context = "\n\n".join(parts)
+        
+        tokens_before = estimate_tokens(naive)
+        tokens_after = estimate_tokens(context)
+        return context, {
+            'tokens_before': tokens_before,
+            'tokens_after': tokens_after,
+            'tokens_saved': max(0, tokens_before - tokens_after),
+            'passages': len(parts),
+            'sentences_dropped': total_sentences - len(selected)
+        }
+    
+    def fit_text(self, text: str, budget: int) -> str:
+        """Drop repeated sentences from a long text and keep its beginning up to the budget"""
+        kept = []
+        kept_terms = []
+        used = 0
+        for sentence in split_sentences(text):
+            terms = _terms(sentence)
+            if not terms or any(_jaccard(terms, other) >= self.redundancy_threshold for other in kept_terms):
+                continue
+            tokens = estimate_tokens(sentence) + 1
+            if used + tokens > budget:
+                break
+            kept.append(sentence)
+            kept_terms.append(terms)
+            used += tokens
+        return ' '.join(kept)
+    
+    def _merge_passages(self, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Group results by document and fuse runs of adjacent or overlapping chunks"""
+        by_document = {}
+        for result in search_results:
+            by_document.setdefault(result['document']['document_id'], []).append(result)
+        
+        passages = []
+        for results in by_document.values():
+            results.sort(key=lambda result: result['document'].get('chunk_id', 0))
+            current = None
+            for result in results:
+                metadata = result['document']
+                if current is not None and metadata.get('chunk_id') == current['last_chunk'] + 1:
+                    # Consecutive windows share chunk_overlap words; keep them only once
+                    current['text'] = (merge_overlapping(current['text'], metadata['chunk'])
+                                       or f"{current['text']} {metadata['chunk']}")
+                    current['last_chunk'] = metadata.get('chunk_id', current['last_chunk'])
+                    current['score'] = max(current['score'], result['score'])
+                else:
+                    current = {
+                        'filename': metadata['filename'],
+                        'text': metadata['chunk'],
+                        'last_chunk': metadata.get('chunk_id', 0),
+                        'score': result['score']
+                    }
+                    passages.append(current)
+        
+        passages.sort(key=lambda passage: passage['score'], reverse=True)
+        for passage in passages:
+            passage['sentences'] = split_sentences(passage['text'])
+        return passages
+    
+    def _select_sentences(self, query: str, passages: List[Dict[str, Any]], budget: int) -> Tuple[Set[Tuple[int, int]], int]:
+        """Greedy MMR over all sentences; returns the chosen (passage, sentence) positions"""
+        query_terms = _terms(query)
+        top_score = max(passage['score'] for passage in passages) or 1.0
+        candidates = []
+        for number, passage in enumerate(passages):
+            for index, sentence in enumerate(passage['sentences']):
+                terms = _terms(sentence)
+                overlap = len(terms & query_terms) / len(query_terms) if query_terms else 0.0
+                relevance = 0.5 * passage['score'] / top_score + 0.5 * overlap
+                candidates.append({
+                    'position': (number, index),
+                    'terms': terms,
+                    'tokens': estimate_tokens(sentence) + 1,
+                    'relevance': relevance,
+                    'redundancy': 0.0
+                })
+        
+        selected = set()
+        used = 0
+        remaining = candidates
+        while remaining:
+            best = max(remaining, key=lambda c: (1 - self.diversity) * c['relevance'] - self.diversity * c['redundancy'])
+            remaining = [candidate for candidate in remaining if candidate is not best]
+            if best['redundancy'] >= self.redundancy_threshold or not best['terms']:
+                continue
+            if used + best['tokens'] > budget:
+                continue
+            selected.add(best['position'])
+            used += best['tokens']
+            for candidate in remaining:
+                candidate['redundancy'] = max(candidate['redundancy'], _jaccard(candidate['terms'], best['terms']))
+        return selected, len(candidates)
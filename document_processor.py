@@ -1,74 +1,164 @@
-import os
-import pypdf  # Changed from PyPDF2
-from docx import Document
-from typing import List, Dict, Any
-
-class DocumentProcessor:
-    def __init__(self):
-        self.supported_extensions = {'.pdf', '.docx', '.doc', '.txt', '.pptx'}
-    
-    def process_file(self, file_path: str) -> Dict[str, Any]:
-        """Process a single file and extract text content"""
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        try:
-            if file_ext == '.pdf':
-                return self._process_pdf(file_path)
-            elif file_ext in ['.docx', '.doc']:
-                return self._process_docx(file_path)
-            elif file_ext == '.txt':
-                return self._process_txt(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_ext}")
-        except Exception as e:
-            return {"error": f"Error processing {file_path}: {str(e)}", "content": ""}
-    
-    def _process_pdf(self, file_path: str) -> Dict[str, Any]:
-        """Extract text from PDF files"""
-        text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = pypdf.PdfReader(file)  # Changed from PyPDF2
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        
-        return {
-            "content": text,
-            "pages": len(pdf_reader.pages),
-            "type": "pdf"
-        }
-    
-    def _process_docx(self, file_path: str) -> Dict[str, Any]:
-        """Extract text from DOCX files"""
-        doc = Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        
-        return {
-            "content": text,
-            "paragraphs": len(doc.paragraphs),
-            "type": "docx"
-        }
-    
-    def _process_txt(self, file_path: str) -> Dict[str, Any]:
-        """Extract text from TXT files"""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            text = file.read()
-        
-        return {
-            "content": text,
-            "type": "txt"
-        }
-    
-    def chunk_text(self, text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
-        """Split text into overlapping chunks"""
-        words = text.split()
-        chunks = []
-        
-        for i in range(0, len(words), chunk_size - chunk_overlap):
-            chunk = ' '.join(words[i:i + chunk_size])
-            chunks.append(chunk)
-            if i + chunk_size >= len(words):
-                break
-        
-        return chunks
\ No newline at end of file
+import os
+from collections import deque
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from utils.chunker import StructuredChunker, looks_like_heading
+
+class DocumentProcessor:
+    def __init__(self):
+        self.supported_extensions = {'.pdf', '.docx', '.doc', '.txt', '.pptx'}
+    
+    def process_file(self, file_path: str) -> Dict[str, Any]:
+        """Process a single file and extract text content"""
+        file_ext = os.path.splitext(file_path)[1].lower()
+        
+        try:
+            if file_ext == '.pdf':
+                return self._process_pdf(file_path)
+            elif file_ext in ['.docx', '.doc']:
+                return self._process_docx(file_path)
+            elif file_ext == '.txt':
+                return self._process_txt(file_path)
+            else:
+                raise ValueError(f"Unsupported file type: {file_ext}")
+        except Exception as e:
+            return {"error": f"Error processing {file_path}: {str(e)}", "content": ""}
+    
+    def iter_segments(self, file_path: str) -> Iterator[Tuple[str, Optional[int]]]:
+        """Yield (text, page number) segments one page/paragraph at a time"""
+        file_ext = os.path.splitext(file_path)[1].lower()
+        
+        if file_ext == '.pdf':
+            return self._iter_pdf(file_path)
+        elif file_ext in ['.docx', '.doc']:
+            return self._iter_docx(file_path)
+        elif file_ext == '.txt':
+            return self._iter_txt(file_path)
+        else:
+            raise ValueError(f"Unsupported file type: {file_ext}")
+    
+    def iter_blocks(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """Yield {'text', 'page', 'heading'} paragraphs and headings in document order"""
+        file_ext = os.path.splitext(file_path)[1].lower()
+        
+        if file_ext in ['.docx', '.doc']:
+            return self._iter_docx_blocks(file_path)
+        return self._line_blocks(self.iter_segments(file_path))
+    
+    def iter_file_chunks(self, file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+                         chunker: Optional[StructuredChunker] = None) -> Iterator[Dict[str, Any]]:
+        """Stream chunks straight from a file without holding the whole text in memory
+        
+        With a chunker, chunks follow sentence and heading boundaries and are sized in tokens;
+        otherwise they are chunk_size-word windows overlapping by chunk_overlap words.
+        """
+        if chunker is not None:
+            return chunker.chunks(self.iter_blocks(file_path))
+        return self.iter_chunks(self.iter_segments(file_path), chunk_size, chunk_overlap)
+    
+    def _iter_pdf(self, file_path: str) -> Iterator[Tuple[str, Optional[int]]]:
+        import pypdf  # Changed from PyPDF2; imported on first use so the app starts without it
+        with open(file_path, 'rb') as file:
+            pdf_reader = pypdf.PdfReader(file)
+            for page_number, page in enumerate(pdf_reader.pages, start=1):
+                yield page.extract_text() or "", page_number
+    
+    def _iter_docx(self, file_path: str) -> Iterator[Tuple[str, Optional[int]]]:
+        from docx import Document
+        doc = Document(file_path)
+        for paragraph in doc.paragraphs:
+            yield paragraph.text, None
+    
+    def _iter_txt(self, file_path: str) -> Iterator[Tuple[str, Optional[int]]]:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                yield line, None
+    
+    def _iter_docx_blocks(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        from docx import Document
+        doc = Document(file_path)
+        for paragraph in doc.paragraphs:
+            style = paragraph.style.name if paragraph.style is not None else ''
+            yield {'text': paragraph.text, 'page': None, 'heading': style.startswith('Heading') or style == 'Title'}
+    
+    @staticmethod
+    def _line_blocks(segments: Iterable[Tuple[str, Optional[int]]]) -> Iterator[Dict[str, Any]]:
+        """Group lines into paragraphs at blank lines, yielding heading-like lines on their own"""
+        lines = []
+        page = None
+        for text, segment_page in segments:
+            for line in text.splitlines() or [text]:
+                if line.strip() and looks_like_heading(line):
+                    if lines:
+                        yield {'text': ' '.join(lines), 'page': page, 'heading': False}
+                        lines = []
+                    yield {'text': line, 'page': segment_page, 'heading': True}
+                elif line.strip():
+                    if not lines:
+                        page = segment_page
+                    lines.append(line)
+                elif lines:
+                    yield {'text': ' '.join(lines), 'page': page, 'heading': False}
+                    lines = []
+        if lines:
+            yield {'text': ' '.join(lines), 'page': page, 'heading': False}
+    
+    def _process_pdf(self, file_path: str) -> Dict[str, Any]:
+        """Extract text from PDF files"""
+        pages = [text for text, _ in self._iter_pdf(file_path)]
+        
+        return {
+            "content": "".join(text + "\n" for text in pages),
+            "pages": len(pages),
+            "type": "pdf"
+        }
+    
+    def _process_docx(self, file_path: str) -> Dict[str, Any]:
+        """Extract text from DOCX files"""
+        paragraphs = [text for text, _ in self._iter_docx(file_path)]
+        
+        return {
+            "content": "".join(text + "\n" for text in paragraphs),
+            "paragraphs": len(paragraphs),
+            "type": "docx"
+        }
+    
+    def _process_txt(self, file_path: str) -> Dict[str, Any]:
+        """Extract text from TXT files"""
+        with open(file_path, 'r', encoding='utf-8') as file:
+            text = file.read()
+        
+        return {
+            "content": text,
+            "type": "txt"
+        }
+    
+    def chunk_text(self, text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+        """Split text into overlapping chunks"""
+        return [chunk['text'] for chunk in self.iter_chunks([(text, None)], chunk_size, chunk_overlap)]
+    
+    def iter_chunks(self, segments: Iterable[Tuple[str, Optional[int]]], chunk_size: int = 1000,
+                    chunk_overlap: int = 200) -> Iterator[Dict[str, Any]]:
+        """Build overlapping word windows incrementally; memory stays bounded by chunk_size"""
+        step = chunk_size - chunk_overlap
+        window = deque()  # (word, page) pairs of the current window
+        unemitted = 0  # Words in the window not yet part of any yielded chunk
+        
+        for text, page in segments:
+            for word in text.split():
+                window.append((word, page))
+                unemitted += 1
+                if len(window) == chunk_size:
+                    yield self._window_chunk(window)
+                    unemitted = 0
+                    for _ in range(step):
+                        window.popleft()
+        
+        if unemitted:
+            yield self._window_chunk(window)
+    
+    @staticmethod
+    def _window_chunk(window: deque) -> Dict[str, Any]:
+        return {
+            'text': ' '.join(word for word, _ in window),
+            'page': window[0][1]
+        }
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional, Union
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by a hash of (model name, chunk text) with LRU eviction"""
+    
+    def __init__(self, path: str, model_name: Union[str, Callable[[], str]], max_entries: int = 200000):
+        self.path = path
+        self._model_name = model_name  # Or a callable giving it on first use, e.g. once a lazy model has loaded
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+    
+    @property
+    def model_name(self) -> str:
+        if callable(self._model_name):
+            self._model_name = self._model_name()
+        return self._model_name
+    
+    def key(self, text: str) -> str:
+        """Hash the model name together with the chunk text"""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+    
+    def get_many(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """Return cached vectors by position in texts, recording hits and misses"""
+        keys = [self.key(text) for text in texts]
+        found = {}
+        
+        with self._lock:
+            # Query in slices to stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update({key: np.frombuffer(vector, dtype='float32') for key, vector in rows})
+            
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        
+        cached = {i: found[key] for i, key in enumerate(keys) if key in found}
+        self.hits += len(cached)
+        self.misses += len(texts) - len(cached)
+        return cached
+    
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        """Store vectors for texts and evict the least recently used entries over the cap"""
+        now = time.time()
+        rows = [
+            (self.key(text), np.asarray(vector, dtype='float32').tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            overflow = self._count() - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,)
+                )
+            self._conn.commit()
+    
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Hit/miss counters since startup plus the current number of cached entries"""
+        with self._lock:
+            entries = self._count()
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else None,
+            'entries': entries,
+            'max_entries': self.max_entries
+        }
@@ -0,0 +1,197 @@
+import os
+import numpy as np
+from typing import List, Dict, Any, Optional
+
+BACKENDS = ('huggingface', 'onnx', 'onnx-int8')
+
+# Mixed-length passages for checking that a faster backend still agrees with the reference model
+AGREEMENT_TEXTS = [
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "What is the derivative of x squared?",
+    "The French Revolution began in 1789 and transformed the political landscape of Europe, ending "
+    "absolute monarchy and spreading ideas of citizenship and inalienable rights.",
+    "Newton's second law states that force equals mass times acceleration.",
+    "Explain the difference between mitosis and meiosis.",
+    "In a binary search tree, every node's left subtree contains only keys smaller than the node's key, "
+    "and its right subtree only larger keys, which allows lookups in logarithmic time when the tree is "
+    "balanced. Self-balancing variants such as AVL and red-black trees restore this property after "
+    "every insertion or deletion by rotating nodes.",
+    "Supply and demand determine the market price of a good.",
+    "The mitochondria is the powerhouse of the cell.",
+    "A haiku is a short poem of three lines with five, seven and five syllables.",
+    "Summarize the main causes of the First World War, including militarism, alliances, imperialism and "
+    "nationalism, and the assassination of Archduke Franz Ferdinand that set the conflict in motion.",
+    "Water boils at 100 degrees Celsius at sea level.",
+    "Osmosis",
+]
+
+def set_embedding_threads(threads: int, backend: str = 'huggingface') -> None:
+    """Let the PyTorch embedding model use the configured number of CPU threads"""
+    # ONNX sessions get their thread count when created; importing torch for them would only cost memory
+    if backend != 'huggingface':
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+def length_batches(lengths: List[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """Group positions by similar length so each padded batch stays under max_batch_tokens"""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    current = []
+    for i in order:
+        # Sorted ascending, so the newest item is the longest and sets the padded length
+        if current and (len(current) >= max_batch_size or lengths[i] * (len(current) + 1) > max_batch_tokens):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+def cosine_agreement(reference, candidate, texts: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Cosine similarity between two backends' embeddings of the same texts"""
+    texts = texts or AGREEMENT_TEXTS
+    expected = np.asarray(reference.embed_documents(texts), dtype='float32')
+    actual = np.asarray(candidate.embed_documents(texts), dtype='float32')
+    if expected.shape != actual.shape:
+        raise ValueError(f"Embedding shapes differ: {expected.shape} vs {actual.shape}")
+    expected /= np.maximum(np.linalg.norm(expected, axis=1, keepdims=True), 1e-12)
+    actual /= np.maximum(np.linalg.norm(actual, axis=1, keepdims=True), 1e-12)
+    cosines = (expected * actual).sum(axis=1)
+    return {
+        'texts': len(texts),
+        'mean': round(float(cosines.mean()), 5),
+        'min': round(float(cosines.min()), 5)
+    }
+
+def cache_model_name(model_name: str, backend: str) -> str:
+    """Embedding cache namespace; backends produce slightly different vectors so they don't share entries"""
+    return model_name if backend == 'huggingface' else f"{model_name}#{backend}"
+
+def create_backend(backend: str, model_name: str, threads: Optional[int] = None,
+                   cache_dir: str = "./embedding_cache/onnx", max_batch_tokens: int = 16384,
+                   max_batch_size: int = 64, max_length: int = 384):
+    """Build one of BACKENDS for a sentence-transformers model"""
+    if backend == 'huggingface':
+        return HuggingFaceBackend(model_name, threads)
+    if backend in ('onnx', 'onnx-int8'):
+        return OnnxBackend(model_name, cache_dir, quantize=backend == 'onnx-int8', threads=threads,
+                           max_length=max_length, max_batch_tokens=max_batch_tokens, max_batch_size=max_batch_size)
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+class HuggingFaceBackend:
+    """The reference backend: sentence-transformers on PyTorch through LangChain"""
+    
+    name = 'huggingface'
+    
+    def __init__(self, model_name: str, threads: Optional[int] = None):
+        from langchain_community.embeddings import HuggingFaceEmbeddings  # Pulls in torch; kept off the import path
+        if threads:
+            set_embedding_threads(threads)
+        self.model = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+class OnnxBackend:
+    """Sentence-transformers inference on ONNX Runtime, optionally with int8-quantized weights
+    
+    The transformer is exported to ONNX (and dynamically quantized) once into cache_dir; pooling and
+    normalization run in numpy. Texts are sorted by token count and batched by padded size, so short
+    chunks are not padded out to the longest one in the call.
+    """
+    
+    def __init__(self, model_name: str, cache_dir: str, quantize: bool = False, threads: Optional[int] = None,
+                 max_length: int = 384, max_batch_tokens: int = 16384, max_batch_size: int = 64):
+        import onnxruntime
+        from transformers import AutoTokenizer
+        self.name = 'onnx-int8' if quantize else 'onnx'
+        self.max_length = max_length
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model_path = self.export(model_name, cache_dir, quantize)
+        
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or 0  # 0 lets ONNX Runtime pick
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+    
+    @staticmethod
+    def export(model_name: str, cache_dir: str, quantize: bool = False) -> str:
+        """Path of the exported model, exporting (and quantizing) it on first use"""
+        directory = os.path.join(cache_dir, model_name.replace('/', '--'))
+        path = os.path.join(directory, 'model.onnx')
+        if not os.path.exists(path):
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+            print(f"Exporting {model_name} to ONNX...")
+            os.makedirs(directory, exist_ok=True)
+            
+            class HiddenStates(torch.nn.Module):
+                def __init__(self, model):
+                    super().__init__()
+                    self.model = model
+                
+                def forward(self, input_ids, attention_mask):
+                    return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+            
+            sample = AutoTokenizer.from_pretrained(model_name)(["export"], return_tensors='pt')
+            axes = {0: 'batch', 1: 'sequence'}
+            torch.onnx.export(
+                HiddenStates(AutoModel.from_pretrained(model_name).eval()),
+                (sample['input_ids'], sample['attention_mask']),
+                path + '.tmp',
+                input_names=['input_ids', 'attention_mask'],
+                output_names=['last_hidden_state'],
+                dynamic_axes={'input_ids': axes, 'attention_mask': axes, 'last_hidden_state': axes},
+                opset_version=14
+            )
+            os.replace(path + '.tmp', path)
+        
+        if not quantize:
+            return path
+        quantized = os.path.join(directory, 'model_int8.onnx')
+        if not os.path.exists(quantized):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            print(f"Quantizing {model_name} to int8...")
+            quantize_dynamic(path, quantized + '.tmp', weight_type=QuantType.QInt8)
+            os.replace(quantized + '.tmp', quantized)
+        return quantized
+    
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype='float32')
+        encoded = self.tokenizer(list(texts), truncation=True, max_length=self.max_length)
+        input_ids = encoded['input_ids']
+        embeddings = [None] * len(texts)
+        
+        for batch in length_batches([len(ids) for ids in input_ids], self.max_batch_tokens, self.max_batch_size):
+            padded = self.tokenizer.pad({'input_ids': [input_ids[i] for i in batch]}, return_tensors='np')
+            mask = padded['attention_mask'].astype('int64')
+            inputs = {'input_ids': padded['input_ids'].astype('int64'), 'attention_mask': mask,
+                      'token_type_ids': np.zeros_like(mask)}
+            hidden = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+            
+            # Mean pooling over real tokens, as in sentence-transformers
+            weights = mask[..., None].astype('float32')
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            for row, i in enumerate(batch):
+                embeddings[i] = pooled[row]
+        return np.stack(embeddings).astype('float32')
+    
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,280 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Iterator, AsyncIterator, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # Only the asyncio client needs it
+    httpx = None
+
+# Rate limiting and transient server errors are worth retrying; other statuses are final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Only failures before the request reached the server are retried. A read timeout may leave the
+# server still generating a billed completion, so it fails straight away and callers fail over
+RETRY_ERRORS = (requests.ConnectionError,)  # Includes ConnectTimeout, but not ReadTimeout
+ASYNC_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout) if httpx is not None else ()
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint that has been failing repeatedly"""
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single trial call through once reset_timeout has passed"""
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+    
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+    
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+    
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_running:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+    
+    def stats(self) -> Dict[str, Any]:
+        return {'state': self.state, 'consecutive_failures': self.failures, 'trips': self.trips}
+
+def backoff_delay(attempt: int, base: float, maximum: float, retry_after: Optional[str] = None) -> float:
+    """Exponential backoff with full jitter, honouring a numeric Retry-After header when the server sends one"""
+    if retry_after:
+        try:
+            return min(maximum, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+class PooledHTTPClient:
+    """Shared keep-alive session with bounded concurrency, jittered retries and a circuit breaker"""
+    
+    def __init__(self, base_url: str, max_connections: int = 4, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0, breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.requests = 0
+        self.retries = 0
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._slots = threading.BoundedSemaphore(max_connections)
+    
+    def post(self, path: str, json: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """POST and read the whole response body"""
+        with self._request(path, json, headers) as response:
+            response.content  # Read outside the retry loop, so a stalled body is never re-sent
+            return response
+    
+    @contextmanager
+    def stream(self, path: str, json: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Iterator[requests.Response]:
+        """POST with a streamed body; the connection slot is held until the block exits"""
+        with self._request(path, json, headers) as response:
+            yield response
+    
+    @contextmanager
+    def _request(self, path: str, json: Dict[str, Any],
+                 headers: Optional[Dict[str, str]]) -> Iterator[requests.Response]:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.base_url}")
+        
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            if attempt and self.breaker.state == 'open':
+                # Other callers tripped the breaker while this one was backing off
+                raise CircuitOpenError(f"Circuit open for {self.base_url}")
+            self._slots.acquire()
+            self.requests += 1
+            try:
+                response = self.session.post(url, json=json, headers=headers, timeout=self.timeout, stream=True)
+            except RETRY_ERRORS:
+                self._slots.release()
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+            except Exception:
+                self._slots.release()
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    response.close()
+                    self._slots.release()
+                    time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max,
+                                             response.headers.get('Retry-After')))
+                else:
+                    break
+            attempt += 1
+            self.retries += 1
+        
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        try:
+            yield response
+        finally:
+            response.close()
+            self._slots.release()
+    
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.breaker.stats(), requests=self.requests, retries=self.retries)
+    
+    def close(self) -> None:
+        self.session.close()
+
+class AsyncPooledHTTPClient:
+    """asyncio counterpart of PooledHTTPClient built on httpx; may share a circuit breaker with it
+    
+    httpx clients and asyncio semaphores belong to the event loop they were first used on, so each
+    running loop gets its own pair. They are dropped with the loop and closed when it shuts down.
+    """
+    
+    def __init__(self, base_url: str, max_connections: int = 4, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0, breaker: Optional[CircuitBreaker] = None):
+        if httpx is None:
+            raise ImportError("AsyncPooledHTTPClient requires httpx (pip install httpx)")
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.requests = 0
+        self.retries = 0
+        self.max_connections = max_connections
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._loops = weakref.WeakKeyDictionary()  # event loop -> (httpx client, concurrency slots, closer)
+    
+    async def _connection(self) -> Tuple['httpx.AsyncClient', asyncio.Semaphore]:
+        """The running loop's client and concurrency slots, created on its first request"""
+        loop = asyncio.get_running_loop()
+        entry = self._loops.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+            # Starting the generator registers it with the loop, whose shutdown_asyncgens() closes it
+            closer = self._close_with_loop(loop, client)
+            await closer.__anext__()
+            entry = self._loops[loop] = (client, asyncio.Semaphore(self.max_connections), closer)
+        return entry[0], entry[1]
+    
+    async def _close_with_loop(self, loop: asyncio.AbstractEventLoop, client: 'httpx.AsyncClient') -> AsyncIterator[None]:
+        """Parked after its first step; the loop finalizes it on shutdown, closing client while it can still await"""
+        try:
+            yield
+        finally:
+            # The semaphore refers to its loop, so the entry would otherwise keep the closed loop alive
+            self._loops.pop(loop, None)
+            await client.aclose()
+    
+    async def post(self, path: str, json: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> 'httpx.Response':
+        """POST and read the whole response body"""
+        async with self.stream(path, json, headers) as response:
+            await response.aread()
+            return response
+    
+    @asynccontextmanager
+    async def stream(self, path: str, json: Dict[str, Any],
+                     headers: Optional[Dict[str, str]] = None) -> AsyncIterator['httpx.Response']:
+        """POST with a streamed body; the concurrency slot is held until the block exits"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {self.base_url}")
+        
+        client, slots = await self._connection()
+        attempt = 0
+        while True:
+            if attempt and self.breaker.state == 'open':
+                # Other callers tripped the breaker while this one was backing off
+                raise CircuitOpenError(f"Circuit open for {self.base_url}")
+            await slots.acquire()
+            self.requests += 1
+            try:
+                response = await client.send(client.build_request('POST', path, json=json, headers=headers),
+                                             stream=True)
+            except ASYNC_RETRY_ERRORS:
+                slots.release()
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+            except Exception:
+                slots.release()
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    await response.aclose()
+                    slots.release()
+                    await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max,
+                                                      response.headers.get('Retry-After')))
+                else:
+                    break
+            attempt += 1
+            self.retries += 1
+        
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        try:
+            yield response
+        finally:
+            await response.aclose()
+            slots.release()
+    
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.breaker.stats(), requests=self.requests, retries=self.retries)
+    
+    async def aclose(self) -> None:
+        """Close the running loop's client now rather than at loop shutdown"""
+        entry = self._loops.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[2].aclose()
@@ -0,0 +1,163 @@
+import faiss
+import numpy as np
+from typing import Dict, Any
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+VECTOR_STORAGE = ('float32', 'float16', 'int8')
+SCALAR_QUANTIZERS = {'float16': faiss.ScalarQuantizer.QT_fp16, 'int8': faiss.ScalarQuantizer.QT_8bit}
+TRAINING_POINTS_PER_LIST = 39  # Roughly this many training points per IVF cluster keeps k-means stable
+
+DEFAULT_INDEX_PARAMS = {
+    'min_vectors': 10000,  # Stay on an exact Flat index below this many chunks
+    'nlist': 1024,  # IVF coarse clusters (capped so each gets enough training points)
+    'retrain_growth': 4,  # Retrain an IVF index once the corpus supports this many times the lists it was trained with
+    'nprobe': 16,  # IVF clusters visited per query
+    'pq_m': 64,  # PQ sub-quantizers, must divide the embedding dimension
+    'pq_nbits': 8,
+    'hnsw_m': 32,
+    'ef_construction': 200,
+    'ef_search': 64,
+    'storage': 'float32',  # Vector codes: float32, float16 or int8 (scalar quantized per dimension)
+    'pca_dim': 0,  # Reduce vectors to this many dimensions with PCA before storing them, 0 to keep all
+    'rescore_factor': 4,  # Compressed search fetches this many times the candidates and rescores them exactly
+}
+
+def resolve_params(params: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Fill in defaults for any index parameter that is not configured"""
+    resolved = dict(DEFAULT_INDEX_PARAMS)
+    resolved.update(params or {})
+    return resolved
+
+def create_flat_index(dimension: int):
+    """Exact inner-product index keyed by chunk ID"""
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+
+def is_compressed(params: Dict[str, Any]) -> bool:
+    """Whether vectors are stored with less than full float32 precision"""
+    return params['storage'] != 'float32' or bool(params['pca_dim'])
+
+def should_train(index_type: str, num_vectors: int, params: Dict[str, Any]) -> bool:
+    """Whether the corpus is large enough to move from Flat to the configured index type and storage
+    
+    Scalar quantizer ranges and PCA are trained too, so compression waits for enough vectors as well.
+    """
+    return (index_type != 'flat' or is_compressed(params)) and num_vectors >= params['min_vectors']
+
+def ivf_list_count(num_vectors: int, params: Dict[str, Any]) -> int:
+    """IVF lists to train for num_vectors: the configured nlist, capped so each list gets enough training points"""
+    return max(1, min(params['nlist'], num_vectors // TRAINING_POINTS_PER_LIST))
+
+def should_retrain(index, num_vectors: int, params: Dict[str, Any]) -> bool:
+    """Whether an IVF index trained on a smaller corpus (and so with fewer lists) has outgrown its nlist"""
+    ivf = faiss.try_extract_index_ivf(index) if index is not None else None
+    if ivf is None:
+        return False
+    return ivf_list_count(num_vectors, params) >= ivf.nlist * params['retrain_growth']
+
+def build_index(index_type: str, vectors: np.ndarray, ids: np.ndarray, params: Dict[str, Any]):
+    """Build, train and fill an index of the configured type from normalized vectors"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type: {index_type}")
+    if index_type != 'ivf_pq' and params['storage'] not in VECTOR_STORAGE:
+        raise ValueError(f"Unsupported vector storage: {params['storage']}")
+    
+    dimension = vectors.shape[1]
+    pca_dim = params['pca_dim']
+    if pca_dim and not 0 < pca_dim < dimension:
+        raise ValueError(f"pca_dim must be between 1 and {dimension - 1}")
+    stored_dimension = pca_dim or dimension
+    qtype = SCALAR_QUANTIZERS.get(params['storage'])
+    
+    if index_type in ('flat', 'hnsw'):
+        if index_type == 'flat':
+            base = (faiss.IndexScalarQuantizer(stored_dimension, qtype, faiss.METRIC_INNER_PRODUCT)
+                    if qtype is not None else faiss.IndexFlatIP(stored_dimension))
+        else:
+            base = (faiss.IndexHNSWSQ(stored_dimension, qtype, params['hnsw_m'], faiss.METRIC_INNER_PRODUCT)
+                    if qtype is not None else
+                    faiss.IndexHNSWFlat(stored_dimension, params['hnsw_m'], faiss.METRIC_INNER_PRODUCT))
+            base.hnsw.efConstruction = params['ef_construction']
+        index = faiss.IndexIDMap2(_with_pca(base, dimension, pca_dim))
+    else:
+        nlist = ivf_list_count(len(vectors), params)
+        quantizer = faiss.IndexFlatIP(stored_dimension)
+        if index_type == 'ivf_pq':
+            # Product quantization is already a compressed code, so the storage setting does not apply
+            ivf = faiss.IndexIVFPQ(quantizer, stored_dimension, nlist, params['pq_m'],
+                                   params['pq_nbits'], faiss.METRIC_INNER_PRODUCT)
+        elif qtype is not None:
+            ivf = faiss.IndexIVFScalarQuantizer(quantizer, stored_dimension, nlist, qtype, faiss.METRIC_INNER_PRODUCT)
+        else:
+            ivf = faiss.IndexIVFFlat(quantizer, stored_dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        # IVF indexes take arbitrary IDs natively; a hashtable makes them reconstructible
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        index = _with_pca(ivf, dimension, pca_dim)
+        print(f"Training {index_type} index with {nlist} lists on {len(vectors)} vectors...")
+    
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, ids)
+    apply_search_params(index, params)
+    return index
+
+def apply_search_params(index, params: Dict[str, Any]) -> None:
+    """Set query-time tunables (nprobe for IVF, efSearch for HNSW)"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = params['nprobe']
+    
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = params['ef_search']
+
+def _with_pca(index, dimension: int, pca_dim: int):
+    """Put a PCA projection in front of index, which then stores pca_dim-dimensional vectors"""
+    if not pca_dim:
+        return index
+    return faiss.IndexPreTransform(faiss.PCAMatrix(dimension, pca_dim), index)
+
+def _base_index(index):
+    """The index that stores the vectors, unwrapped from its ID map and PCA transform"""
+    if isinstance(index, faiss.IndexIDMap2):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def index_type_of(index) -> str:
+    """Name of the index family actually in use"""
+    if index is None:
+        return 'none'
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(base, faiss.IndexIVF):
+        return 'ivf_flat'
+    if isinstance(base, faiss.IndexHNSW):
+        return 'hnsw'
+    return 'flat'
+
+def storage_of(index) -> Dict[str, Any]:
+    """The storage and pca_dim parameters an index was actually built with"""
+    if index is None:
+        return {'storage': 'float32', 'pca_dim': 0}
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base = faiss.downcast_index(base.storage)
+    qtype = base.sq.qtype if isinstance(base, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)) else None
+    storage = next((name for name, value in SCALAR_QUANTIZERS.items() if value == qtype), 'float32')
+    if isinstance(base, faiss.IndexIVFPQ):
+        storage = 'pq'
+    return {'storage': storage, 'pca_dim': base.d if base.d != index.d else 0}
+
+def code_size(index) -> int:
+    """Bytes stored per vector"""
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        # Graph indexes have no standalone codec; their vectors live in a separate storage index
+        return faiss.downcast_index(base.storage).sa_code_size()
+    return base.sa_code_size()
+
+def supports_remove(index) -> bool:
+    """HNSW graphs cannot drop vectors in place and have to be rebuilt"""
+    return index_type_of(index) != 'hnsw'
@@ -0,0 +1,205 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+from utils.chunker import StructuredChunker, token_counter
+from utils.document_processor import DocumentProcessor
+from utils.embeddings import set_embedding_threads
+
+class IngestionCancelled(Exception):
+    """Raised when an ingestion run is cancelled part-way through"""
+
+def extract_file_chunks(file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200,
+                        chunker: Optional[StructuredChunker] = None) -> Dict[str, Any]:
+    """Extract and chunk one file (runs inside a worker process)"""
+    started = time.perf_counter()
+    try:
+        chunks = list(DocumentProcessor().iter_file_chunks(file_path, chunk_size, chunk_overlap, chunker))
+        error = None
+    except Exception as e:
+        chunks = []
+        error = f"Error processing {file_path}: {str(e)}"
+    return {'chunks': chunks, 'error': error, 'seconds': time.perf_counter() - started}
+
+def worker_context():
+    """Start method for extraction workers: never fork, since the parent runs torch and tokenizer threads"""
+    # A forked child inherits those threads' locks in whatever state they were in and can deadlock on them
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+_worker_pools = {}  # (workers, tokenizer model) -> extraction pool kept across ingestion runs
+_worker_pools_lock = threading.Lock()
+
+def _load_worker_tokenizer(model_name: Optional[str]) -> None:
+    token_counter(model_name)
+
+def worker_pool(workers: int, chunker: Optional[StructuredChunker]) -> ProcessPoolExecutor:
+    """Extraction pool shared by every run, so each worker process loads the tokenizer only once"""
+    model_name = chunker.model_name if chunker is not None else None
+    with _worker_pools_lock:
+        pool = _worker_pools.get((workers, model_name))
+        if pool is None:
+            pool = _worker_pools[(workers, model_name)] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=worker_context(),
+                initializer=_load_worker_tokenizer, initargs=(model_name,))
+        return pool
+
+def discard_worker_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died, so the next run starts a fresh one"""
+    with _worker_pools_lock:
+        for key, cached in list(_worker_pools.items()):
+            if cached is pool:
+                del _worker_pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+class IngestionPipeline:
+    """Parallel ingestion: a process pool extracts files while the main thread embeds fixed-size batches"""
+    
+    def __init__(self, vector_store, workers: int = None, batch_size: int = 64, embedding_threads: int = None,
+                 chunker: Optional[StructuredChunker] = None, embedding_backend: str = 'huggingface'):
+        self.vector_store = vector_store
+        self.chunker = chunker  # None keeps the legacy word windows
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.document_processor = DocumentProcessor()
+        set_embedding_threads(embedding_threads or os.cpu_count() or 1, embedding_backend)
+    
+    def ingest(self, files: List[Dict[str, str]], progress: Optional[Callable[[str, str, int], None]] = None,
+               cancel_event=None) -> Dict[str, Any]:
+        """Index files given as {'id', 'filename', 'path'} dicts and report per-stage timings
+        
+        progress(file_id, stage, count) is called as chunks are extracted, embedded and indexed.
+        Setting cancel_event stops the run and discards anything it had already indexed. The run's
+        chunks become searchable together, as one new snapshot of the store, when it finishes.
+        """
+        with self.vector_store.update():
+            return self._ingest(files, progress, cancel_event)
+    
+    def _ingest(self, files: List[Dict[str, str]], progress: Optional[Callable[[str, str, int], None]],
+                cancel_event) -> Dict[str, Any]:
+        self._progress = progress or (lambda file_id, stage, count: None)
+        self._cancel_event = cancel_event
+        timings = {'extract': 0.0, 'extract_cpu': 0.0, 'embed': 0.0, 'index': 0.0}
+        counts = {}  # document id -> chunks added
+        errors = {}  # document id -> error message
+        embedding_stats = {'hits': 0, 'misses': 0}
+        pending = []  # (file, chunk) pairs waiting for a full embedding batch
+        started = time.perf_counter()
+        
+        extracted = self._extracted_chunks(files, timings, errors)
+        try:
+            self._check_cancelled()
+            for file, chunk in extracted:
+                counts.setdefault(file['id'], 0)
+                pending.append((file, chunk))
+                if len(pending) == self.batch_size:
+                    self._check_cancelled()
+                    self._embed_and_index(pending, counts, timings, embedding_stats)
+                    pending = []
+            if pending:
+                self._embed_and_index(pending, counts, timings, embedding_stats)
+            self._check_cancelled()
+        except IngestionCancelled:
+            # ingest() runs inside vector_store.update(), which discards the whole draft when this
+            # propagates; that is the rollback, so nothing indexed so far needs removing here
+            extracted.close()
+            raise
+        
+        index_started = time.perf_counter()
+        for file in files:
+            # A file that failed part-way through must not leave a partial document behind
+            if file['id'] in errors and counts.get(file['id']):
+                self.vector_store.remove_document(file['id'])
+                counts[file['id']] = 0
+        self.vector_store.maybe_train_index()
+        timings['index'] += time.perf_counter() - index_started
+        timings['total'] = time.perf_counter() - started
+        
+        return {
+            'documents': [
+                {'id': file['id'], 'filename': file['filename'], 'chunks': counts[file['id']]}
+                for file in files if counts.get(file['id'])
+            ],
+            'errors': [
+                {'id': file['id'], 'filename': file['filename'], 'error': errors[file['id']]}
+                for file in files if file['id'] in errors
+            ],
+            'embedding_cache': embedding_stats,
+            'timings': {stage: round(seconds, 3) for stage, seconds in timings.items()}
+        }
+    
+    def _extracted_chunks(self, files: List[Dict[str, str]], timings: Dict[str, float],
+                          errors: Dict[str, str]) -> Iterator[Tuple[Dict[str, str], Dict[str, Any]]]:
+        started = time.perf_counter()
+        
+        # A single file streams inline; spinning up a pool would only add latency
+        if len(files) == 1 or self.workers == 1:
+            for file in files:
+                try:
+                    for chunk in self.document_processor.iter_file_chunks(file['path'], chunker=self.chunker):
+                        self._progress(file['id'], 'extracted', 1)
+                        yield file, chunk
+                except Exception as e:
+                    errors[file['id']] = f"Error processing {file['path']}: {str(e)}"
+            timings['extract'] = timings['extract_cpu'] = time.perf_counter() - started - timings['embed'] - timings['index']
+            return
+        
+        pool = worker_pool(self.workers, self.chunker)
+        futures = {pool.submit(extract_file_chunks, file['path'], chunker=self.chunker): file for file in files}
+        try:
+            for future in as_completed(futures):
+                file = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    discard_worker_pool(pool)
+                    raise
+                timings['extract_cpu'] += result['seconds']
+                if result['error']:
+                    errors[file['id']] = result['error']
+                self._progress(file['id'], 'extracted', len(result['chunks']))
+                for chunk in result['chunks']:
+                    yield file, chunk
+        finally:
+            # On cancellation don't wait for files that have not started extracting; the pool stays up
+            for future in futures:
+                future.cancel()
+        timings['extract'] = time.perf_counter() - started - timings['embed'] - timings['index']
+    
+    def _embed_and_index(self, pending: List[Tuple[Dict[str, str], Dict[str, Any]]], counts: Dict[str, int],
+                         timings: Dict[str, float], embedding_stats: Dict[str, int]) -> None:
+        embed_started = time.perf_counter()
+        embeddings = self.vector_store.embed_documents([chunk['text'] for _, chunk in pending], embedding_stats)
+        timings['embed'] += time.perf_counter() - embed_started
+        for file, group in self._group_by_file(pending):
+            self._progress(file['id'], 'embedded', len(group))
+        
+        index_started = time.perf_counter()
+        start = 0
+        for file, group in self._group_by_file(pending):
+            self.vector_store.add_embedded(file['id'], file['filename'], group,
+                                           embeddings[start:start + len(group)], counts[file['id']])
+            counts[file['id']] += len(group)
+            start += len(group)
+            self._progress(file['id'], 'indexed', len(group))
+        timings['index'] += time.perf_counter() - index_started
+    
+    def _check_cancelled(self) -> None:
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise IngestionCancelled()
+    
+    @staticmethod
+    def _group_by_file(pending: Iterable[Tuple[Dict[str, str], Dict[str, Any]]]) -> Iterator[Tuple[Dict[str, str], List[Dict[str, Any]]]]:
+        """Split a batch into consecutive runs of chunks from the same file"""
+        current, group = None, []
+        for file, chunk in pending:
+            if current is not None and file['id'] != current['id']:
+                yield current, group
+                group = []
+            current = file
+            group.append(chunk)
+        if group:
+            yield current, group
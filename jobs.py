@@ -0,0 +1,121 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional
+
+class IngestionJob:
+    """A background ingestion run with per-file progress counters"""
+    
+    KIND = 'ingestion'
+    STAGES = ('extracted', 'embedded', 'indexed')  # Progress counters kept for each file
+    
+    def __init__(self, files: List[Dict[str, Any]], collection: Optional[str] = None,
+                 options: Optional[Dict[str, Any]] = None):
+        self.id = str(uuid.uuid4())
+        self.files = files
+        self.collection = collection  # Knowledge base the files are added to
+        self.options = options or {}
+        self.status = 'queued'  # queued, running, completed, failed, cancelled
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self.progress = OrderedDict(
+            (file['id'], dict({'filename': file['filename'], 'error': None}, **{stage: 0 for stage in self.STAGES}))
+            for file in files
+        )
+    
+    def update_progress(self, file_id: str, stage: str, count: int) -> None:
+        """Add count chunks to one of a file's STAGES counters"""
+        with self._lock:
+            self.progress[file_id][stage] += count
+    
+    def set_file_error(self, file_id: str, error: str) -> None:
+        with self._lock:
+            self.progress[file_id]['error'] = error
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            files = [dict(entry, id=file_id) for file_id, entry in self.progress.items()]
+        return {
+            'job_id': self.id,
+            'kind': self.KIND,
+            'status': self.status,
+            'collection': self.collection,
+            'error': self.error,
+            'files': files,
+            'result': self.result,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class SummaryJob(IngestionJob):
+    """A background summary of a collection; files are its documents, counted once each is summarized"""
+    
+    KIND = 'summary'
+    STAGES = ('summarized',)
+
+class JobManager:
+    """Runs ingestion (or other job_class) jobs on background threads and keeps a bounded history for polling"""
+    
+    def __init__(self, runner: Callable[[IngestionJob], Dict[str, Any]], max_workers: int = 1, history: int = 100,
+                 job_class: type = IngestionJob):
+        self.runner = runner
+        self.history = history
+        self.job_class = job_class
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+    
+    def submit(self, files: List[Dict[str, Any]], collection: Optional[str] = None,
+               options: Optional[Dict[str, Any]] = None) -> IngestionJob:
+        job = self.job_class(files, collection, options)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs once the history is full
+            for job_id in list(self._jobs):
+                if len(self._jobs) <= self.history:
+                    break
+                if self._jobs[job_id].finished_at is not None:
+                    del self._jobs[job_id]
+        self._executor.submit(self._run, job)
+        return job
+    
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def list(self) -> List[IngestionJob]:
+        with self._lock:
+            return list(self._jobs.values())
+    
+    def cancel(self, job_id: str) -> bool:
+        """Ask a queued or running job to stop; it rolls back anything it indexed"""
+        job = self.get(job_id)
+        if job is None or job.finished_at is not None:
+            return False
+        job.cancel_event.set()
+        return True
+    
+    def _run(self, job: IngestionJob) -> None:
+        job.started_at = time.time()
+        job.status = 'running'
+        try:
+            # The runner always gets the job, even if cancelled while queued, so it can clean up
+            job.result = self.runner(job)
+            job.status = 'cancelled' if job.cancel_event.is_set() else 'completed'
+        except Exception as e:
+            if job.cancel_event.is_set():
+                job.status = 'cancelled'
+            else:
+                print(f"{job.KIND.capitalize()} job {job.id} failed: {str(e)}")
+                job.status = 'failed'
+                job.error = str(e)
+        finally:
+            job.finished_at = time.time()
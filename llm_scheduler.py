@@ -0,0 +1,150 @@
+import hashlib
+import heapq
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, Optional
+from utils import metrics
+
+PRIORITY_INTERACTIVE = 0  # A student waiting on /chat or /compare
+PRIORITY_BACKGROUND = 10  # Map-reduce summary calls, which arrive many at a time
+
+class QueueTimeout(Exception):
+    """A request waited longer than its timeout for a free generation slot"""
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Identifies an LLM request by everything that affects its answer (model, prompt, options)"""
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+class _Backend:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiting = []  # Heap of (priority, arrival) entries; the head gets the next free slot
+        self.condition = threading.Condition()
+        self.started = 0
+        self.coalesced = 0
+        self.timed_out = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+class LLMScheduler:
+    """Admits LLM generations per backend up to a concurrency limit, in priority order
+    
+    Requests beyond a backend's limit queue, lower priority values first and then in arrival order,
+    and give up with QueueTimeout after their timeout. A request whose key matches one that is already
+    queued or running waits for that request's answer instead of generating it again, unless it has
+    higher priority than that request; then it generates on its own and later duplicates wait for it.
+    """
+    
+    def __init__(self, limits: Dict[str, int], default_limit: int = 1):
+        self.default_limit = default_limit
+        self._backends = {name: _Backend(limit) for name, limit in limits.items()}
+        self._inflight = {}  # (backend, key) -> (Future of the leading request's result, its priority)
+        self._arrivals = itertools.count()
+        self._lock = threading.Lock()
+    
+    def run(self, backend: str, key: Optional[str], generate: Callable[[], Any],
+            priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> Any:
+        """Result of generate(), called in one of backend's slots or shared with an identical request in flight"""
+        if key is None:
+            with self.slot(backend, priority, timeout):
+                return generate()
+        
+        with self._lock:
+            future, leader_priority = self._inflight.get((backend, key), (None, None))
+            # Never wait behind a request that would itself queue behind this one
+            leader = future is None or priority < leader_priority
+            if leader:
+                future = Future()
+                self._inflight[(backend, key)] = (future, priority)
+        if not leader:
+            state = self._backend(backend)
+            with state.condition:
+                state.coalesced += 1
+            return future.result()
+        
+        try:
+            with self.slot(backend, priority, timeout):
+                result = generate()
+        except BaseException as e:
+            self._finish(backend, key, future)
+            future.set_exception(e)
+            raise
+        # Later arrivals start a new generation (the answer cache serves repeats once one is stored)
+        self._finish(backend, key, future)
+        future.set_result(result)
+        return result
+    
+    @contextmanager
+    def slot(self, backend: str, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> Iterator[None]:
+        """Hold one of backend's generation slots for the block, e.g. while a response streams"""
+        state = self._backend(backend)
+        queued = time.perf_counter()
+        entry = (priority, next(self._arrivals))
+        with state.condition:
+            heapq.heappush(state.waiting, entry)
+            try:
+                while state.active >= state.limit or state.waiting[0] != entry:
+                    remaining = queued + timeout - time.perf_counter() if timeout is not None else None
+                    if remaining is not None and remaining <= 0:
+                        state.timed_out += 1
+                        raise QueueTimeout(f"no free {backend} slot after waiting {timeout:g}s "
+                                           f"({len(state.waiting) - 1} other requests queued)")
+                    state.condition.wait(remaining)
+            except BaseException:
+                state.waiting.remove(entry)
+                heapq.heapify(state.waiting)
+                state.condition.notify_all()
+                raise
+            heapq.heappop(state.waiting)
+            state.active += 1
+            state.started += 1
+            waited = time.perf_counter() - queued
+            state.wait_seconds += waited
+            state.max_wait_seconds = max(state.max_wait_seconds, waited)
+            # The next request in line may fit in another free slot
+            state.condition.notify_all()
+        metrics.LLM_QUEUE_SECONDS.observe(waited, backend=backend)
+        
+        try:
+            yield
+        finally:
+            with state.condition:
+                state.active -= 1
+                state.condition.notify_all()
+    
+    def _backend(self, backend: str) -> _Backend:
+        with self._lock:
+            state = self._backends.get(backend)
+            if state is None:
+                state = self._backends[backend] = _Backend(self.default_limit)
+            return state
+    
+    def _finish(self, backend: str, key: str, future: Future) -> None:
+        with self._lock:
+            # A higher priority duplicate may have taken over the key in the meantime
+            if self._inflight.get((backend, key), (None,))[0] is future:
+                del self._inflight[(backend, key)]
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per backend: limit, running and queued requests, and how long admitted requests waited"""
+        with self._lock:
+            backends = dict(self._backends)
+        stats = {}
+        for name, state in backends.items():
+            with state.condition:
+                stats[name] = {
+                    'limit': state.limit,
+                    'active': state.active,
+                    'queued': len(state.waiting),
+                    'started': state.started,
+                    'coalesced': state.coalesced,
+                    'timed_out': state.timed_out,
+                    'mean_wait_seconds': state.wait_seconds / state.started if state.started else None,
+                    'max_wait_seconds': state.max_wait_seconds
+                }
+        return stats
@@ -0,0 +1,185 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterator, Tuple
+
+# Latency buckets in seconds, from a cached answer up to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonically increasing count per label combination"""
+    
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Bucketed observations (typically seconds) per label combination"""
+    
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float('inf') else _format_value(bound)
+                    labels = _format_labels(self.label_names + ('le',), key + (le,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Gauge:
+    """Value read from a callback when metrics are scraped
+    
+    The callback returns a number, or a dict of label value -> number for a single-label gauge;
+    non-numeric entries (e.g. a hit rate that is still None) are skipped.
+    """
+    
+    def __init__(self, name: str, help: str, callback: Callable[[], Any], labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.label_names = tuple(labels)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return lines
+        
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for key, number in items:
+            if isinstance(number, bool) or not isinstance(number, (int, float)):
+                continue
+            key = key if isinstance(key, tuple) else (str(key),)
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(number)}")
+        return lines
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text exposition format"""
+    
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, metric, replace: bool = False):
+        with self._lock:
+            if metric.name in self._metrics and not replace:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+    
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+    
+    def gauge(self, name: str, help: str, callback: Callable[[], Any], labels: Tuple[str, ...] = ()) -> Gauge:
+        # Re-registering a gauge points it at the newest component instance
+        return self._register(Gauge(name, help, callback, labels), replace=True)
+    
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'edugpt_stage_seconds', 'Time spent in each stage of a request or ingestion job', ('operation', 'stage'))
+REQUEST_SECONDS = registry.histogram(
+    'edugpt_http_request_seconds', 'HTTP request latency until the response starts', ('endpoint', 'method', 'status'))
+REQUESTS = registry.counter(
+    'edugpt_http_requests_total', 'HTTP requests by endpoint and status', ('endpoint', 'method', 'status'))
+MODEL_SELECTIONS = registry.counter(
+    'edugpt_model_selections_total', 'LLM calls by backend and selected model', ('backend', 'model'))
+INGESTED = registry.counter(
+    'edugpt_ingested_total', 'Documents, chunks and file errors from ingestion jobs', ('kind',))
+CONTEXT_TOKENS = registry.counter(
+    'edugpt_context_tokens_total', 'Estimated prompt-context tokens sent to the LLM and saved by compression', ('kind',))
+LLM_QUEUE_SECONDS = registry.histogram(
+    'edugpt_llm_queue_seconds', 'Time LLM requests waited for a generation slot', ('backend',))
+
+class Trace:
+    """Times the stages of one request; every stage is also observed in STAGE_SECONDS"""
+    
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.timings = {}  # stage -> seconds
+        self.started = time.perf_counter()
+    
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+    
+    def record(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, operation=self.operation, stage=name)
+    
+    def finish(self) -> None:
+        """Record the end-to-end time of the traced operation"""
+        if 'total' not in self.timings:
+            self.record('total', time.perf_counter() - self.started)
+    
+    def to_dict(self) -> Dict[str, float]:
+        """Stage timings in milliseconds"""
+        return {name: round(seconds * 1000, 2) for name, seconds in self.timings.items()}
+
+def record_stages(operation: str, timings: Dict[str, float]) -> None:
+    """Observe stage timings (in seconds) measured elsewhere, e.g. by the ingestion pipeline"""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, operation=operation, stage=stage)
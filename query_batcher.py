@@ -0,0 +1,88 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+class QueryBatcher:
+    """Coalesces queries that arrive within a few milliseconds into one embedding pass and FAISS search
+    
+    Queries may target different vector stores as long as they share one embedding model: the whole
+    batch is embedded together and each store is searched once for its own queries.
+    """
+    
+    def __init__(self, vector_store, max_wait_ms: float = 5, max_batch: int = 32):
+        self.vector_store = vector_store
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+        self.batches = 0
+        self.queries = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='query-batcher', daemon=True)
+        self._worker.start()
+    
+    def search(self, query: str, k: int = 5, vector_store=None,
+               query_vector: Optional[np.ndarray] = None) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Embed (unless query_vector is given) and search one query, sharing the work with concurrent callers; returns (vector, results)"""
+        future = Future()
+        self._queue.put((query, k, future, vector_store or self.vector_store, query_vector))
+        return future.result()
+    
+    def embed(self, query: str, vector_store=None) -> np.ndarray:
+        """Embed one query without searching, sharing the embedding pass with concurrent callers"""
+        future = Future()
+        self._queue.put((query, 0, future, vector_store or self.vector_store, None))
+        return future.result()[0]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'batches': self.batches,
+            'queries': self.queries,
+            'average_batch_size': self.queries / self.batches if self.batches else None
+        }
+    
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+    
+    def _process(self, batch: List[Tuple[str, int, Future, Any, Optional[np.ndarray]]]) -> None:
+        try:
+            queries = [query for query, _, _, _, _ in batch]
+            # Queries that were embedded earlier (e.g. for an answer cache lookup) are only searched
+            missing = [position for position, item in enumerate(batch) if item[4] is None]
+            embedded = iter(batch[missing[0]][3].embed_queries([queries[position] for position in missing])
+                            if missing else [])
+            vectors = np.stack([np.asarray(item[4], dtype='float32') if item[4] is not None else next(embedded)
+                                for item in batch])
+            by_store = {}
+            for position, (_, k, future, vector_store, _) in enumerate(batch):
+                if k <= 0:
+                    future.set_result((vectors[position], []))
+                    continue
+                by_store.setdefault(id(vector_store), []).append(position)
+            for positions in by_store.values():
+                vector_store = batch[positions[0]][3]
+                # One search at the largest k; each caller keeps its own top k
+                max_k = max(batch[position][1] for position in positions)
+                results = vector_store.search_by_vectors(vectors[positions], max_k,
+                                                         [queries[position] for position in positions])
+                for position, result in zip(positions, results):
+                    _, k, future, _, _ = batch[position]
+                    future.set_result((vectors[position], result[:k]))
+            self.batches += 1
+            self.queries += len(batch)
+        except Exception as e:
+            for _, _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
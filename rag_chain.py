@@ -1,176 +1,571 @@
-import requests
-import ollama
-from typing import List, Dict, Any
-import json
-
-class RAGChain:
-    def __init__(self, vector_store, config):
-        self.vector_store = vector_store
-        self.config = config
-    
-    def get_local_response(self, query: str, context: str) -> str:
-        """Get response from local Ollama model"""
-        try:
-            prompt = f"""You are an expert educational assistant. Based on the following context from the user's study materials, please provide a comprehensive answer to their question.
-
-CONTEXT FROM STUDY MATERIALS:
-{context}
-
-USER'S QUESTION: {query}
-
-Please provide a detailed, accurate answer based on the provided context. If the context doesn't contain enough information to fully answer the question, please indicate what specific information is missing and provide a general explanation based on your knowledge.
-
-Structure your response to be clear and educational:"""
-
-            response = ollama.generate(
-                model=self.config.LOCAL_MODEL,
-                prompt=prompt,
-                options={
-                    'temperature': 0.3,
-                    'top_k': 40,
-                    'top_p': 0.9,
-                }
-            )
-            
-            return response['response']
-        except Exception as e:
-            return f"Error with local model: {str(e)}"
-    
-    def get_perplexity_response(self, query: str, context: str, query_type: str = "search") -> str:
-        """Get response from Perplexity API using appropriate model based on query type"""
-        try:
-            # Validate API key
-            if not self.config.PERPLEXITY_API_KEY or self.config.PERPLEXITY_API_KEY == "your-perplexity-api-key":
-                return "Perplexity API key not configured. Using local model instead."
-            
-            # Choose the right model based on query type
-            if query_type == "reasoning" or any(word in query.lower() for word in ['compare', 'analyze', 'explain', 'why', 'how']):
-                model = self.config.PERPLEXITY_REASONING_MODEL
-                print(f"🤔 Using reasoning model: {model}")
-            elif query_type == "research" or any(word in query.lower() for word in ['comprehensive', 'detailed', 'report', 'research']):
-                model = self.config.PERPLEXITY_RESEARCH_MODEL
-                print(f"🔍 Using research model: {model}")
-            else:
-                model = self.config.PERPLEXITY_SEARCH_MODEL
-                print(f"🔎 Using search model: {model}")
-            
-            headers = {
-                "Authorization": f"Bearer {self.config.PERPLEXITY_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            # Optimized prompt for Perplexity models
-            if context.strip():
-                prompt = f"""Based on the following context from the user's study materials, answer their question. If the context is insufficient, use your general knowledge to provide a helpful answer.
-
-CONTEXT FROM UPLOADED MATERIALS:
-{context}
-
-QUESTION: {query}
-
-Please provide a comprehensive and accurate answer:"""
-            else:
-                prompt = f"""Answer the following question based on your knowledge:
-
-QUESTION: {query}
-
-Please provide a comprehensive and accurate answer:"""
-
-            data = {
-                "model": model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are an expert computer science educator. Provide clear, accurate explanations with examples when helpful. Be comprehensive but concise."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "max_tokens": 2000,
-                "temperature": 0.3,
-                "top_p": 0.9
-            }
-            
-            print(f"🔄 Sending request to Perplexity API with model: {model}")
-            response = requests.post(
-                "https://api.perplexity.ai/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            print(f"📊 API Response Status: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content']
-                print("✅ Perplexity API request successful")
-                return content
-            else:
-                error_msg = f"Perplexity API error ({response.status_code}): {response.text}"
-                print(f"❌ {error_msg}")
-                return f"{error_msg}. Switching to local model."
-                
-        except requests.exceptions.Timeout:
-            error_msg = "Perplexity API timeout"
-            print(f"❌ {error_msg}")
-            return f"{error_msg}. Using local model."
-        except Exception as e:
-            error_msg = f"Error with Perplexity API: {str(e)}"
-            print(f"❌ {error_msg}")
-            return f"{error_msg}. Using local model."
-    
-    def generate_response(self, query: str, use_perplexity: bool = False) -> Dict[str, Any]:
-        """Generate response using RAG with intelligent model selection"""
-        # Search for relevant context
-        search_results = self.vector_store.search(query, k=5)
-        
-        # Combine context from search results
-        context = "\n\n".join([
-            f"From {result['document']['filename']} (relevance: {result['score']:.3f}):\n{result['document']['chunk']}"
-            for result in search_results
-        ]) if search_results else ""
-        
-        # Determine query type for model selection
-        query_type = "search"  # default
-        if any(word in query.lower() for word in ['compare', 'analyze', 'explain', 'why', 'how', 'difference']):
-            query_type = "reasoning"
-        elif any(word in query.lower() for word in ['comprehensive', 'detailed', 'report', 'research', 'summary']):
-            query_type = "research"
-        
-        # Generate response
-        if use_perplexity and self.config.PERPLEXITY_API_KEY != "your-perplexity-api-key":
-            response = self.get_perplexity_response(query, context, query_type)
-        else:
-            response = self.get_local_response(query, context)
-        
-        return {
-            "response": response,
-            "sources": [
-                {
-                    "filename": result['document']['filename'],
-                    "score": result['score'],
-                    "content": result['document']['chunk'][:150] + "..."
-                }
-                for result in search_results
-            ] if search_results else [],
-            "context_length": len(context)
-        }
-    
-    def summarize_document(self, content: str, use_perplexity: bool = False) -> str:
-        """Generate document summary using research model"""
-        query = f"Please provide a comprehensive summary of the following document. Focus on key points, main arguments, and important findings:\n\n{content[:3000]}"
-        
-        if use_perplexity:
-            return self.get_perplexity_response(query, "", "research")
-        else:
-            return self.get_local_response(query, "")
-    
-    def compare_concepts(self, concept1: str, concept2: str, use_perplexity: bool = False) -> str:
-        """Compare two concepts using reasoning model"""
-        query = f"Compare and contrast {concept1} and {concept2}. Discuss their similarities, differences, advantages, disadvantages, and use cases."
-        
-        response_data = self.generate_response(query, use_perplexity)
-        return response_data["response"]
\ No newline at end of file
+import asyncio
+import copy
+import requests
+import numpy as np
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from utils import metrics
+from utils.llm_scheduler import PRIORITY_INTERACTIVE, request_key
+from utils.metrics import Trace
+from utils.http_client import PooledHTTPClient, AsyncPooledHTTPClient, CircuitBreaker
+from utils.context_builder import ContextBuilder
+
+class RAGChain:
+    LOCAL_OPTIONS = {
+        'temperature': 0.3,
+        'top_k': 40,
+        'top_p': 0.9,
+    }
+    
+    def __init__(self, vector_store, config, answer_cache=None, query_batcher=None, reranker=None, scheduler=None):
+        self.vector_store = vector_store
+        self.config = config
+        self.answer_cache = answer_cache
+        self.query_batcher = query_batcher
+        self.reranker = reranker
+        self.scheduler = scheduler  # LLMScheduler limiting concurrent generations; None calls the backends directly
+        self._clients = {}  # Lazily created clients, shared with the chains made by for_store
+        # One keep-alive pool per process; the breaker is shared with the asyncio client
+        self.perplexity_client = PooledHTTPClient(
+            breaker=CircuitBreaker(config.PERPLEXITY_BREAKER_FAILURES, config.PERPLEXITY_BREAKER_RESET_SECONDS),
+            **self._perplexity_client_options()
+        )
+        self.context_builder = ContextBuilder(
+            config.CONTEXT_TOKEN_BUDGETS,
+            default_budget=config.DEFAULT_CONTEXT_TOKEN_BUDGET,
+            redundancy_threshold=config.CONTEXT_REDUNDANCY_THRESHOLD
+        )
+    
+    @property
+    def ollama_client(self):
+        """Ollama client, created on first use so importing the ollama package does not slow startup"""
+        client = self._clients.get('ollama')
+        if client is None:
+            import ollama
+            client = self._clients.setdefault('ollama', ollama.Client(host=self.config.OLLAMA_BASE_URL))
+        return client
+    
+    @property
+    def async_perplexity_client(self) -> AsyncPooledHTTPClient:
+        """asyncio Perplexity client, created on first use; it keeps one connection pool per event loop"""
+        client = self._clients.get('perplexity_async')
+        if client is None:
+            client = self._clients.setdefault('perplexity_async', AsyncPooledHTTPClient(
+                breaker=self.perplexity_client.breaker, **self._perplexity_client_options()))
+        return client
+    
+    def warm_up_local_model(self) -> None:
+        """Have Ollama load the local model into memory so the first answer does not wait for it"""
+        self.ollama_client.generate(model=self.config.LOCAL_MODEL, prompt="")
+    
+    def for_store(self, vector_store, answer_cache=None) -> 'RAGChain':
+        """A chain over another vector store that shares this chain's LLM clients, context builder and batcher"""
+        chain = copy.copy(self)
+        chain.vector_store = vector_store
+        chain.answer_cache = answer_cache
+        return chain
+    
+    def _perplexity_client_options(self) -> Dict[str, Any]:
+        return {
+            'base_url': self.config.PERPLEXITY_BASE_URL,
+            'max_connections': self.config.PERPLEXITY_MAX_CONCURRENCY,
+            'max_retries': self.config.PERPLEXITY_MAX_RETRIES,
+            'backoff_base': self.config.PERPLEXITY_BACKOFF_SECONDS,
+            'backoff_max': self.config.PERPLEXITY_BACKOFF_MAX_SECONDS,
+            'connect_timeout': self.config.PERPLEXITY_CONNECT_TIMEOUT,
+            'read_timeout': self.config.PERPLEXITY_READ_TIMEOUT
+        }
+    
+    def _build_local_prompt(self, query: str, context: str) -> str:
+        """Prompt for the local Ollama model"""
+        return f"""You are an expert educational assistant. Based on the following context from the user's study materials, please provide a comprehensive answer to their question.
+
+CONTEXT FROM STUDY MATERIALS:
+{context}
+
+USER'S QUESTION: {query}
+
+Please provide a detailed, accurate answer based on the provided context. If the context doesn't contain enough information to fully answer the question, please indicate what specific information is missing and provide a general explanation based on your knowledge.
+
+Structure your response to be clear and educational:"""
+    
+    def _queue_timeout(self, priority: int) -> Optional[float]:
+        """Interactive requests give up after the configured wait; background work waits its turn"""
+        return self.config.LLM_QUEUE_TIMEOUT_SECONDS if priority <= PRIORITY_INTERACTIVE else None
+    
+    def _schedule(self, backend: str, request: Dict[str, Any], generate, priority: int):
+        """Run a blocking generation through the scheduler, sharing it with identical requests in flight"""
+        if self.scheduler is None:
+            return generate()
+        return self.scheduler.run(backend, request_key(request), generate, priority, self._queue_timeout(priority))
+    
+    @contextmanager
+    def _slot(self, backend: str, priority: int) -> Iterator[None]:
+        """Hold a generation slot while a response streams (streams are not shared between requests)"""
+        with self.scheduler.slot(backend, priority, self._queue_timeout(priority)) if self.scheduler else nullcontext():
+            yield
+    
+    @staticmethod
+    def _report(outcome: Optional[Dict[str, Any]], model_key: str, failed: bool = False) -> None:
+        """Record in a caller's outcome dict which model answered and whether generation failed"""
+        if outcome is not None:
+            outcome.update(model=model_key, failed=failed)
+    
+    def get_local_response(self, query: str, context: str, priority: int = PRIORITY_INTERACTIVE,
+                           outcome: Optional[Dict[str, Any]] = None) -> str:
+        """Get response from local Ollama model"""
+        metrics.MODEL_SELECTIONS.inc(backend="ollama", model=self.config.LOCAL_MODEL)
+        request = {
+            'model': self.config.LOCAL_MODEL,
+            'prompt': self._build_local_prompt(query, context),
+            'options': self.LOCAL_OPTIONS
+        }
+        try:
+            response = self._schedule('ollama', request, lambda: self.ollama_client.generate(**request), priority)
+            
+            self._report(outcome, self._model_key(False))
+            return response['response']
+        except Exception as e:
+            self._report(outcome, self._model_key(False), failed=True)
+            return f"Error with local model: {str(e)}"
+    
+    def stream_local_response(self, query: str, context: str, priority: int = PRIORITY_INTERACTIVE,
+                              outcome: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Yield response tokens from the local Ollama model as they are generated"""
+        metrics.MODEL_SELECTIONS.inc(backend="ollama", model=self.config.LOCAL_MODEL)
+        try:
+            with self._slot('ollama', priority):
+                for part in self.ollama_client.generate(
+                    model=self.config.LOCAL_MODEL,
+                    prompt=self._build_local_prompt(query, context),
+                    options=self.LOCAL_OPTIONS,
+                    stream=True
+                ):
+                    if part.get('response'):
+                        yield part['response']
+            self._report(outcome, self._model_key(False))
+        except Exception as e:
+            self._report(outcome, self._model_key(False), failed=True)
+            yield f"Error with local model: {str(e)}"
+    
+    def _select_perplexity_model(self, query: str, query_type: str) -> str:
+        """Choose the right Perplexity model based on query type"""
+        if query_type == "reasoning" or any(word in query.lower() for word in ['compare', 'analyze', 'explain', 'why', 'how']):
+            model = self.config.PERPLEXITY_REASONING_MODEL
+            print(f"🤔 Using reasoning model: {model}")
+        elif query_type == "research" or any(word in query.lower() for word in ['comprehensive', 'detailed', 'report', 'research']):
+            model = self.config.PERPLEXITY_RESEARCH_MODEL
+            print(f"🔍 Using research model: {model}")
+        else:
+            model = self.config.PERPLEXITY_SEARCH_MODEL
+            print(f"🔎 Using search model: {model}")
+        metrics.MODEL_SELECTIONS.inc(backend="perplexity", model=model)
+        return model
+    
+    def _build_perplexity_request(self, query: str, context: str, model: str) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Headers and JSON body for a Perplexity chat completion"""
+        headers = {
+            "Authorization": f"Bearer {self.config.PERPLEXITY_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        
+        # Optimized prompt for Perplexity models
+        if context.strip():
+            prompt = f"""Based on the following context from the user's study materials, answer their question. If the context is insufficient, use your general knowledge to provide a helpful answer.
+
+CONTEXT FROM UPLOADED MATERIALS:
+{context}
+
+QUESTION: {query}
+
+Please provide a comprehensive and accurate answer:"""
+        else:
+            prompt = f"""Answer the following question based on your knowledge:
+
+QUESTION: {query}
+
+Please provide a comprehensive and accurate answer:"""
+
+        data = {
+            "model": model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are an expert computer science educator. Provide clear, accurate explanations with examples when helpful. Be comprehensive but concise."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": 2000,
+            "temperature": 0.3,
+            "top_p": 0.9
+        }
+        return headers, data
+    
+    def _perplexity_configured(self) -> bool:
+        return bool(self.config.PERPLEXITY_API_KEY) and self.config.PERPLEXITY_API_KEY != "your-perplexity-api-key"
+    
+    def get_perplexity_response(self, query: str, context: str, query_type: str = "search",
+                                priority: int = PRIORITY_INTERACTIVE, outcome: Optional[Dict[str, Any]] = None) -> str:
+        """Get response from Perplexity API using appropriate model based on query type
+        
+        Falls back to the local model when the API fails or its circuit breaker is open; outcome
+        (if given) records which model answered.
+        """
+        # Validate API key
+        if not self._perplexity_configured():
+            self._report(outcome, self._model_key(True), failed=True)
+            return "Perplexity API key not configured. Using local model instead."
+        
+        model = self._select_perplexity_model(query, query_type)
+        headers, data = self._build_perplexity_request(query, context, model)
+        try:
+            print(f"🔄 Sending request to Perplexity API with model: {model}")
+            response = self._schedule('perplexity', data, lambda: self.perplexity_client.post(
+                "/chat/completions", json=data, headers=headers), priority)
+            print(f"📊 API Response Status: {response.status_code}")
+            
+            if response.status_code == 200:
+                content = response.json()['choices'][0]['message']['content']
+                print("✅ Perplexity API request successful")
+                self._report(outcome, self._model_key(True))
+                return content
+            error_msg = f"Perplexity API error ({response.status_code}): {response.text}"
+        except requests.exceptions.Timeout:
+            error_msg = "Perplexity API timeout"
+        except Exception as e:
+            error_msg = f"Error with Perplexity API: {str(e)}"
+        
+        print(f"❌ {error_msg}. Switching to local model.")
+        return self.get_local_response(query, context, priority, outcome)
+    
+    async def get_perplexity_response_async(self, query: str, context: str, query_type: str = "search") -> str:
+        """asyncio variant of get_perplexity_response for callers fanning out many requests"""
+        if not self._perplexity_configured():
+            return "Perplexity API key not configured. Using local model instead."
+        
+        model = self._select_perplexity_model(query, query_type)
+        headers, data = self._build_perplexity_request(query, context, model)
+        try:
+            response = await self.async_perplexity_client.post("/chat/completions", json=data, headers=headers)
+            if response.status_code == 200:
+                return response.json()['choices'][0]['message']['content']
+            error_msg = f"Perplexity API error ({response.status_code}): {response.text}"
+        except Exception as e:
+            error_msg = f"Error with Perplexity API: {str(e)}"
+        
+        print(f"❌ {error_msg}. Switching to local model.")
+        return await asyncio.to_thread(self.get_local_response, query, context)
+    
+    def stream_perplexity_response(self, query: str, context: str, query_type: str = "search",
+                                   priority: int = PRIORITY_INTERACTIVE,
+                                   outcome: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Yield response tokens from the Perplexity API as server-sent events arrive
+        
+        Falls back to streaming from the local model if the API fails before the first token. Once the
+        stream ends, outcome (if given) records which model answered and whether the answer was cut off.
+        """
+        if not self._perplexity_configured():
+            self._report(outcome, self._model_key(True), failed=True)
+            yield "Perplexity API key not configured. Using local model instead."
+            return
+        
+        model = self._select_perplexity_model(query, query_type)
+        headers, data = self._build_perplexity_request(query, context, model)
+        data["stream"] = True
+        
+        started = False
+        try:
+            print(f"🔄 Streaming request to Perplexity API with model: {model}")
+            with self._slot('perplexity', priority), \
+                    self.perplexity_client.stream("/chat/completions", json=data, headers=headers) as response:
+                if response.status_code != 200:
+                    raise requests.HTTPError(f"Perplexity API error ({response.status_code}): {response.text}")
+                
+                # text/event-stream carries no charset, and iter_lines would otherwise yield bytes
+                response.encoding = response.encoding or 'utf-8'
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    delta = json.loads(payload)['choices'][0].get('delta', {})
+                    if delta.get('content'):
+                        started = True
+                        yield delta['content']
+            self._report(outcome, self._model_key(True))
+            return
+        except requests.exceptions.Timeout:
+            error_msg = "Perplexity API timeout"
+        except Exception as e:
+            error_msg = str(e) if isinstance(e, requests.HTTPError) else f"Error with Perplexity API: {str(e)}"
+        
+        print(f"❌ {error_msg}")
+        if started:
+            # Part of the answer is already on screen, so it cannot be restarted on another model
+            self._report(outcome, self._model_key(True), failed=True)
+            yield f"\n\n{error_msg}."
+        else:
+            print("Switching to local model.")
+            yield from self.stream_local_response(query, context, priority, outcome)
+    
+    def _prepare(self, query: str, use_perplexity: bool, retrieval_queries: Optional[List[str]],
+                 trace: Trace) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Embed the query, check the answer cache and retrieve context with as few model passes as possible
+        
+        Returns (query vector, cached answer or None, search results). retrieval_queries lets a
+        caller retrieve with different texts than the prompt (e.g. both concepts of a comparison).
+        Embedding, cache lookup, search and reranking are timed as stages of the trace.
+        """
+        top_k = self.config.RETRIEVAL_TOP_K
+        # With a reranker, more candidates are retrieved and it keeps the best few
+        candidates = self.reranker.top_n if self.reranker is not None else top_k
+        if retrieval_queries is None and self.query_batcher is not None:
+            # Concurrent requests share a single embedding pass and FAISS search
+            if self.answer_cache is None:
+                with trace.stage("retrieve"):
+                    query_vector, search_results = self.query_batcher.search(query, k=candidates,
+                                                                             vector_store=self.vector_store)
+                return query_vector, None, self._rerank(query, search_results, trace)
+            
+            # A cached answer makes the search unnecessary, so it is checked before the search is queued
+            with trace.stage("embed"):
+                query_vector = self.query_batcher.embed(query, vector_store=self.vector_store)
+            with trace.stage("cache_lookup"):
+                cached = self._cache_lookup(query, query_vector, use_perplexity)
+            if cached is not None:
+                return query_vector, cached, []
+            with trace.stage("search"):
+                _, search_results = self.query_batcher.search(query, k=candidates, vector_store=self.vector_store,
+                                                              query_vector=query_vector)
+            return query_vector, None, self._rerank(query, search_results, trace)
+        
+        extra_queries = retrieval_queries or []
+        if self.answer_cache is None and extra_queries:
+            # The prompt itself is only embedded when it is needed as a cache key
+            with trace.stage("retrieve"):
+                search_results = self._merge_results(self.vector_store.search_batch(extra_queries, k=top_k), k=top_k)
+            return None, None, search_results
+        
+        with trace.stage("embed"):
+            vectors = self.vector_store.embed_queries([query] + extra_queries)
+        query_vector = vectors[0]
+        with trace.stage("cache_lookup"):
+            cached = self._cache_lookup(query, query_vector, use_perplexity)
+        if cached is not None:
+            return query_vector, cached, []
+        
+        with trace.stage("search"):
+            if extra_queries:
+                search_results = self._merge_results(
+                    self.vector_store.search_by_vectors(vectors[1:], k=top_k, queries=extra_queries), k=top_k)
+            else:
+                search_results = self.vector_store.search_by_vector(query_vector, k=candidates, query=query)
+        if not extra_queries:
+            search_results = self._rerank(query, search_results, trace)
+        return query_vector, None, search_results
+    
+    def _rerank(self, query: str, search_results: List[Dict[str, Any]], trace: Trace) -> List[Dict[str, Any]]:
+        if self.reranker is None:
+            return search_results
+        with trace.stage("rerank"):
+            return self.reranker.rerank(query, search_results, self.config.RERANK_TOP_K,
+                                        self.config.RETRIEVAL_TOP_K, started=trace.started)
+    
+    @staticmethod
+    def _merge_results(result_lists: List[List[Dict[str, Any]]], k: int) -> List[Dict[str, Any]]:
+        """Interleave several ranked result lists, dropping repeated chunks"""
+        merged = []
+        seen_chunks = set()
+        for rank in range(max((len(results) for results in result_lists), default=0)):
+            for results in result_lists:
+                if rank < len(results) and results[rank]['document']['chunk'] not in seen_chunks:
+                    seen_chunks.add(results[rank]['document']['chunk'])
+                    merged.append(results[rank])
+        return merged[:k]
+    
+    def _context_budget(self, use_perplexity: bool) -> int:
+        """Prompt-context token budget of the model that will answer"""
+        model = self.config.PERPLEXITY_MODEL if use_perplexity and self._perplexity_configured() else self.config.LOCAL_MODEL
+        return self.context_builder.budget_for(model)
+    
+    def _build_context(self, query: str, search_results: List[Dict[str, Any]],
+                       use_perplexity: bool) -> Tuple[str, str, Dict[str, int]]:
+        """Combine search results into a context and classify the query for model selection
+        
+        Returns (context, query type, token counts before/after compression).
+        """
+        # Merge overlapping chunks and drop redundant sentences to fit the model's budget
+        context, context_tokens = self.context_builder.build(query, search_results, self._context_budget(use_perplexity))
+        metrics.CONTEXT_TOKENS.inc(context_tokens['tokens_after'], kind='sent')
+        metrics.CONTEXT_TOKENS.inc(context_tokens['tokens_saved'], kind='saved')
+        
+        # Determine query type for model selection
+        query_type = "search"  # default
+        if any(word in query.lower() for word in ['compare', 'analyze', 'explain', 'why', 'how', 'difference']):
+            query_type = "reasoning"
+        elif any(word in query.lower() for word in ['comprehensive', 'detailed', 'report', 'research', 'summary']):
+            query_type = "research"
+        
+        return context, query_type, context_tokens
+    
+    @staticmethod
+    def _format_sources(search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "filename": result['document']['filename'],
+                "page": result['document'].get('page'),
+                "section": result['document'].get('section'),
+                "score": float(result['score']),
+                "content": result['document']['chunk'][:150] + "..."
+            }
+            for result in search_results
+        ] if search_results else []
+    
+    def _model_key(self, use_perplexity: bool) -> str:
+        """Identifies the backend and model an answer came from, for answer caching"""
+        if use_perplexity and self._perplexity_configured():
+            return "perplexity"
+        return f"ollama:{self.config.LOCAL_MODEL}"
+    
+    def _cache_lookup(self, query: str, query_vector: np.ndarray, use_perplexity: bool) -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.lookup(query, query_vector, self.vector_store.version, self._model_key(use_perplexity))
+    
+    def _cache_store(self, query: str, query_vector: Optional[np.ndarray], index_version: int,
+                     outcome: Dict[str, Any], response_data: Dict[str, Any]) -> None:
+        """Cache an answer under the model that actually produced it, unless generation failed"""
+        if (self.answer_cache is None or outcome.get('failed', True)
+                or self._is_error_response(response_data["response"])):
+            return
+        self.answer_cache.store(query, query_vector, index_version, outcome['model'], response_data)
+    
+    @staticmethod
+    def _is_error_response(response: str) -> bool:
+        # Fallback messages from the model calls must never be served from cache
+        return response.startswith(("Error with local model", "Perplexity API", "Error with Perplexity API"))
+    
+    def generate_response(self, query: str, use_perplexity: bool = False,
+                          retrieval_queries: Optional[List[str]] = None, trace: Optional[Trace] = None) -> Dict[str, Any]:
+        """Generate response using RAG with intelligent model selection"""
+        trace = trace or Trace("chat")
+        index_version = self.vector_store.version
+        query_vector, cached, search_results = self._prepare(query, use_perplexity, retrieval_queries, trace)
+        if cached is not None:
+            trace.finish()
+            return dict(cached, cached=True)
+        
+        with trace.stage("context"):
+            context, query_type, context_tokens = self._build_context(query, search_results, use_perplexity)
+        
+        # Generate response
+        outcome = {}
+        with trace.stage("llm"):
+            if use_perplexity and self._perplexity_configured():
+                response = self.get_perplexity_response(query, context, query_type, outcome=outcome)
+            else:
+                response = self.get_local_response(query, context, outcome=outcome)
+        
+        response_data = {
+            "response": response,
+            "sources": self._format_sources(search_results),
+            "context_length": len(context),
+            "context_tokens": context_tokens
+        }
+        self._cache_store(query, query_vector, index_version, outcome, response_data)
+        trace.finish()
+        return response_data
+    
+    def stream_response(self, query: str, use_perplexity: bool = False,
+                        retrieval_queries: Optional[List[str]] = None, trace: Optional[Trace] = None) -> Iterator[Dict[str, Any]]:
+        """Stream a RAG answer as events: sources first, then tokens, then done"""
+        trace = trace or Trace("chat_stream")
+        index_version = self.vector_store.version
+        query_vector, cached, search_results = self._prepare(query, use_perplexity, retrieval_queries, trace)
+        if cached is not None:
+            trace.finish()
+            yield {"type": "sources", "sources": cached["sources"], "context_length": cached["context_length"], "cached": True}
+            yield {"type": "token", "content": cached["response"]}
+            yield {"type": "done"}
+            return
+        
+        with trace.stage("context"):
+            context, query_type, context_tokens = self._build_context(query, search_results, use_perplexity)
+        sources = self._format_sources(search_results)
+        
+        yield {
+            "type": "sources",
+            "sources": sources,
+            "context_length": len(context),
+            "context_tokens": context_tokens
+        }
+        
+        tokens = []
+        outcome = {}
+        llm_started = time.perf_counter()
+        for event in self._stream_tokens(query, context, query_type, use_perplexity, outcome):
+            if event["type"] == "token":
+                if not tokens:
+                    trace.record("first_token", time.perf_counter() - llm_started)
+                tokens.append(event["content"])
+            elif event["type"] == "done":
+                trace.record("llm", time.perf_counter() - llm_started)
+                trace.finish()
+            yield event
+        
+        self._cache_store(query, query_vector, index_version, outcome, {
+            "response": "".join(tokens),
+            "sources": sources,
+            "context_length": len(context),
+            "context_tokens": context_tokens
+        })
+    
+    def _stream_tokens(self, query: str, context: str, query_type: str, use_perplexity: bool,
+                       outcome: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        if use_perplexity and self._perplexity_configured():
+            tokens = self.stream_perplexity_response(query, context, query_type, outcome=outcome)
+        else:
+            tokens = self.stream_local_response(query, context, outcome=outcome)
+        
+        for token in tokens:
+            yield {"type": "token", "content": token}
+        yield {"type": "done"}
+    
+    def _fit_document(self, content: str, use_perplexity: bool) -> str:
+        """Deduplicate a document's sentences and cut it to the answering model's context budget"""
+        return self.context_builder.fit_text(content, self._context_budget(use_perplexity))
+    
+    def summarize_document(self, content: str, use_perplexity: bool = False) -> str:
+        """Generate document summary using research model"""
+        query = f"Please provide a comprehensive summary of the following document. Focus on key points, main arguments, and important findings:\n\n{self._fit_document(content, use_perplexity)}"
+        
+        trace = Trace("summarize")
+        with trace.stage("llm"):
+            if use_perplexity:
+                summary = self.get_perplexity_response(query, "", "research")
+            else:
+                summary = self.get_local_response(query, "")
+        trace.finish()
+        return summary
+    
+    def compare_concepts(self, concept1: str, concept2: str, use_perplexity: bool = False) -> str:
+        """Compare two concepts using reasoning model"""
+        query = f"Compare and contrast {concept1} and {concept2}. Discuss their similarities, differences, advantages, disadvantages, and use cases."
+        
+        # Retrieve for each concept separately (in one batched search) so both are represented
+        response_data = self.generate_response(query, use_perplexity, retrieval_queries=[concept1, concept2],
+                                               trace=Trace("compare"))
+        return response_data["response"]
+    
+    def stream_comparison(self, concept1: str, concept2: str, use_perplexity: bool = False) -> Iterator[Dict[str, Any]]:
+        """Streaming variant of compare_concepts"""
+        query = f"Compare and contrast {concept1} and {concept2}. Discuss their similarities, differences, advantages, disadvantages, and use cases."
+        
+        yield from self.stream_response(query, use_perplexity, retrieval_queries=[concept1, concept2],
+                                        trace=Trace("compare_stream"))
\ No newline at end of file
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+class CrossEncoderScorer:
+    """Scores (query, passage) pairs with a small sentence-transformers cross-encoder on the CPU
+    
+    The model is loaded on first use, or ahead of time by the warm-up thread calling load().
+    """
+    
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", max_length: int = 256,
+                 batch_size: int = 16):
+        self.name = model_name
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+    
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder  # Pulls in torch
+                    self._model = CrossEncoder(self.name, max_length=self.max_length, device='cpu')
+        return self._model
+    
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        """Relevance in [0, 1] for each passage (single-label cross-encoders end in a sigmoid)"""
+        scores = self.load().predict([(query, passage) for passage in passages], batch_size=self.batch_size,
+                                    show_progress_bar=False)
+        return [float(score) for score in scores]
+
+class Reranker:
+    """Rescores the top retrieved chunks for a query and keeps the best few, within a latency budget
+    
+    Only the top_n candidates are scored, in batches, and pair scores are cached by (query, chunk), so a
+    repeated question costs nothing. The budget counts from the start of the request: if retrieval
+    already used it up, or scoring the uncached pairs is predicted to overrun it (or does), the
+    retrieval order is kept and the caller gets its usual number of chunks instead.
+    """
+    
+    def __init__(self, scorer, top_n: int = 20, budget_ms: float = 250, batch_size: int = 8,
+                 cache_max_entries: int = 20000):
+        self.scorer = scorer
+        self.top_n = top_n
+        self.budget = budget_ms / 1000
+        self.batch_size = batch_size
+        self.cache_max_entries = cache_max_entries
+        self.pair_seconds = None  # Moving average of the scoring time per uncached pair
+        self.counts = {'reranked': 0, 'skipped': 0, 'abandoned': 0}
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()  # (query, chunk) hash -> score, least recently used first
+        self._lock = threading.Lock()
+    
+    def rerank(self, query: str, results: List[Dict[str, Any]], k: int, fallback_k: int,
+               started: Optional[float] = None) -> List[Dict[str, Any]]:
+        """The k best results by rescoring, or the first fallback_k in retrieval order if over budget"""
+        deadline = (started if started is not None else time.perf_counter()) + self.budget
+        candidates = results[:self.top_n]
+        if len(candidates) <= 1:
+            return candidates[:k]
+        
+        keys = [self._key(query, result['document']['chunk']) for result in candidates]
+        scores = self._cache_get(keys)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        predicted = len(missing) * self.pair_seconds if self.pair_seconds is not None else 0.0
+        if missing and time.perf_counter() + predicted > deadline:
+            return self._fall_back(results, fallback_k, 'skipped')
+        
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            batch_started = time.perf_counter()
+            batch_scores = self.scorer.score(query, [candidates[i]['document']['chunk'] for i in batch])
+            self._observe((time.perf_counter() - batch_started) / len(batch))
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+            self._cache_put([keys[i] for i in batch], batch_scores)
+            if time.perf_counter() > deadline and start + self.batch_size < len(missing):
+                # Scored batches stay cached, so the next request for this query gets further
+                return self._fall_back(results, fallback_k, 'abandoned')
+        
+        reranked = [dict(result, score=score, retrieval_score=result['score'])
+                    for result, score in zip(candidates, scores)]
+        reranked.sort(key=lambda result: result['score'], reverse=True)
+        with self._lock:
+            self.counts['reranked'] += 1
+        return reranked[:k]
+    
+    def _fall_back(self, results: List[Dict[str, Any]], fallback_k: int, outcome: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            self.counts[outcome] += 1
+        return results[:fallback_k]
+    
+    def _observe(self, seconds_per_pair: float) -> None:
+        with self._lock:
+            if self.pair_seconds is None:
+                self.pair_seconds = seconds_per_pair
+            else:
+                self.pair_seconds = 0.8 * self.pair_seconds + 0.2 * seconds_per_pair
+    
+    def _key(self, query: str, chunk: str) -> str:
+        return hashlib.sha256(f"{self.scorer.name}\0{query.strip().lower()}\0{chunk}".encode('utf-8')).hexdigest()
+    
+    def _cache_get(self, keys: List[str]) -> List[Optional[float]]:
+        with self._lock:
+            scores = []
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                scores.append(score)
+            found = sum(score is not None for score in scores)
+            self.hits += found
+            self.misses += len(keys) - found
+            return scores
+    
+    def _cache_put(self, keys: List[str], scores: List[float]) -> None:
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self.counts,
+            model=self.scorer.name,
+            hits=self.hits,
+            misses=self.misses,
+            entries=len(self._cache),
+            pair_ms=round(self.pair_seconds * 1000, 3) if self.pair_seconds is not None else None
+        )
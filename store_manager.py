@@ -0,0 +1,203 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterator, Optional
+from utils.vector_store import VectorStore
+
+COLLECTION_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+class StoreManager:
+    """Per-collection vector stores under one directory, opened on first use and kept in a bounded LRU
+    
+    Each collection lives in <root>/<name>. Once more than max_open stores are open, or their indexes
+    take more than max_memory_bytes, the least recently used ones are saved and closed. A store is
+    pinned while a caller holds it from open(), so writers never lose changes to an eviction.
+    """
+    
+    def __init__(self, root: str, store_factory: Callable[[], VectorStore], max_open: int = 8,
+                 max_memory_bytes: Optional[int] = None,
+                 on_close: Optional[Callable[[str, VectorStore], None]] = None):
+        self.root = root
+        self.store_factory = store_factory
+        self.max_open = max_open
+        self.max_memory_bytes = max_memory_bytes
+        self.on_close = on_close
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self._open = OrderedDict()  # collection -> entry, least recently used first
+        self._collection_locks = {}  # collection -> lock held while its files are read or written
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def valid_name(collection: str) -> bool:
+        return isinstance(collection, str) and COLLECTION_NAME.match(collection) is not None
+    
+    def path(self, collection: str) -> str:
+        if not self.valid_name(collection):
+            raise ValueError(f"Invalid collection name: {collection!r}")
+        return os.path.join(self.root, collection)
+    
+    def exists(self, collection: str) -> bool:
+        """Whether the collection is open or has a saved store on disk"""
+        with self._lock:
+            entry = self._open.get(collection)
+        if entry is not None and entry['store'] is not None and entry['store'].index is not None:
+            return True
+        return VectorStore.exists(self.path(collection))
+    
+    def collections(self) -> List[str]:
+        """Names of every collection saved on disk or currently open"""
+        names = set()
+        if os.path.isdir(self.root):
+            names.update(name for name in os.listdir(self.root)
+                         if self.valid_name(name) and VectorStore.exists(os.path.join(self.root, name)))
+        with self._lock:
+            names.update(self._open)
+        return sorted(names)
+    
+    def recent(self, limit: int) -> List[str]:
+        """Saved collections, most recently written first"""
+        names = [name for name in self.collections() if VectorStore.exists(self.path(name))]
+        names.sort(key=lambda name: os.path.getmtime(os.path.join(self.path(name), "index.faiss")), reverse=True)
+        return names[:limit]
+    
+    @contextmanager
+    def open(self, collection: str) -> Iterator[VectorStore]:
+        """Yield the collection's store, loading it from disk on first use; it is not evicted until the block exits"""
+        entry = self._acquire(collection)
+        try:
+            yield entry['store']
+        finally:
+            with self._lock:
+                entry['pins'] -= 1
+    
+    def save(self, collection: str) -> None:
+        """Write an open collection to disk (call while holding it from open())"""
+        with self._lock:
+            entry = self._open.get(collection)
+        if entry is None or entry['store'] is None:
+            return
+        with self._collection_lock(collection):
+            entry['store'].save(self.path(collection))
+            entry['saved_version'] = entry['store'].version
+    
+    def close_all(self) -> None:
+        """Save any unsaved changes and close every store that is not in use"""
+        victims = []
+        with self._lock:
+            for collection, entry in list(self._open.items()):
+                lock = self._collection_locks.setdefault(collection, threading.Lock())
+                if entry['store'] is None or entry['pins'] or not lock.acquire(blocking=False):
+                    continue
+                del self._open[collection]
+                victims.append((collection, entry, lock))
+        for collection, entry, lock in victims:
+            self._close(collection, entry, lock)
+    
+    def migrate_legacy(self, collection: str) -> bool:
+        """Move a store saved directly in the root (before collections existed) into the given collection"""
+        if not VectorStore.exists(self.root) or VectorStore.exists(self.path(collection)):
+            return False
+        target = self.path(collection)
+        os.makedirs(target, exist_ok=True)
+        for name in os.listdir(self.root):
+            source = os.path.join(self.root, name)
+            if os.path.isfile(source):
+                os.replace(source, os.path.join(target, name))
+        print(f"Moved the existing vector store into collection {collection}")
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stores = [entry['store'] for entry in self._open.values() if entry['store'] is not None]
+        return {
+            'open': len(stores),
+            'max_open': self.max_open,
+            'memory_bytes': sum(store.memory_bytes() for store in stores),
+            'vectors': sum(store.index.ntotal for store in stores if store.index is not None),
+            'hits': self.hits,
+            'loads': self.loads,
+            'evictions': self.evictions
+        }
+    
+    def _collection_lock(self, collection: str) -> threading.Lock:
+        with self._lock:
+            return self._collection_locks.setdefault(collection, threading.Lock())
+    
+    def _acquire(self, collection: str) -> Dict[str, Any]:
+        path = self.path(collection)
+        with self._lock:
+            entry = self._open.get(collection)
+            loading = entry is None
+            if loading:
+                entry = {'store': None, 'pins': 0, 'saved_version': None, 'ready': threading.Event()}
+                self._open[collection] = entry
+            else:
+                self.hits += 1
+            entry['pins'] += 1
+            self._open.move_to_end(collection)
+        
+        if not loading:
+            entry['ready'].wait()
+            if entry['store'] is None:
+                with self._lock:
+                    entry['pins'] -= 1
+                raise RuntimeError(f"Failed to open collection {collection}")
+            return entry
+        
+        # Only this collection waits on its load; other collections open and query in the meantime
+        try:
+            with self._collection_lock(collection):
+                store = self.store_factory()
+                if VectorStore.exists(path) and not store.load(path):
+                    raise RuntimeError(f"Failed to load collection {collection}")
+            entry['saved_version'] = store.version
+            entry['store'] = store
+            self.loads += 1
+        except Exception:
+            with self._lock:
+                if self._open.get(collection) is entry:
+                    del self._open[collection]
+            raise
+        finally:
+            entry['ready'].set()
+        self._evict()
+        return entry
+    
+    def _evict(self) -> None:
+        """Close least recently used, unpinned stores until the open count and memory are within bounds"""
+        victims = []
+        with self._lock:
+            loaded = [(collection, entry) for collection, entry in self._open.items() if entry['store'] is not None]
+            open_count = len(self._open)
+            memory = sum(entry['store'].memory_bytes() for _, entry in loaded)
+            # The most recently used store always stays open, however large it is
+            for collection, entry in loaded[:-1]:
+                over_memory = self.max_memory_bytes is not None and memory > self.max_memory_bytes
+                if open_count <= self.max_open and not over_memory:
+                    break
+                # Held until the store is saved, so reopening never reads files that are still being written
+                lock = self._collection_locks.setdefault(collection, threading.Lock())
+                if entry['pins'] or not lock.acquire(blocking=False):
+                    continue
+                del self._open[collection]
+                victims.append((collection, entry, lock))
+                open_count -= 1
+                memory -= entry['store'].memory_bytes()
+                self.evictions += 1
+        for collection, entry, lock in victims:
+            self._close(collection, entry, lock)
+    
+    def _close(self, collection: str, entry: Dict[str, Any], lock: threading.Lock) -> None:
+        store = entry['store']
+        try:
+            if store.version != entry['saved_version'] and store.index is not None:
+                store.save(self.path(collection))
+        finally:
+            lock.release()
+        print(f"Closed collection {collection}")
+        if self.on_close is not None:
+            self.on_close(collection, store)
@@ -0,0 +1,182 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+from utils.context_builder import estimate_tokens
+from utils.llm_scheduler import PRIORITY_BACKGROUND
+
+MAP_PROMPT = """Summarize the following excerpt from {source}. Keep the key definitions, arguments, formulas and findings, and be concise.
+
+EXCERPT:
+{text}"""
+
+REDUCE_PROMPT = """The following are partial summaries of {source}. Combine them into a single coherent summary that removes repetition but keeps the key points, main arguments, and important findings.
+
+PARTIAL SUMMARIES:
+{text}"""
+
+PROMPT_OVERHEAD_TOKENS = 100  # Instruction text around the summarized material
+
+class MapReduceSummarizer:
+    """Summarizes whole documents and corpora with parallel map calls and a hierarchical reduce
+    
+    Adjacent chunks are packed into groups that fit the model's context budget and each group is
+    summarized (map), then summaries are packed the same way and summarized again (reduce) until one
+    remains. Group and document summaries are cached by content hash, so they are reused until the
+    underlying text changes.
+    """
+    
+    def __init__(self, rag_chain, max_workers: int = 4, cache_max_entries: int = 5000):
+        self.rag_chain = rag_chain
+        self.cache_max_entries = cache_max_entries
+        self.hits = 0
+        self.misses = 0
+        self.llm_calls = 0
+        self._cache = OrderedDict()  # content hash -> summary, least recently used first
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='summarizer')
+    
+    def summarize_corpus(self, documents: List[Dict[str, Any]], use_perplexity: bool = False,
+                         on_document: Optional[Callable[[Dict[str, Any]], None]] = None) -> str:
+        """Summary of several documents given as {'id', 'filename', 'chunks'} dicts"""
+        source, parts = self.prepare_corpus(documents, use_perplexity, on_document)
+        return self._reduce(parts, source, use_perplexity)
+    
+    def stream_corpus(self, documents: List[Dict[str, Any]], use_perplexity: bool = False) -> Iterator[Dict[str, Any]]:
+        """Streaming variant: the map and intermediate reduce steps run first, then the final reduce is streamed"""
+        source, parts = self.prepare_corpus(documents, use_perplexity)
+        budget = self._budget(use_perplexity)
+        while len(parts) > 1 and self._tokens(parts) > budget:
+            parts = self._reduce_level(parts, source, use_perplexity)
+        
+        if len(parts) == 1:
+            yield {"type": "token", "content": parts[0]}
+            yield {"type": "done"}
+            return
+        prompt = REDUCE_PROMPT.format(source=source, text="\n\n".join(parts))
+        yield from self.rag_chain._stream_tokens(prompt, "", "research", use_perplexity)
+    
+    def prepare_corpus(self, documents: List[Dict[str, Any]], use_perplexity: bool = False,
+                       on_document: Optional[Callable[[Dict[str, Any]], None]] = None) -> Tuple[str, List[str]]:
+        """Summarize each document, calling on_document after each; returns (description of the corpus, per-document summaries)"""
+        documents = [document for document in documents if document['chunks']]
+        # Documents go one at a time; the chunk groups within each are what fan out over the workers
+        summaries = []
+        for document in documents:
+            summaries.append(self.summarize_document(document['filename'], document['chunks'], use_perplexity))
+            if on_document is not None:
+                on_document(document)
+        if len(documents) == 1:
+            return documents[0]['filename'], summaries
+        return f"{len(documents)} documents ({', '.join(document['filename'] for document in documents)})", [
+            f"{document['filename']}: {summary}" for document, summary in zip(documents, summaries)
+        ]
+    
+    def summarize_document(self, filename: str, chunks: List[str], use_perplexity: bool = False) -> str:
+        """Summary of one document's chunks, cached until any chunk changes"""
+        document_key = self._key(use_perplexity, 'document', filename, *chunks)
+        cached = self._cache_get(document_key)
+        if cached is not None:
+            return cached
+        
+        # Chunks are much smaller than the budget, so one call covers as many adjacent chunks as fit
+        partials = self._run_parallel([
+            (self._key(use_perplexity, 'chunk', *group), MAP_PROMPT.format(source=filename, text="\n\n".join(group)))
+            for group in self._pack(chunks, self._budget(use_perplexity))
+        ], use_perplexity)
+        summary = self._reduce(partials, filename, use_perplexity)
+        if not self.rag_chain._is_error_response(summary):
+            self._cache_put(document_key, summary)
+        return summary
+    
+    def _reduce(self, parts: List[str], source: str, use_perplexity: bool) -> str:
+        while len(parts) > 1:
+            parts = self._reduce_level(parts, source, use_perplexity)
+        return parts[0] if parts else ""
+    
+    def _pack(self, parts: List[str], budget: int) -> List[List[str]]:
+        """Split parts, in order, into groups that each fit budget (a part longer than budget is cut to fit)"""
+        groups = []
+        current = []
+        for part in parts:
+            part = part if estimate_tokens(part) <= budget else self.rag_chain.context_builder.fit_text(part, budget)
+            if current and self._tokens(current + [part]) > budget:
+                groups.append(current)
+                current = []
+            current.append(part)
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _reduce_level(self, parts: List[str], source: str, use_perplexity: bool) -> List[str]:
+        """Summarize groups of parts that each fit the context budget"""
+        budget = self._budget(use_perplexity)
+        groups = self._pack(parts, budget)
+        if len(groups) == len(parts) and len(parts) > 1:
+            # Every part fills the budget alone; pair them up so each level still halves the count
+            groups = [parts[i:i + 2] for i in range(0, len(parts), 2)]
+            groups = [[self.rag_chain.context_builder.fit_text(part, budget // 2) for part in group] for group in groups]
+        
+        return self._run_parallel([
+            (self._key(use_perplexity, 'reduce', *group),
+             REDUCE_PROMPT.format(source=source, text="\n\n".join(group)))
+            for group in groups
+        ], use_perplexity)
+    
+    def _run_parallel(self, prompts: List[Tuple[str, str]], use_perplexity: bool) -> List[str]:
+        """Answer (cache key, prompt) pairs, calling the LLM only for uncached keys"""
+        results = [self._cache_get(key) for key, _ in prompts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        for i, summary in zip(missing, self._executor.map(
+                lambda i: self._complete(prompts[i][1], use_perplexity), missing)):
+            results[i] = summary
+            if not self.rag_chain._is_error_response(summary):
+                self._cache_put(prompts[i][0], summary)
+        return results
+    
+    def _complete(self, prompt: str, use_perplexity: bool) -> str:
+        with self._lock:
+            self.llm_calls += 1
+        if use_perplexity and self.rag_chain._perplexity_configured():
+            return self.rag_chain.get_perplexity_response(prompt, "", "research", PRIORITY_BACKGROUND)
+        return self.rag_chain.get_local_response(prompt, "", PRIORITY_BACKGROUND)
+    
+    def _budget(self, use_perplexity: bool) -> int:
+        return max(256, self.rag_chain._context_budget(use_perplexity) - PROMPT_OVERHEAD_TOKENS)
+    
+    @staticmethod
+    def _tokens(parts: List[str]) -> int:
+        return sum(estimate_tokens(part) + 1 for part in parts)
+    
+    def _key(self, use_perplexity: bool, kind: str, *texts: str) -> str:
+        digest = hashlib.sha256(f"{self.rag_chain._model_key(use_perplexity)}\0{kind}".encode('utf-8'))
+        for text in texts:
+            digest.update(b"\0")
+            digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._cache.get(key)
+            if summary is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return summary
+    
+    def _cache_put(self, key: str, summary: str) -> None:
+        with self._lock:
+            self._cache[key] = summary
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._cache),
+            'llm_calls': self.llm_calls
+        }
@@ -0,0 +1,56 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+import requests
+
+from utils.benchmark import FakeLLMServer
+from utils.http_client import AsyncPooledHTTPClient, PooledHTTPClient
+
+# The stand-in answers a non-streamed request only after every token, so this is well past the read timeout
+SLOW_TOKENS = 10
+SLOW_TOKEN_DELAY_MS = 50
+READ_TIMEOUT = 0.1
+
+@pytest.fixture
+def slow_server():
+    server = FakeLLMServer(tokens=SLOW_TOKENS, token_delay_ms=SLOW_TOKEN_DELAY_MS)
+    server.start()
+    yield server
+    server.stop()
+
+def closed_port_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+def test_read_timeout_is_not_resent(slow_server):
+    client = PooledHTTPClient(slow_server.url, max_retries=3, backoff_base=0.01, read_timeout=READ_TIMEOUT)
+    with pytest.raises(requests.Timeout):
+        client.post('/chat/completions', {'stream': False})
+    assert slow_server.requests == 1
+    assert client.retries == 0
+    assert client.breaker.failures == 1
+
+def test_async_read_timeout_is_not_resent(slow_server):
+    client = AsyncPooledHTTPClient(slow_server.url, max_retries=3, backoff_base=0.01, read_timeout=READ_TIMEOUT)
+    
+    async def post():
+        try:
+            await client.post('/chat/completions', {'stream': False})
+        finally:
+            await client.aclose()
+    
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(post())
+    assert slow_server.requests == 1
+    assert client.retries == 0
+    assert client.breaker.failures == 1
+
+def test_connection_errors_are_retried():
+    client = PooledHTTPClient(closed_port_url(), max_retries=2, backoff_base=0.01)
+    with pytest.raises(requests.ConnectionError):
+        client.post('/chat/completions', {'stream': False})
+    assert client.requests == 3
+    assert client.breaker.failures == 1
@@ -0,0 +1,67 @@
+import threading
+from typing import List
+
+from utils.benchmark import HashingEmbeddings
+from utils.vector_store import VectorStore
+
+STABLE_DOCUMENTS = 20
+READERS = 4
+WRITES = 60
+
+def make_store(retrieval_mode: str) -> VectorStore:
+    store = VectorStore(embeddings=HashingEmbeddings(), retrieval_mode=retrieval_mode)
+    store.add_documents([{'id': f'stable{i}', 'filename': f'stable{i}.txt', 'content': f'stable{i} lecture notes'}
+                         for i in range(STABLE_DOCUMENTS)])
+    return store
+
+def run_concurrently(store: VectorStore, tmp_path) -> List[Exception]:
+    """Searches from several threads while one thread adds, removes and saves documents; returns reader errors"""
+    errors = []
+    done = threading.Event()
+    
+    def read(reader: int) -> None:
+        i = reader
+        while not done.is_set():
+            i = (i + 1) % STABLE_DOCUMENTS
+            try:
+                results = store.search(f'stable{i}', k=3)
+                # Stable documents are never touched by the writer, so they are always found first
+                assert results[0]['document']['document_id'] == f'stable{i}'
+                for batch in [results] + store.search_batch([f'churn{i}', f'stable{i}'], k=3):
+                    # Every ID the index returns has its metadata in the same snapshot
+                    assert len(batch) == 3
+                    for result in batch:
+                        # Metadata and vectors come from the same snapshot, so every chunk matches its document
+                        document = result['document']
+                        assert document['chunk'].split()[0] == document['document_id']
+            except Exception as e:
+                errors.append(e)
+                return
+    
+    readers = [threading.Thread(target=read, args=(reader,)) for reader in range(READERS)]
+    for reader in readers:
+        reader.start()
+    try:
+        for i in range(WRITES):
+            document_id = f'churn{i % STABLE_DOCUMENTS}'
+            store.add_documents([{'id': document_id, 'filename': f'{document_id}.txt',
+                                  'content': f'{document_id} draft notes {i}'}])
+            if i % 10 == 0:
+                store.save(str(tmp_path))
+            store.remove_document(document_id)
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+    return errors
+
+def test_dense_search_during_writes(tmp_path):
+    store = make_store('dense')
+    assert run_concurrently(store, tmp_path) == []
+    assert len(store.documents) == STABLE_DOCUMENTS
+
+def test_hybrid_search_during_writes(tmp_path):
+    store = make_store('hybrid')
+    assert run_concurrently(store, tmp_path) == []
+    assert len(store.documents) == STABLE_DOCUMENTS
+    assert store.keyword_index.search('churn0', 1) == []
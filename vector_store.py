@@ -1,121 +1,612 @@
-import faiss
-import numpy as np
-import pickle
-import os
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from typing import List, Dict, Any
-from utils.document_processor import DocumentProcessor
-
-class VectorStore:
-    def __init__(self, embedding_model: str = "sentence-transformers/all-mpnet-base-v2"):
-        self.embedding_model = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        self.index = None
-        self.documents = []
-        self.document_processor = DocumentProcessor()
-    
-    def create_index(self, documents: List[Dict[str, Any]]) -> None:
-        """Create FAISS index from documents"""
-        all_chunks = []
-        all_metadata = []
-        
-        for doc in documents:
-            chunks = self.document_processor.chunk_text(doc['content'])
-            for i, chunk in enumerate(chunks):
-                all_chunks.append(chunk)
-                all_metadata.append({
-                    'document_id': doc['id'],
-                    'filename': doc['filename'],
-                    'chunk': chunk,
-                    'chunk_id': i
-                })
-        
-        # Generate embeddings
-        print(f"Generating embeddings for {len(all_chunks)} chunks...")
-        embeddings = self.embedding_model.embed_documents(all_chunks)
-        embeddings = np.array(embeddings).astype('float32')
-        
-        # Create FAISS index with cosine similarity
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-        
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings)
-        self.index.add(embeddings)
-        
-        self.documents = all_metadata
-        print(f"Created vector store with {len(self.documents)} chunks")
-    
-    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents"""
-        if self.index is None or len(self.documents) == 0:
-            return []
-        
-        # Encode query
-        query_embedding = self.embedding_model.embed_query(query)
-        query_embedding = np.array([query_embedding]).astype('float32')
-        
-        # Normalize for cosine similarity
-        faiss.normalize_L2(query_embedding)
-        
-        # Search (increase k to get more results, then filter)
-        k_search = min(k * 2, len(self.documents))
-        scores, indices = self.index.search(query_embedding, k_search)
-        
-        results = []
-        seen_chunks = set()
-        
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.documents) and idx >= 0:
-                chunk_content = self.documents[idx]['chunk']
-                # Avoid duplicate chunks
-                if chunk_content not in seen_chunks:
-                    seen_chunks.add(chunk_content)
-                    # Convert cosine similarity to more readable score (0-1)
-                    normalized_score = max(0.0, (score + 1) / 2)  # Convert from [-1,1] to [0,1]
-                    results.append({
-                        'document': self.documents[idx],
-                        'score': normalized_score
-                    })
-                
-                if len(results) >= k:
-                    break
-        
-        # Sort by score descending
-        results.sort(key=lambda x: x['score'], reverse=True)
-        return results
-    
-    def save(self, path: str) -> None:
-        """Save vector store to disk"""
-        if not os.path.exists(path):
-            os.makedirs(path)
-        
-        if self.index is not None:
-            faiss.write_index(self.index, os.path.join(path, "index.faiss"))
-        
-        with open(os.path.join(path, "documents.pkl"), 'wb') as f:
-            pickle.dump(self.documents, f)
-        
-        print(f"Vector store saved to {path}")
-    
-    def load(self, path: str) -> bool:
-        """Load vector store from disk"""
-        try:
-            index_path = os.path.join(path, "index.faiss")
-            documents_path = os.path.join(path, "documents.pkl")
-            
-            if os.path.exists(index_path) and os.path.exists(documents_path):
-                self.index = faiss.read_index(index_path)
-                with open(documents_path, 'rb') as f:
-                    self.documents = pickle.load(f)
-                print(f"Vector store loaded with {len(self.documents)} chunks")
-                return True
-            else:
-                print("Vector store files not found")
-                return False
-        except Exception as e:
-            print(f"Error loading vector store: {e}")
-            return False
\ No newline at end of file
+import faiss
+import json
+import numpy as np
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from utils.document_processor import DocumentProcessor
+from utils.embedding_cache import EmbeddingCache
+from utils.embeddings import cache_model_name, create_backend
+from utils import index_factory
+from utils.chunk_store import ChunkStore, migrate_pickle_store
+from utils.bm25_index import BM25Index, reciprocal_rank_fusion
+
+INDEX_META_FILE = "index_meta.json"
+
+class IndexSnapshot:
+    """The FAISS index, chunk metadata and keyword index as of one version; never changed once published"""
+    
+    def __init__(self, index=None, documents: Optional[ChunkStore] = None,
+                 keyword_index: Optional[BM25Index] = None, version: int = 0):
+        self.index = index
+        self.documents = documents if documents is not None else ChunkStore()  # FAISS chunk ID -> chunk metadata
+        self.keyword_index = keyword_index if keyword_index is not None else BM25Index()  # Same chunk IDs
+        self.version = version  # Bumped on every change to the indexed content
+        self.owns_index = True  # False while the index is still shared with the snapshot this was copied from
+    
+    def copy(self) -> 'IndexSnapshot':
+        """Draft for the next version; the FAISS index is only cloned once a writer modifies it"""
+        draft = IndexSnapshot(self.index, self.documents.copy(), self.keyword_index.copy(), self.version)
+        draft.owns_index = False
+        return draft
+
+def _snapshot_attribute(name: str) -> property:
+    """Attribute of the snapshot the calling thread sees (its own draft while it is writing)"""
+    def get(self):
+        return getattr(self._current(), name)
+    
+    def set(self, value):
+        with self.update():
+            setattr(self._draft, name, value)
+            if name == 'index':
+                self._draft.owns_index = True
+    
+    return property(get, set)
+
+class VectorStore:
+    """FAISS + BM25 chunk index; searches read an immutable snapshot while writers prepare the next one
+    
+    Writers are serialized and work on a private copy of the current snapshot, which replaces it in a
+    single assignment when they finish, so concurrent searches never wait on or observe a half-applied
+    change. update() groups several writes (e.g. a whole ingestion job) into one new snapshot.
+    """
+    
+    index = _snapshot_attribute('index')
+    documents = _snapshot_attribute('documents')
+    keyword_index = _snapshot_attribute('keyword_index')
+    version = _snapshot_attribute('version')
+    
+    def __init__(self, embedding_model: str = "sentence-transformers/all-mpnet-base-v2",
+                 cache_path: Optional[str] = None, cache_max_entries: int = 200000,
+                 index_type: str = 'flat', index_params: Optional[Dict[str, Any]] = None,
+                 retrieval_mode: str = 'dense', hybrid_candidates: int = 50, rrf_k: int = 60,
+                 embeddings=None, embedding_cache: Optional[EmbeddingCache] = None,
+                 embedding_backend: str = 'huggingface'):
+        self.embedding_model_name = embedding_model
+        # Any object with embed_documents/embed_query can stand in for a backend from utils.embeddings
+        if embeddings is None:
+            embeddings = create_backend(embedding_backend, embedding_model)
+        self.embedding_model = embeddings
+        self._snapshot = IndexSnapshot()  # Published state that searches read without locking
+        self._draft = None  # Next snapshot, only visible to the thread holding the write lock
+        self._draft_owner = None
+        self._write_lock = threading.RLock()
+        self._loaded_from = None  # (path, file signature) of the last load or save, to skip repeated loads
+        self.index_type = index_type
+        self.index_params = index_factory.resolve_params(index_params)
+        self.retrieval_mode = retrieval_mode
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+        self.document_processor = DocumentProcessor()
+        self.embedding_cache = embedding_cache or (
+            EmbeddingCache(cache_path, cache_model_name(embedding_model, embedding_backend), cache_max_entries)
+            if cache_path else None
+        )
+        self.last_embedding_stats = {'hits': 0, 'misses': 0}
+    
+    @contextmanager
+    def update(self) -> Iterator[None]:
+        """Apply the writes made inside the block as one new snapshot, published when it exits
+        
+        Searches keep using the previous snapshot until then. If the block raises, its writes are
+        discarded. Nested blocks join the outermost one.
+        """
+        with self._write_lock:
+            if self._draft is not None:
+                yield
+                return
+            self._draft = self._snapshot.copy()
+            self._draft_owner = threading.get_ident()
+            try:
+                yield
+                self._snapshot = self._draft
+            finally:
+                self._draft = None
+                self._draft_owner = None
+    
+    def _current(self) -> IndexSnapshot:
+        draft = self._draft
+        if draft is not None and self._draft_owner == threading.get_ident():
+            return draft
+        return self._snapshot
+    
+    def _writable_index(self):
+        """The draft's FAISS index, cloned first if it is still shared with the published snapshot"""
+        draft = self._draft
+        if not draft.owns_index and draft.index is not None:
+            draft.index = faiss.clone_index(draft.index)
+            index_factory.apply_search_params(draft.index, self.index_params)
+        draft.owns_index = True
+        return draft.index
+    
+    def create_index(self, documents: List[Dict[str, Any]]) -> None:
+        """Create FAISS index from documents, replacing any existing content"""
+        with self.update():
+            self._draft.index = None
+            self._draft.documents = ChunkStore()
+            self._draft.keyword_index = BM25Index()
+            self._draft.version += 1
+            self.add_documents(documents)
+        print(f"Created vector store with {len(self.documents)} chunks")
+    
+    def add_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """Embed and add new documents to the index without touching existing chunks"""
+        stats = {'hits': 0, 'misses': 0}
+        added = 0
+        with self.update():
+            for doc in documents:
+                chunks = ({'text': chunk} for chunk in self.document_processor.chunk_text(doc['content']))
+                added += self._add_chunk_stream(doc['id'], doc['filename'], chunks, stats=stats)
+            
+            self.maybe_train_index()
+            self.last_embedding_stats = stats
+        print(f"Added {added} chunks, vector store now has {len(self.documents)} chunks")
+        return added
+    
+    def add_document_stream(self, document_id: str, filename: str, chunks: Iterable[Dict[str, Any]],
+                            batch_size: int = 64) -> int:
+        """Embed and index chunks as they arrive, so embedding overlaps with extraction"""
+        stats = {'hits': 0, 'misses': 0}
+        with self.update():
+            added = self._add_chunk_stream(document_id, filename, chunks, batch_size, stats)
+            
+            self.maybe_train_index()
+            self.last_embedding_stats = stats
+        print(f"Added {added} chunks from {filename}, vector store now has {len(self.documents)} chunks")
+        return added
+    
+    def _add_chunk_stream(self, document_id: str, filename: str, chunks: Iterable[Dict[str, Any]],
+                          batch_size: int = 64, stats: Optional[Dict[str, int]] = None) -> int:
+        added = 0
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) == batch_size:
+                added += self._add_batch(document_id, filename, batch, added, stats)
+                batch = []
+        if batch:
+            added += self._add_batch(document_id, filename, batch, added, stats)
+        return added
+    
+    def _add_batch(self, document_id: str, filename: str, batch: List[Dict[str, Any]], first_chunk: int,
+                   stats: Optional[Dict[str, int]] = None) -> int:
+        # Generate embeddings for the new chunks only
+        embeddings = self.embed_documents([chunk['text'] for chunk in batch], stats)
+        self.add_embedded(document_id, filename, batch, embeddings, first_chunk)
+        return len(batch)
+    
+    def add_embedded(self, document_id: str, filename: str, chunks: List[Dict[str, Any]],
+                     embeddings: np.ndarray, first_chunk: int = 0) -> None:
+        """Index chunks of one document whose embeddings were computed by the caller"""
+        with self.update():
+            draft = self._draft
+            if draft.index is None:
+                draft.index = index_factory.create_flat_index(embeddings.shape[1])
+                draft.owns_index = True
+            if (index_factory.is_compressed(self.index_params) and draft.documents.vector_dimension is None
+                    and len(draft.documents) == 0):
+                # Kept on disk for rescoring and rebuilds, since the index will only hold compressed codes
+                draft.documents.keep_vectors(np.zeros((0, embeddings.shape[1]), dtype='float32'))
+            
+            texts = [chunk['text'] for chunk in chunks]
+            ids = draft.documents.add_chunks(document_id, filename, texts,
+                                             [chunk.get('page') for chunk in chunks], first_chunk,
+                                             [chunk.get('section') for chunk in chunks], embeddings)
+            self._writable_index().add_with_ids(embeddings, ids)
+            draft.keyword_index.add(ids, texts)
+            draft.version += 1
+    
+    def embed_documents(self, texts: List[str], stats: Optional[Dict[str, int]] = None) -> np.ndarray:
+        """Embed texts as normalized float32 rows, reusing cached vectors; cache hits and misses are added to stats"""
+        cached = self.embedding_cache.get_many(texts) if self.embedding_cache else {}
+        missing = [i for i in range(len(texts)) if i not in cached]
+        if stats is not None:
+            stats['hits'] += len(cached)
+            stats['misses'] += len(missing)
+        
+        fresh = None
+        if missing:
+            print(f"Generating embeddings for {len(missing)} chunks ({len(cached)} cached)...")
+            fresh = self.embedding_model.embed_documents([texts[i] for i in missing])
+            fresh = np.array(fresh, dtype='float32')
+            # Normalize embeddings for cosine similarity
+            faiss.normalize_L2(fresh)
+            if self.embedding_cache:
+                self.embedding_cache.put_many([texts[i] for i in missing], fresh)
+        
+        dimension = fresh.shape[1] if fresh is not None else len(next(iter(cached.values()), []))
+        embeddings = np.zeros((len(texts), dimension), dtype='float32')
+        if fresh is not None:
+            embeddings[missing] = fresh
+        for i, vector in cached.items():
+            embeddings[i] = vector
+        return embeddings
+    
+    def remove_document(self, document_id: str) -> int:
+        """Remove every chunk belonging to a document from the index"""
+        with self.update():
+            draft = self._draft
+            if draft.index is None:
+                return 0
+            ids = draft.documents.remove_document(document_id)
+            if not ids:
+                return 0
+            
+            if index_factory.supports_remove(draft.index):
+                self._writable_index().remove_ids(np.array(ids, dtype='int64'))
+            else:
+                self._rebuild_index(index_factory.index_type_of(draft.index))
+            draft.keyword_index.remove(ids)
+            draft.version += 1
+            
+            print(f"Removed {len(ids)} chunks for document {document_id}")
+            return len(ids)
+    
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """List the documents currently held in the index"""
+        return self.documents.list_documents()
+    
+    def document_chunks(self) -> List[Dict[str, Any]]:
+        """Every document with its chunk texts in reading order, for whole-corpus tasks like summarization"""
+        documents = {}
+        for _, metadata in self.documents.items():
+            document = documents.setdefault(metadata['document_id'], {
+                'id': metadata['document_id'],
+                'filename': metadata['filename'],
+                'chunks': []
+            })
+            document['chunks'].append((metadata['chunk_id'], metadata['chunk']))
+        
+        for document in documents.values():
+            document['chunks'] = [text for _, text in sorted(document['chunks'])]
+        return list(documents.values())
+    
+    def maybe_train_index(self) -> None:
+        """Switch from the exact Flat index to the configured index and storage once enough vectors exist
+        
+        An IVF index is retrained, keeping its type and storage, once the corpus has grown enough to
+        support several times the lists it was trained with.
+        """
+        index_type = index_factory.index_type_of(self.index)
+        if index_type == 'flat' and not index_factory.is_compressed(index_factory.storage_of(self.index)):
+            if index_factory.should_train(self.index_type, len(self.documents), self.index_params):
+                with self.update():
+                    self._rebuild_index(self.index_type, self.index_params)
+        elif index_factory.should_retrain(self.index, len(self.documents), self.index_params):
+            with self.update():
+                self._rebuild_index(index_type)
+    
+    def _rebuild_index(self, index_type: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """Rebuild the draft's index from its own stored vectors (no re-embedding)
+        
+        Without params the index keeps the storage it has. Full-precision vectors kept by the chunk
+        store are used when there are any, so rebuilding a compressed index loses nothing.
+        """
+        draft = self._draft
+        ids = draft.documents.ids()
+        params = params or dict(self.index_params, **index_factory.storage_of(draft.index))
+        draft.owns_index = True
+        if len(ids) == 0:
+            draft.index = None
+            return
+        vectors = draft.documents.vectors(ids)
+        if vectors is None:
+            vectors = draft.index.reconstruct_batch(ids)
+        draft.index = index_factory.build_index(index_type, vectors, ids, params)
+        print(f"Rebuilt {index_type} index ({params['storage']} storage) with {len(ids)} vectors")
+    
+    def index_stats(self) -> Dict[str, Any]:
+        """Describe the active index and its query-time parameters"""
+        snapshot = self._current()
+        return {
+            'configured_type': self.index_type,
+            'active_type': index_factory.index_type_of(snapshot.index),
+            'vectors': snapshot.index.ntotal if snapshot.index is not None else 0,
+            'version': snapshot.version,
+            'retrieval_mode': self.retrieval_mode,
+            'keyword_terms': len(snapshot.keyword_index.postings),
+            'nprobe': self.index_params['nprobe'],
+            'ef_search': self.index_params['ef_search'],
+            **index_factory.storage_of(snapshot.index),
+            'bytes_per_vector': index_factory.code_size(snapshot.index) if snapshot.index is not None else 0,
+            'rescored': self._rescores(snapshot)
+        }
+    
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the index's vector codes"""
+        index = self.index
+        if index is None:
+            return 0
+        return index.ntotal * index_factory.code_size(index)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query as a normalized float32 vector"""
+        query_embedding = self.embedding_model.embed_query(query)
+        query_embedding = np.array([query_embedding], dtype='float32')
+        
+        # Normalize for cosine similarity
+        faiss.normalize_L2(query_embedding)
+        return query_embedding[0]
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed several queries in a single model pass as normalized float32 rows"""
+        query_embeddings = self.embedding_model.embed_documents(queries)
+        query_embeddings = np.array(query_embeddings, dtype='float32')
+        faiss.normalize_L2(query_embeddings)
+        return query_embeddings
+    
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Search for similar documents"""
+        snapshot = self._current()
+        if snapshot.index is None or len(snapshot.documents) == 0:
+            return []
+        
+        return self.search_by_vector(self.embed_query(query), k, query)
+    
+    def search_batch(self, queries: List[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Search for several queries with one batched embedding and one FAISS search"""
+        snapshot = self._current()
+        if snapshot.index is None or len(snapshot.documents) == 0 or not queries:
+            return [[] for _ in queries]
+        
+        return self.search_by_vectors(self.embed_queries(queries), k, queries)
+    
+    def search_by_vector(self, query_embedding: np.ndarray, k: int = 5,
+                         query: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Search with an already embedded (normalized) query; the query text enables hybrid mode"""
+        queries = [query] if query is not None else None
+        return self.search_by_vectors(np.asarray(query_embedding, dtype='float32').reshape(1, -1), k, queries)[0]
+    
+    def search_by_vectors(self, query_embeddings: np.ndarray, k: int = 5,
+                          queries: Optional[List[str]] = None) -> List[List[Dict[str, Any]]]:
+        """Search a matrix of already embedded (normalized) queries in one FAISS call
+        
+        In hybrid mode, and when the query texts are given, the dense ranking of each query is fused
+        with its BM25 ranking by reciprocal rank fusion.
+        """
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        hybrid = self.retrieval_mode == 'hybrid' and queries is not None
+        
+        # Everything below reads this one snapshot, however many writers publish in the meantime
+        snapshot = self._current()
+        if snapshot.index is None or len(snapshot.documents) == 0:
+            return [[] for _ in range(len(query_embeddings))]
+        
+        # Search (increase k to get more results, then filter)
+        k_search = min(max(k * 2, self.hybrid_candidates) if hybrid else k * 2, len(snapshot.documents))
+        if self._rescores(snapshot):
+            candidates = min(k_search * self.index_params['rescore_factor'], len(snapshot.documents))
+            scores, indices = self._rescore(snapshot, query_embeddings, *snapshot.index.search(query_embeddings, candidates),
+                                            k_search)
+        else:
+            scores, indices = snapshot.index.search(query_embeddings, k_search)
+        if not hybrid:
+            return [self._collect_results(snapshot, row_scores, row_indices, k)
+                    for row_scores, row_indices in zip(scores, indices)]
+        return [self._fuse_results(snapshot, query, row_scores, row_indices, k)
+                for query, row_scores, row_indices in zip(queries, scores, indices)]
+    
+    def _rescores(self, snapshot: IndexSnapshot) -> bool:
+        """Whether searches of snapshot rescore compressed candidates with full-precision vectors"""
+        return (self.index_params['rescore_factor'] > 1 and snapshot.documents.vector_dimension is not None
+                and index_factory.is_compressed(index_factory.storage_of(snapshot.index)))
+    
+    @staticmethod
+    def _rescore(snapshot: IndexSnapshot, query_embeddings: np.ndarray, scores: np.ndarray, indices: np.ndarray,
+                 k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact inner products for the compressed index's candidates, keeping the best k per query"""
+        candidate_ids = np.unique(indices[indices >= 0])
+        vectors = snapshot.documents.vectors(candidate_ids)
+        rescored = np.full((len(indices), k), -np.inf, dtype='float32')
+        rescored_ids = np.full((len(indices), k), -1, dtype='int64')
+        for row, (query_embedding, row_indices) in enumerate(zip(query_embeddings, indices)):
+            row_indices = row_indices[row_indices >= 0]
+            exact = vectors[np.searchsorted(candidate_ids, row_indices)] @ query_embedding
+            order = np.argsort(-exact, kind='stable')[:k]
+            rescored[row, :len(order)] = exact[order]
+            rescored_ids[row, :len(order)] = row_indices[order]
+        return rescored, rescored_ids
+    
+    def _fuse_results(self, snapshot: IndexSnapshot, query: str, scores: np.ndarray, indices: np.ndarray,
+                      k: int) -> List[Dict[str, Any]]:
+        dense_scores = {int(idx): float(score) for score, idx in zip(scores, indices) if idx >= 0}
+        dense_ranking = [int(idx) for idx in indices if idx >= 0]
+        keyword_ranking = [chunk_id for chunk_id, _ in snapshot.keyword_index.search(query, len(dense_ranking))]
+        fused = reciprocal_rank_fusion([dense_ranking, keyword_ranking], self.rrf_k)
+        
+        results = []
+        seen_chunks = set()
+        # A chunk ranked first by both retrievers gets the highest possible fused score
+        best_score = 2.0 / (self.rrf_k + 1)
+        for chunk_id, fused_score in fused:
+            metadata = snapshot.documents.get(chunk_id)
+            if metadata is None or metadata['chunk'] in seen_chunks:
+                continue
+            seen_chunks.add(metadata['chunk'])
+            result = {
+                'document': metadata,
+                'score': fused_score / best_score
+            }
+            if chunk_id in dense_scores:
+                result['dense_score'] = max(0.0, (dense_scores[chunk_id] + 1) / 2)
+            results.append(result)
+            if len(results) >= k:
+                break
+        return results
+    
+    def _collect_results(self, snapshot: IndexSnapshot, scores: np.ndarray, indices: np.ndarray,
+                         k: int) -> List[Dict[str, Any]]:
+        results = []
+        seen_chunks = set()
+        
+        for score, idx in zip(scores, indices):
+            metadata = snapshot.documents.get(int(idx))
+            if metadata is not None:
+                chunk_content = metadata['chunk']
+                # Avoid duplicate chunks
+                if chunk_content not in seen_chunks:
+                    seen_chunks.add(chunk_content)
+                    # Convert cosine similarity to more readable score (0-1)
+                    normalized_score = max(0.0, (score + 1) / 2)  # Convert from [-1,1] to [0,1]
+                    results.append({
+                        'document': metadata,
+                        'score': normalized_score
+                    })
+                
+                if len(results) >= k:
+                    break
+        
+        # Sort by score descending
+        results.sort(key=lambda x: x['score'], reverse=True)
+        return results
+    
+    def save(self, path: str) -> None:
+        """Save vector store to disk"""
+        with self._write_lock:
+            if not os.path.exists(path):
+                os.makedirs(path)
+            
+            if self._draft is not None:
+                # Inside update(): the draft is saved and published with the rest of the block's writes
+                snapshot = self._draft
+            else:
+                # Saving re-maps the chunk store, so that happens on a copy rather than the one being searched;
+                # the FAISS and keyword indexes are only read and stay shared with the published snapshot
+                published = self._snapshot
+                snapshot = IndexSnapshot(published.index, published.documents.copy(), published.keyword_index,
+                                         published.version)
+                snapshot.owns_index = published.owns_index
+            
+            if snapshot.index is not None:
+                # Written first and swapped in whole; load() repairs a save cut short after this point
+                index_path = os.path.join(path, "index.faiss")
+                faiss.write_index(snapshot.index, index_path + ".tmp")
+                os.replace(index_path + ".tmp", index_path)
+            
+            snapshot.documents.save(path)
+            snapshot.keyword_index.save(path)
+            self._save_index_meta(path)
+            if snapshot is not self._draft:
+                self._snapshot = snapshot
+            self._loaded_from = self._load_key(path)
+            
+            print(f"Vector store saved to {path}")
+    
+    def _save_index_meta(self, path: str) -> None:
+        """Record how the saved index stores its vectors, for tools that inspect a store without FAISS"""
+        with open(os.path.join(path, INDEX_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(dict(self.index_stats(), dimension=self.index.d if self.index is not None else None), f, indent=1)
+    
+    @staticmethod
+    def exists(path: str) -> bool:
+        """Whether a saved vector store (current or legacy pickle format) is present"""
+        return os.path.exists(os.path.join(path, "index.faiss")) and (
+            ChunkStore.exists(path) or os.path.exists(os.path.join(path, "documents.pkl"))
+        )
+    
+    def _load_key(self, path: str) -> Tuple[Any, ...]:
+        """Identifies the files at path and the in-memory version they correspond to"""
+        files = []
+        for name in ("index.faiss", "chunks_meta.json", "bm25.pkl", "documents.pkl"):
+            file_path = os.path.join(path, name)
+            if os.path.exists(file_path):
+                stat = os.stat(file_path)
+                files.append((name, stat.st_mtime_ns, stat.st_size))
+        return os.path.abspath(path), tuple(files), self.version
+    
+    def load(self, path: str) -> bool:
+        """Load vector store from disk; a no-op when the same unchanged files are already loaded"""
+        # Checked before the write lock too, so reopening a loaded store never waits behind a writer
+        if self._loaded_from is not None and self._loaded_from == self._load_key(path):
+            return True
+        with self._write_lock:
+            if self._loaded_from is not None and self._loaded_from == self._load_key(path):
+                return True
+            if not self.exists(path):
+                print("Vector store files not found")
+                return False
+            
+            try:
+                with self.update():
+                    self.index = faiss.read_index(os.path.join(path, "index.faiss"))
+                    if ChunkStore.exists(path):
+                        self.documents = ChunkStore.load(path)
+                    else:
+                        # Stores saved before the columnar format still carry documents.pkl
+                        self.documents = migrate_pickle_store(path)
+                    if BM25Index.exists(path):
+                        self.keyword_index = BM25Index.load(path)
+                    else:
+                        # Stores saved before hybrid retrieval only have dense vectors
+                        self.keyword_index = self._build_keyword_index()
+                    
+                    if isinstance(self.index, faiss.IndexFlat):
+                        # Older stores used list positions as IDs in a plain flat index
+                        self._upgrade_positional_index()
+                    self._repair_interrupted_save()
+                    self._apply_storage()
+                    index_factory.apply_search_params(self.index, self.index_params)
+                    self.maybe_train_index()
+                    self.version += 1
+                    self._loaded_from = self._load_key(path)
+            except Exception as e:
+                print(f"Error loading vector store: {e}")
+                return False
+            
+            print(f"Vector store loaded with {len(self.documents)} chunks")
+            return True
+    
+    def _repair_interrupted_save(self) -> None:
+        """Bring the index and keyword index back in line with the chunk store if a save was cut short
+        
+        The index is saved before the chunk store, so an interrupted save can leave vectors for chunks
+        the store never recorded; their IDs are all at or above the store's next_id.
+        """
+        draft = self._draft
+        if draft.index.ntotal > len(draft.documents):
+            print(f"Dropping {draft.index.ntotal - len(draft.documents)} vectors from an interrupted save")
+            if index_factory.supports_remove(draft.index):
+                self._writable_index().remove_ids(faiss.IDSelectorRange(draft.documents.next_id, np.iinfo('int64').max))
+            else:
+                self._rebuild_index(index_factory.index_type_of(draft.index))
+        if len(draft.keyword_index) != len(draft.documents):
+            draft.keyword_index = self._build_keyword_index()
+    
+    def _apply_storage(self) -> None:
+        """Bring a loaded index to the configured storage when it differs and the vectors allow it
+        
+        A store saved with full precision can always be compressed; going back, or to another
+        compressed form, needs the full-precision vectors the chunk store keeps for compressed stores.
+        """
+        draft = self._draft
+        current = index_factory.storage_of(draft.index)
+        configured = {'storage': self.index_params['storage'], 'pca_dim': self.index_params['pca_dim']}
+        exact = not index_factory.is_compressed(current)
+        ids = draft.documents.ids()
+        if index_factory.is_compressed(configured) and draft.documents.vector_dimension is None and exact:
+            draft.documents.keep_vectors(draft.index.reconstruct_batch(ids) if len(ids) else
+                                         np.zeros((0, draft.index.d), dtype='float32'))
+        
+        index_type = index_factory.index_type_of(draft.index)
+        if current == configured or current['storage'] == 'pq' or (index_type == 'flat' and exact):
+            # An exact Flat index is converted by maybe_train_index once the store is large enough
+            return
+        if draft.documents.vector_dimension is None:
+            print(f"Index stays in {current['storage']} storage: no full-precision vectors to convert it from")
+            return
+        self._rebuild_index(index_type, self.index_params)
+    
+    def _build_keyword_index(self) -> BM25Index:
+        """Build the BM25 index from the chunk texts already in the store"""
+        keyword_index = BM25Index()
+        for chunk_id, metadata in self.documents.items():
+            keyword_index.add([chunk_id], [metadata['chunk']])
+        print(f"Built keyword index over {len(keyword_index)} chunks")
+        return keyword_index
+    
+    def _upgrade_positional_index(self) -> None:
+        """Wrap a positional flat index in an ID map, reusing the stored vectors"""
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        self.index = index_factory.create_flat_index(self.index.d)
+        self.index.add_with_ids(vectors, np.arange(len(vectors), dtype='int64'))
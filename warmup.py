@@ -0,0 +1,102 @@
+import threading
+import time
+import traceback
+from typing import List, Dict, Any, Callable, Optional
+
+class LazyEmbeddings:
+    """Stands in for an embedding model and only constructs it on first use (or when warmed up)"""
+    
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+        self.load_seconds = None
+        self._model = None
+        self._lock = threading.Lock()
+    
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+    
+    def model(self):
+        """The real model; concurrent first callers wait for a single load"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    self._model = self.factory()
+                    self.load_seconds = time.perf_counter() - started
+                    print(f"Embedding model loaded in {self.load_seconds:.1f}s")
+        return self._model
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model().embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.model().embed_query(text)
+
+class Warmup:
+    """Runs startup steps on a background thread and reports readiness and how long each step took
+    
+    The app is ready as soon as every required step has succeeded; optional steps (such as preloading
+    the LLM) keep running afterwards and are only reported.
+    """
+    
+    def __init__(self):
+        self.started_at = None
+        self.ready_at = None
+        self.finished_at = None
+        self._steps = []  # (name, function, required)
+        self._status = {}  # name -> {'state', 'required', 'seconds', 'error'}
+        self._done = threading.Event()
+        self._thread = None
+    
+    def add(self, name: str, step: Callable[[], Any], required: bool = True) -> None:
+        self._steps.append((name, step, required))
+        self._status[name] = {'state': 'pending', 'required': required, 'seconds': None, 'error': None}
+    
+    def start(self) -> None:
+        """Run the steps in order on a daemon thread"""
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+        self._thread.start()
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until every step, optional ones included, has finished; returns whether the app is ready"""
+        self._done.wait(timeout)
+        return self.ready
+    
+    @property
+    def ready(self) -> bool:
+        return all(status['state'] == 'done' for status in self._status.values() if status['required'])
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'ready': self.ready,
+            'finished': self._done.is_set(),
+            'seconds': (self.finished_at or time.perf_counter()) - self.started_at if self.started_at else None,
+            'steps': {name: dict(status) for name, status in self._status.items()}
+        }
+    
+    def _run(self) -> None:
+        if self.ready:
+            self.ready_at = self.started_at
+        try:
+            for name, step, required in self._steps:
+                status = self._status[name]
+                status['state'] = 'running'
+                started = time.perf_counter()
+                try:
+                    step()
+                    status['state'] = 'done'
+                except Exception as e:
+                    print(f"Warm-up step {name} failed: {str(e)}")
+                    if required:
+                        print(traceback.format_exc())
+                    status['state'] = 'failed'
+                    status['error'] = str(e)
+                status['seconds'] = time.perf_counter() - started
+                if self.ready_at is None and self.ready:
+                    self.ready_at = time.perf_counter()
+        finally:
+            self.finished_at = time.perf_counter()
+            self._done.set()
+            print(f"Warm-up finished in {self.finished_at - self.started_at:.1f}s (ready: {self.ready})")